@@ -0,0 +1,357 @@
+import sys
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+import metrics
+from engine import DistractionAnalyzer, load_config
+
+# Shares one GPU box between many seats. Capture clients (engine.py with
+# "analysis_server" set) POST the same body they would send to Ollama's
+# /api/generate to /v1/frames and get a job id back right away (202), then
+# long-poll /v1/verdicts/<id> for the answer. Each client has its own
+# small queue, and each peer address its own token bucket (X-Client-Id is
+# whatever the client says, so it can't be what the rate limit trusts;
+# seats behind one NAT or proxy share a bucket); model workers (one per backend URL) pull
+# batches round-robin across clients so a busy seat can't starve the
+# others, and hand each request to a pool of `parallel` slots as soon as
+# one is free, so one slow request doesn't hold up the next batch.
+# Identical frames in a batch (the same prompt and image from different
+# seats) cost one request. Clients only get the raw answer back; each
+# decides distracted or not with its own blacklist. Frames the server
+# declines (rate limited, or superseded by a newer frame from the same
+# seat) are marked skipped so clients don't count them as checks.
+
+VERDICT_TTL = 300  # seconds an unfetched verdict is kept
+BUCKET_SWEEP_INTERVAL = 60  # seconds between drops of refilled token buckets
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def allow(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def is_full(self, now):
+        # A full bucket is no different from a new one, so it can be dropped
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class Job:
+    def __init__(self, client, sequence, prompt, image, peer=None):
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.peer = peer if peer is not None else client  # what the rate limit is keyed on
+        self.sequence = sequence
+        self.prompt = prompt
+        self.image = image
+        self.key = hashlib.blake2b(prompt.encode("utf-8") + b"\0" + image.encode("ascii"), digest_size=16).digest()
+        self.submitted = time.monotonic()
+        self.finished = None
+        self.done = threading.Event()
+        self.answer = None
+        self.error = None
+        self.skipped = False
+
+    def finish(self, answer=None, error=None, skipped=False):
+        self.answer = answer
+        self.error = error
+        self.skipped = skipped
+        self.image = None  # the verdict may wait a while to be fetched
+        self.finished = time.monotonic()
+        self.done.set()
+
+    def result(self):
+        if self.error:
+            return {"id": self.id, "seq": self.sequence, "error": self.error, "skipped": self.skipped}
+        return {"id": self.id, "seq": self.sequence, "response": self.answer}
+
+
+class FairScheduler:
+    def __init__(self, queue_limit=2, rate_limit=6, rate_burst=3):
+        self.queue_limit = queue_limit
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
+        self.queues = OrderedDict()  # client -> deque of jobs; order is the round-robin rotation
+        self.buckets = {}  # peer -> token bucket
+        self.swept = time.monotonic()
+        self.jobs = OrderedDict()    # job id -> job, oldest first
+        self.condition = threading.Condition()
+        self.closed = False
+
+    def depth(self):
+        return sum(len(jobs) for jobs in self.queues.values())
+
+    def submit(self, job):
+        with self.condition:
+            if self.rate_limit:
+                self.sweep_buckets()
+                bucket = self.buckets.get(job.peer)
+                if bucket is None:
+                    bucket = self.buckets[job.peer] = TokenBucket(self.rate_limit, self.rate_burst)
+                if not bucket.allow():
+                    metrics.SERVER_FRAMES.inc(result="rate_limited")
+                    return False
+            jobs = self.queues.setdefault(job.client, deque())
+            # A seat's older frames are stale once a newer one is waiting
+            while len(jobs) >= self.queue_limit:
+                jobs.popleft().finish(error="superseded by a newer frame", skipped=True)
+                metrics.SERVER_FRAMES.inc(result="superseded")
+            jobs.append(job)
+            self.jobs[job.id] = job
+            self.expire()
+            metrics.SERVER_FRAMES.inc(result="accepted")
+            metrics.SERVER_QUEUE_DEPTH.set(self.depth())
+            self.condition.notify()
+        return True
+
+    def sweep_buckets(self):
+        now = time.monotonic()
+        if now - self.swept < BUCKET_SWEEP_INTERVAL:
+            return
+        self.swept = now
+        for peer in [peer for peer, bucket in self.buckets.items() if bucket.is_full(now)]:
+            del self.buckets[peer]
+
+    def expire(self):
+        now = time.monotonic()
+        while self.jobs:
+            job = next(iter(self.jobs.values()))
+            if job.finished is None or now - job.finished < VERDICT_TTL:
+                break
+            self.jobs.popitem(last=False)
+
+    def get(self, job_id):
+        with self.condition:
+            return self.jobs.get(job_id)
+
+    def forget(self, job_id):
+        with self.condition:
+            self.jobs.pop(job_id, None)
+
+    def take_batch(self, size, wait):
+        # Blocks for the first frame, then gives stragglers up to `wait`
+        # seconds to fill the batch. Returns [] once closed.
+        with self.condition:
+            while not self.closed and not self.depth():
+                self.condition.wait()
+            deadline = time.monotonic() + wait
+            while not self.closed and self.depth() < size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch = []
+            while len(batch) < size and self.depth():
+                client, jobs = next(iter(self.queues.items()))
+                self.queues.move_to_end(client)
+                if jobs:
+                    batch.append(jobs.popleft())
+                else:
+                    del self.queues[client]
+            metrics.SERVER_QUEUE_DEPTH.set(self.depth())
+            return batch
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class ModelWorker(threading.Thread):
+    def __init__(self, scheduler, analyzer, parallel=2, batch_size=4, batch_wait=0.05):
+        super().__init__(daemon=True)
+        self.scheduler = scheduler
+        self.analyzer = analyzer
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.pool = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="model")
+        # One per pool thread: taken before a request is handed over, freed when it finishes
+        self.slots = threading.Semaphore(parallel)
+
+    def infer(self, jobs):
+        try:
+            self.request(jobs)
+        finally:
+            self.slots.release()
+
+    def request(self, jobs):
+        try:
+            start_time = time.monotonic()
+            answer = self.analyzer.ask_llava(jobs[0].prompt, None, jobs[0].image)
+            metrics.INFERENCE_LATENCY.observe(time.monotonic() - start_time, backend="ollama")
+        except Exception as e:
+            metrics.BACKEND_ERRORS.inc(backend="ollama", kind=type(e).__name__)
+            answer = f"Error: {e}"
+        for job in jobs:
+            if answer.startswith("Error"):
+                job.finish(error=answer)
+            else:
+                job.finish(answer=answer)
+
+    def run(self):
+        while True:
+            batch = self.scheduler.take_batch(self.batch_size, self.batch_wait)
+            if not batch:
+                break
+            metrics.SERVER_BATCH_SIZE.observe(len(batch))
+            groups = {}
+            for job in batch:
+                groups.setdefault(job.key, []).append(job)
+            # Waits for a free slot, not for the rest of the previous batch
+            for jobs in groups.values():
+                self.slots.acquire()
+                self.pool.submit(self.infer, jobs)
+        self.pool.shutdown(wait=False)
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    scheduler = None
+    token = None
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authorized(self):
+        if self.token and self.headers.get("Authorization") != f"Bearer {self.token}":
+            self.send_error(401)
+            return False
+        return True
+
+    def do_POST(self):
+        if self.path != "/v1/frames":
+            self.send_error(404)
+            return
+        if not self.authorized():
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length))
+            image = request["images"][0]
+            prompt = request["prompt"]
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError):
+            self.send_error(400, "Expected an Ollama /api/generate body with one image")
+            return
+        peer = self.client_address[0]
+        # Queues are per seat, but a seat can only supersede frames sent from its own address
+        client = (peer, self.headers.get("X-Client-Id") or "")
+        job = Job(client, int(self.headers.get("X-Sequence", 0)), prompt, image, peer)
+        if not self.scheduler.submit(job):
+            self.send_json(429, {"error": "rate limit exceeded", "skipped": True})
+            return
+        self.send_json(202, {"id": job.id})
+
+    def do_GET(self):
+        if not self.path.startswith("/v1/verdicts/"):
+            self.send_error(404)
+            return
+        if not self.authorized():
+            return
+        job_id, _, query = self.path[len("/v1/verdicts/"):].partition("?")
+        wait = 0.0
+        for pair in query.split("&"):
+            name, _, value = pair.partition("=")
+            if name == "wait":
+                try:
+                    wait = min(float(value), 60.0)
+                except ValueError:
+                    pass
+        job = self.scheduler.get(job_id)
+        if job is None:
+            self.send_error(404, "Unknown or expired job")
+            return
+        if not job.done.wait(wait):
+            self.send_response(204)
+            self.end_headers()
+            return
+        self.scheduler.forget(job_id)
+        self.send_json(200, job.result())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AnalysisServer(threading.Thread):
+    def __init__(self, config, port=None, host=None):
+        super().__init__(daemon=True)
+        self.scheduler = FairScheduler(config['server_queue_limit'], config['server_rate_limit'], config['server_rate_burst'])
+        attributes = {"scheduler": self.scheduler, "token": config['analysis_server_token']}
+        handler = type("BoundAnalysisRequestHandler", (AnalysisRequestHandler,), attributes)
+        port = config['server_port'] if port is None else port
+        self.httpd = ThreadingHTTPServer((host or config['server_host'], port), handler)
+        self.httpd.daemon_threads = True
+        self.workers = []
+        for backend in config['server_backends']:
+            analyzer = DistractionAnalyzer(ollama_url=backend, model=config['model'])
+            self.workers.append(ModelWorker(self.scheduler, analyzer, config['server_parallel'],
+                                            config['server_batch_size'], config['server_batch_wait']))
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def run(self):
+        for worker in self.workers:
+            worker.start()
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.scheduler.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve distraction analysis for many capture clients from shared backends.")
+    parser.add_argument("--config", default="config.json", help="Path to config.json (server_* settings)")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--backend", action="append", default=None, help="Ollama URL; repeat for several GPUs")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    config = load_config(args.config)
+    if args.backend:
+        config['server_backends'] = args.backend
+    if (args.host or config['server_host']) not in ("127.0.0.1", "localhost") and not config['analysis_server_token']:
+        print("Warning: serving beyond localhost without analysis_server_token; anyone on the network can submit frames.")
+    server = AnalysisServer(config, args.port, args.host)
+    metrics_server = metrics.start_metrics_server(config)
+    print(f"Analysis server listening on {server.url} with {len(server.workers)} backend(s)")
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.scheduler.close()
+        if metrics_server:
+            metrics_server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
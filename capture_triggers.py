@@ -0,0 +1,87 @@
+import time
+import threading
+from collections import deque
+
+import metrics
+from window_probe import list_windows, probe_active_window
+
+# Captures on events as well as on the timer. A watcher polls the cheap
+# window probes (the same ones the metadata fast path uses) and, when the
+# focused window, its title (a browser's title follows the page, so this
+# catches most URL changes) or the set of open windows changes, asks the
+# capture thread for a frame right away. Tab-cycling and titles that update
+# while a page loads are debounced: a trigger fires only once nothing has
+# changed for trigger_debounce seconds. A per-minute cap bounds the extra
+# inference, so the timer itself can run much slower. Nothing is probed
+# while the engine is paused for an absent user.
+
+
+class TriggerLimiter:
+    def __init__(self, max_per_minute=4):
+        self.max_per_minute = max_per_minute
+        self.fired = deque()
+
+    def allow(self, now):
+        while self.fired and now - self.fired[0] >= 60:
+            self.fired.popleft()
+        return not self.max_per_minute or len(self.fired) < self.max_per_minute
+
+    def record(self, now):
+        self.fired.append(now)
+
+
+class WindowWatcher(threading.Thread):
+    def __init__(self, config, on_trigger, is_paused=None):
+        super().__init__(daemon=True)
+        # Read on every poll so config changes apply without a restart
+        self.config = config
+        self.on_trigger = on_trigger  # on_trigger(reason) -> True if a capture was scheduled
+        self.is_paused = is_paused
+        self.limiter = TriggerLimiter(config['trigger_max_per_minute'])
+        self.stop_event = threading.Event()
+        self.window = None
+        self.windows = None
+        self.pending = None  # (reason, time of the latest change)
+
+    def poll(self, now):
+        probe_file = self.config['window_probe_file']
+        metadata = probe_active_window(probe_file)
+        window = (metadata.get("process", ""), metadata.get("app", ""), metadata.get("title", "")) if metadata else None
+        windows = list_windows(probe_file)
+        reason = None
+        if window != self.window and self.window is not None and window is not None:
+            reason = "title" if window[:2] == self.window[:2] else "focus"
+        if windows is not None and self.windows is not None and windows - self.windows:
+            reason = reason or "new_window"
+        self.window = window if window is not None else self.window
+        self.windows = windows if windows is not None else self.windows
+        if reason:
+            # A later change restarts the debounce but keeps the first reason
+            self.pending = (self.pending[0] if self.pending else reason, now)
+        elif self.pending and now - self.pending[1] >= self.config['trigger_debounce']:
+            reason = self.pending[0]
+            self.pending = None
+            self.limiter.max_per_minute = self.config['trigger_max_per_minute']
+            if not self.limiter.allow(now):
+                metrics.CAPTURE_TRIGGERS.inc(reason=reason, result="capped")
+            elif self.on_trigger(reason):
+                self.limiter.record(now)
+                metrics.CAPTURE_TRIGGERS.inc(reason=reason, result="fired")
+            else:
+                metrics.CAPTURE_TRIGGERS.inc(reason=reason, result="skipped")
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if self.config['capture_triggers'] and not (self.is_paused and self.is_paused()):
+                try:
+                    self.poll(time.monotonic())
+                except Exception as e:
+                    print(f"Error watching windows: {e}")
+            else:
+                self.window = self.windows = self.pending = None
+            self.stop_event.wait(self.config['trigger_poll_interval'])
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
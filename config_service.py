@@ -0,0 +1,301 @@
+import os
+import json
+import threading
+
+import metrics
+from engine import DEFAULT_CONFIG, load_config, save_config
+from rules import validate_rules
+from power import validate_profiles
+
+# Owns config.json for a running monitor. Changes from the GUI, IPC or an
+# edit to the file are validated against the defaults' types plus the
+# ranges and choices below, applied to the shared config dict and passed to
+# listeners (MonitorEngine.apply_config), so retuning doesn't restart the
+# pipeline. Writes are debounced and atomic: typing in a field rewrites the
+# file once, after the typing stops. The file is watched by polling its
+# mtime, so hand edits take effect without a restart too.
+
+RANGES = {
+    "capture_interval": (1, 24 * 3600),
+    "max_image_size": (64, 16384),
+    "encode_processes": (0, 64),
+    "frame_buffers": (1, 64),
+    "frame_buffer_bytes": (1024 * 1024, None),
+    "rss_sample_interval": (0, None),
+    "history_max_bytes": (1024 * 1024, None),
+    "history_keyframe_interval": (1, 10000),
+    "dirty_tile_size": (0, 1024),
+    "dirty_reuse_threshold": (0, 1),
+    "dirty_crop_threshold": (0, 1),
+    "embedding_similarity": (0, 1),
+    "embedding_neighbours": (1, 50),
+    "embedding_max_entries": (10, None),
+    "stats_sync_interval": (10, None),
+    "power_poll_interval": (1, 3600),
+    "power_hot_temperature": (30, 120),
+    "power_low_battery": (0, 100),
+    "trigger_poll_interval": (0.1, 60),
+    "trigger_debounce": (0, 60),
+    "trigger_max_per_minute": (0, 60),
+    "trigger_min_gap": (0, 600),
+    "transformers_threads": (1, 256),
+    "transformers_batch_size": (1, 64),
+    "transformers_batch_wait": (0, 5),
+    "focused_monitor": (0, None),
+    "weighted_threshold": (0, 1),
+    "smoothing_alpha": (0, 1),
+    "smoothing_enter_threshold": (0, 1),
+    "smoothing_exit_threshold": (0, 1),
+    "recheck_delay": (1, None),
+    "stable_checks": (1, None),
+    "stable_interval_multiplier": (1, None),
+    "idle_threshold": (0, None),
+    "metrics_port": (0, 65535),
+    "server_port": (0, 65535),
+    "server_parallel": (1, 64),
+    "server_batch_size": (1, 64),
+    "server_batch_wait": (0, 5),
+    "server_rate_limit": (0, None),
+    "server_rate_burst": (1, None),
+    "server_queue_limit": (1, 100),
+    "inference_workers": (1, 32),
+    "inference_queue_limit": (1, 100),
+    "frame_deadline_factor": (0.1, None),
+}
+
+CHOICES = {
+    "capture_mode": ("combined", "per_monitor"),
+    "fusion_policy": ("any", "focused", "weighted"),
+    "smoothing_method": ("ema", "window", "hmm", "none"),
+    "backend": ("ollama", "transformers"),
+    "transformers_task": ("zero-shot-image-classification", "visual-question-answering"),
+}
+
+# Settings that default to null (off, or worked out at run time); any other
+# value is checked as if the default were of this type
+NULLABLE = {
+    "metrics_port": int,
+    "transformers_threads": int,
+    "rss_log_file": str,
+    "stats_sync_dir": str,
+    "stats_device_id": str,
+    "history_dir": str,
+    "analysis_server": str,
+    "analysis_server_token": str,
+    "client_id": str,
+    "embedding_index_dir": str,
+    "idle_probe_file": str,
+    "power_probe_file": str,
+    "window_probe_file": str,
+}
+
+NON_EMPTY = ("possible_activities", "blacklisted_words", "ollama_url", "model", "prompt_template")
+
+
+def validate_value(key, value):
+    default = DEFAULT_CONFIG.get(key)
+    if value is None:
+        return None if key in NULLABLE or key not in DEFAULT_CONFIG else "must be set"
+    if key in NULLABLE:
+        default = NULLABLE[key]()
+    if isinstance(default, bool):
+        if not isinstance(value, bool):
+            return "must be true or false"
+    elif isinstance(default, (int, float)) or key in RANGES:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return "must be a number"
+        if isinstance(default, int) and not isinstance(value, int):
+            return "must be a whole number"
+        low, high = RANGES.get(key, (None, None))
+        if low is not None and value < low:
+            return f"must be at least {low}"
+        if high is not None and value > high:
+            return f"must be at most {high}"
+    elif key == "intervention_rules":
+        problems = validate_rules(value)
+        if problems:
+            return "; ".join(problems)
+    elif key == "power_profiles":
+        problems = validate_profiles(value)
+        if problems:
+            return "; ".join(problems)
+    elif isinstance(default, list):
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            return "must be a list of strings"
+    elif key == "monitor_weights":
+        if not isinstance(value, dict):
+            return "must be an object"
+        for monitor, weight in value.items():
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight < 0:
+                return f"weight for monitor {monitor} must be a number of at least 0"
+    elif isinstance(default, dict):
+        if not isinstance(value, dict):
+            return "must be an object"
+    elif isinstance(default, str):
+        if not isinstance(value, str):
+            return "must be a string"
+    if key in CHOICES and value not in CHOICES[key]:
+        return f"must be one of {', '.join(CHOICES[key])}"
+    if key in NON_EMPTY and not value:
+        return "must not be empty"
+    if key == "prompt_template":
+        # Fails here rather than on the first analysis
+        try:
+            value.format(options="")
+        except (KeyError, IndexError, ValueError) as e:
+            return f"must only use the {{options}} placeholder ({type(e).__name__}: {e})"
+    return None
+
+
+def validate_config(config):
+    # Returns a list of "key: problem" strings; unknown keys pass through
+    errors = []
+    for key, value in config.items():
+        problem = validate_value(key, value)
+        if problem:
+            errors.append(f"{key}: {problem}")
+    if errors:
+        # The checks across keys assume every value has the right type
+        return errors
+    if config.get("smoothing_exit_threshold", 0) > config.get("smoothing_enter_threshold", 1):
+        errors.append("smoothing_exit_threshold: must not exceed smoothing_enter_threshold")
+    if "{options}" not in config.get("prompt_template", "{options}"):
+        errors.append("prompt_template: must contain {options}")
+    return errors
+
+
+def config_warnings(config):
+    # Settings that are valid but won't do what they say
+    warnings = []
+    profiles = config.get("power_profiles") or {}
+    if config.get("power_policy") and not config.get("metadata_fast_path"):
+        only = sorted(name for name, profile in profiles.items() if isinstance(profile, dict) and profile.get("metadata_only"))
+        if only:
+            warnings.append(f"power_profiles: metadata_only in {', '.join(only)} has no effect while metadata_fast_path is off; "
+                            "those profiles keep taking screenshots")
+    return warnings
+
+
+class ConfigService:
+    def __init__(self, filename='config.json', debounce=1.0, poll_interval=2.0):
+        self.filename = filename
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.config = load_config(filename)
+        for error in validate_config(self.config):
+            key = error.split(":")[0]
+            print(f"Invalid setting in {filename}, using the default: {error}")
+            if key in DEFAULT_CONFIG:
+                self.config[key] = DEFAULT_CONFIG[key]
+        for warning in config_warnings(self.config):
+            print(f"Warning: {warning}")
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.write_timer = None
+        self.file_state = self.stat()
+        self.stop_event = threading.Event()
+        self.watcher = None
+
+    def add_listener(self, listener):
+        # listener(changes) gets a dict of the keys whose values changed
+        self.listeners.append(listener)
+
+    def notify(self, changes):
+        for listener in list(self.listeners):
+            try:
+                listener(changes)
+            except Exception as e:
+                print(f"Error applying configuration: {e}")
+
+    def apply(self, changes):
+        # Returns (changed keys, errors); nothing is applied if any key is invalid
+        with self.lock:
+            changes = {key: value for key, value in changes.items() if self.config.get(key) != value}
+            errors = validate_config(dict(self.config, **changes))
+            if errors or not changes:
+                return {}, errors
+            self.config.update(changes)
+            if changes.keys() & {"power_policy", "power_profiles", "metadata_fast_path"}:
+                for warning in config_warnings(self.config):
+                    print(f"Warning: {warning}")
+        return changes, []
+
+    def update(self, changes):
+        changes, errors = self.apply(changes)
+        if errors:
+            metrics.CONFIG_UPDATES.inc(source="update", result="rejected")
+            print(f"Rejected configuration change: {'; '.join(errors)}")
+            return errors
+        if changes:
+            metrics.CONFIG_UPDATES.inc(source="update", result="applied")
+            self.schedule_write()
+            self.notify(changes)
+        return []
+
+    def schedule_write(self):
+        with self.lock:
+            if self.write_timer:
+                self.write_timer.cancel()
+            self.write_timer = threading.Timer(self.debounce, self.flush)
+            self.write_timer.daemon = True
+            self.write_timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self.write_timer:
+                self.write_timer.cancel()
+                self.write_timer = None
+            try:
+                save_config(self.config, self.filename)
+            except OSError as e:
+                print(f"Error saving configuration: {e}")
+            # Don't treat our own write as an outside edit
+            self.file_state = self.stat()
+
+    def stat(self):
+        try:
+            status = os.stat(self.filename)
+        except OSError:
+            return None
+        return status.st_mtime_ns, status.st_size
+
+    def reload(self):
+        with self.lock:
+            state = self.stat()
+            if state == self.file_state:
+                return
+            self.file_state = state
+        try:
+            loaded = load_config(self.filename)
+        except (OSError, json.JSONDecodeError) as e:
+            # Usually an editor halfway through saving; the next poll retries
+            print(f"Ignoring unreadable {self.filename}: {e}")
+            with self.lock:
+                self.file_state = None
+            return
+        changes, errors = self.apply(loaded)
+        if errors:
+            metrics.CONFIG_UPDATES.inc(source="file", result="rejected")
+            print(f"Ignoring edit to {self.filename}: {'; '.join(errors)}")
+        elif changes:
+            metrics.CONFIG_UPDATES.inc(source="file", result="applied")
+            print(f"Reloaded {self.filename}: {', '.join(sorted(changes))}")
+            self.notify(changes)
+
+    def run(self):
+        while not self.stop_event.wait(self.poll_interval):
+            self.reload()
+
+    def start(self):
+        self.watcher = threading.Thread(target=self.run, daemon=True)
+        self.watcher.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.watcher:
+            self.watcher.join(self.poll_interval + 1)
+            self.watcher = None
+        with self.lock:
+            pending = self.write_timer is not None
+        if pending:
+            self.flush()
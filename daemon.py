@@ -0,0 +1,125 @@
+import sys
+import signal
+import argparse
+import threading
+
+from dotenv import load_dotenv
+
+import ipc
+import metrics
+from config_service import ConfigService
+from engine import MonitorEngine, StatsTracker
+from profiler import Profiler
+from replay import SessionRecorder
+
+# Headless monitor: runs the capture/analyze/record engine without Qt and
+# exposes it to GUI clients (monitor3-v2.py --attach) over local IPC.
+#
+# Example systemd user unit:
+#   [Service]
+#   WorkingDirectory=/path/to/AIMonitoring
+#   ExecStart=/usr/bin/python3 daemon.py --start
+#   Restart=on-failure
+
+
+def make_command_handler(engine, config_service, profiler=None):
+    def handle_command(message):
+        cmd = message.get("cmd")
+        if cmd == "start":
+            errors = config_service.update(message.get("config", {}))
+            if errors:
+                return {"type": "error", "message": "; ".join(errors)}
+            engine.start()
+            return None  # start() broadcasts the new status itself
+        if cmd == "stop":
+            engine.stop()
+            return None
+        if cmd == "status":
+            return engine.status()
+        if cmd == "stats":
+            return {"type": "stats", "summary": engine.stats_tracker.get_summary()}
+        if cmd == "config":
+            # Applied live; the engine broadcasts a config event on success
+            errors = config_service.update(message.get("config", {}))
+            return {"type": "error", "message": "; ".join(errors)} if errors else None
+        if cmd == "profile" and profiler:
+            return profiler.command(message.get("kind"), message.get("action"))
+        return {"type": "error", "message": f"Unknown command: {cmd}"}
+    return handle_command
+
+
+def log_event(event):
+    if event["type"] == "result":
+        print(f"Distracted: {event['distracted']}")
+    elif event["type"] == "state":
+        print(f"State changed: {'distracted' if event['distracted'] else 'focused'} (p={event['probability']:.2f})")
+    elif event["type"] == "presence":
+        print("User away, capture paused" if event["away"] else "User back, capture resumed")
+    elif event["type"] == "status":
+        print(f"Monitoring {'started' if event['running'] else 'stopped'}")
+    elif event["type"] == "power":
+        print(f"Power profile {event['profile']}, capturing every {event['interval']}s")
+    elif event["type"] == "config":
+        print(f"Applied settings: {', '.join(sorted(event['changes']))}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the distraction monitor headless.")
+    parser.add_argument("--config", default="config.json", help="Path to config.json")
+    parser.add_argument("--stats", default="distraction_stats.json", help="Path to the stats file")
+    parser.add_argument("--checks", default="distraction_checks.bin", help="Path to the per-check log read by stats_store.py")
+    parser.add_argument("--socket", default=None, help="IPC address: a Unix socket path or host:port")
+    parser.add_argument("--start", action="store_true", help="Start monitoring immediately instead of waiting for a client")
+    parser.add_argument("--record", default=None, metavar="SESSION", help="Record captured frames and verdicts to a session file for replay.py")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    config_service = ConfigService(args.config)
+    config = config_service.config
+    engine = MonitorEngine(config, StatsTracker.from_config(config, args.stats, args.checks))
+    config_service.add_listener(engine.apply_config)
+    config_service.start()
+
+    address = ipc.parse_address(args.socket)
+    profiler = Profiler(config['profile_dir'])
+    try:
+        server = ipc.IPCServer(address, make_command_handler(engine, config_service, profiler))
+    except OSError as e:
+        print(f"Cannot listen on {address}: {e}")
+        engine.shutdown()
+        config_service.stop()
+        return 1
+    engine.add_listener(server.broadcast)
+    engine.add_listener(log_event)
+    recorder = None
+    if args.record:
+        recorder = SessionRecorder(args.record, config)
+        engine.add_listener(recorder.handle_event)
+    server.start()
+    metrics_server = metrics.start_metrics_server(config)
+    print(f"Daemon listening on {address}")
+
+    shutdown = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: shutdown.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: shutdown.set())
+
+    if args.start:
+        engine.start()
+
+    # Event.wait() with a timeout keeps the main thread responsive to signals
+    while not shutdown.wait(1):
+        pass
+
+    print("Shutting down...")
+    engine.shutdown()
+    config_service.stop()
+    if recorder:
+        recorder.close()
+    server.stop()
+    if metrics_server:
+        metrics_server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
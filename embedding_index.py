@@ -0,0 +1,143 @@
+import os
+import zlib
+import struct
+import hashlib
+import threading
+
+import numpy as np
+from PIL import Image
+
+import metrics
+
+# Remembers what the model said about scenes it has already seen. A frame's
+# embedding is a tiny colour thumbnail built from the tile sums the capture
+# thread computes anyway (no extra pass over the pixels), mean-centred and
+# L2-normalised so a dot product is the cosine similarity. Every
+# (embedding, answer) pair from a real model call is appended to a file in
+# index_dir as one checksummed record, so a crash mid-append can only tear
+# the last record, which the next load cuts off. A new frame whose
+# nearest neighbours are all similar enough and agree on distracted or not
+# gets the nearest answer without a model call. Each prompt and model pair
+# has its own index, since answers from another prompt can't be reused.
+
+EMBEDDING_SIZE = (16, 10)
+DIMENSIONS = EMBEDDING_SIZE[0] * EMBEDDING_SIZE[1] * 3
+RECORD_HEADER = struct.Struct("<II")  # answer length in bytes, crc32 of answer and vector
+VECTOR_BYTES = DIMENSIONS * 4
+INITIAL_CAPACITY = 64  # rows preallocated; storage doubles when full, up to max_entries
+
+
+def frame_embedding(tiles):
+    # tiles: (rows, columns, 3) sums from dirty_regions.tile_sums
+    channels = []
+    for channel in range(3):
+        plane = Image.fromarray(np.ascontiguousarray(tiles[:, :, channel], dtype=np.float32), "F")
+        channels.append(np.asarray(plane.resize(EMBEDDING_SIZE, Image.Resampling.BILINEAR), dtype=np.float32))
+    vector = np.stack(channels).ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def encode_record(vector, answer):
+    payload = answer.encode("utf-8") + np.asarray(vector, dtype=np.float32).tobytes()
+    return RECORD_HEADER.pack(len(payload) - VECTOR_BYTES, zlib.crc32(payload)) + payload
+
+
+class EmbeddingIndex:
+    def __init__(self, index_dir, key, threshold=0.97, neighbours=3, max_entries=5000):
+        self.threshold = threshold
+        self.neighbours = neighbours
+        self.max_entries = max_entries
+        os.makedirs(index_dir, exist_ok=True)
+        self.path = os.path.join(index_dir, hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest() + ".emb")
+        self.lock = threading.Lock()
+        self.storage = np.zeros((INITIAL_CAPACITY, DIMENSIONS), dtype=np.float32)
+        self.answers = []
+        self.load()
+
+    @property
+    def vectors(self):
+        # The filled rows of storage, as a view
+        return self.storage[:len(self.answers)]
+
+    @classmethod
+    def from_config(cls, config, key):
+        if not config.get('embedding_index_dir'):
+            return None
+        return cls(config['embedding_index_dir'], key, config['embedding_similarity'], config['embedding_neighbours'],
+                   config['embedding_max_entries'])
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            data = f.read()
+        vectors = []
+        answers = []
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, checksum = RECORD_HEADER.unpack_from(data, offset)
+            end = offset + RECORD_HEADER.size + length + VECTOR_BYTES
+            payload = data[offset + RECORD_HEADER.size:end]
+            if end > len(data) or zlib.crc32(payload) != checksum:
+                break
+            try:
+                answers.append(payload[:length].decode("utf-8"))
+            except UnicodeDecodeError:
+                break
+            vectors.append(np.frombuffer(payload[length:], dtype=np.float32))
+            offset = end
+        if offset < len(data):
+            # A torn or corrupt tail: drop it so later appends start on a record boundary
+            print(f"Embedding index {self.path}: discarding {len(data) - offset} bytes of incomplete records")
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        self.storage = np.zeros((max(INITIAL_CAPACITY, len(vectors)), DIMENSIONS), dtype=np.float32)
+        if vectors:
+            self.storage[:len(vectors)] = vectors
+        self.answers = answers
+        metrics.EMBEDDING_ENTRIES.set(len(answers))
+
+    def lookup(self, vector, check_distraction):
+        # Returns (answer, similarity) of the nearest match when confident, else None
+        with self.lock:
+            if len(self.answers) < self.neighbours:
+                return None
+            similarities = self.vectors @ vector
+            nearest = np.argpartition(-similarities, self.neighbours - 1)[:self.neighbours]
+            nearest = nearest[np.argsort(-similarities[nearest])]
+            if similarities[nearest[-1]] < self.threshold:
+                return None
+            verdicts = {check_distraction(self.answers[i]) for i in nearest}
+            if len(verdicts) != 1:
+                metrics.EMBEDDING_DISAGREEMENTS.inc()
+                return None
+            return self.answers[nearest[0]], float(similarities[nearest[0]])
+
+    def add(self, vector, answer):
+        with self.lock:
+            count = len(self.answers)
+            if count == len(self.storage):
+                # Growing geometrically keeps appends amortised O(1)
+                storage = np.zeros((max(count + 1, min(count * 2, self.max_entries + 1)), DIMENSIONS), dtype=np.float32)
+                storage[:count] = self.storage
+                self.storage = storage
+            self.storage[count] = vector
+            self.answers.append(answer)
+            if len(self.answers) > self.max_entries:
+                # Trim to 90% so the rewrite happens once per many additions
+                keep = self.max_entries * 9 // 10
+                self.storage[:keep] = self.storage[count + 1 - keep:count + 1]
+                self.answers = self.answers[-keep:]
+                self.rewrite()
+            else:
+                with open(self.path, "ab") as f:
+                    f.write(encode_record(vector, answer))
+            metrics.EMBEDDING_ENTRIES.set(len(self.answers))
+
+    def rewrite(self):
+        # Drops the oldest entries on disk too; write then rename, as elsewhere
+        with open(self.path + ".tmp", "wb") as f:
+            f.writelines(encode_record(vector, answer) for vector, answer in zip(self.vectors, self.answers))
+        os.replace(self.path + ".tmp", self.path)
@@ -0,0 +1,104 @@
+import io
+import os
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from PIL import Image
+
+from request_body import base64_into
+
+# Moves the CPU-heavy part of a capture (BGRX -> RGB conversion, downscale,
+# PNG encode, digest and base64) into worker processes so it doesn't hold
+# the GIL the GUI and analyzer threads need. Raw pixels travel through
+# shared memory slots that are allocated once per monitor and reused every
+# tick; only the slot names and a few integers are pickled.
+
+
+def frame_digest(raw):
+    # Of the captured BGRX pixels, read in place instead of copied out first
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def encode_image(img, image_path, max_image_size=None, image_format="PNG"):
+    # Returns the PNG as a view of the encoder's buffer, and the encoded size
+    if max_image_size and max(img.size) > max_image_size:
+        img.thumbnail((max_image_size, max_image_size), Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    img.save(buffer, image_format)
+    data = buffer.getbuffer()
+    # Write then rename so readers never see a half-written frame
+    temp_path = image_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, image_path)
+    return data, img.size
+
+
+def encode_shared_frame(input_name, size, output_name, output_capacity, image_path, max_image_size, image_format):
+    # Runs in a worker process
+    source = shared_memory.SharedMemory(name=input_name)
+    try:
+        with source.buf[:size[0] * size[1] * 4] as raw:
+            digest = frame_digest(raw)
+            img = Image.frombuffer("RGB", size, raw, "raw", "BGRX", 0, 1)
+            img.load()
+    finally:
+        source.close()
+    data, encoded_size = encode_image(img, image_path, max_image_size, image_format)
+    target = shared_memory.SharedMemory(name=output_name)
+    try:
+        with target.buf[:output_capacity] as output:
+            length = base64_into(output, data)
+    finally:
+        target.close()
+    return digest, length, encoded_size
+
+
+class SharedSlot:
+    def __init__(self, raw_size):
+        self.raw_size = raw_size
+        # base64 of a PNG at most the raw size, plus headroom for incompressible frames
+        self.output_capacity = raw_size * 3 // 2 + 4096
+        self.input = shared_memory.SharedMemory(create=True, size=raw_size)
+        self.output = shared_memory.SharedMemory(create=True, size=self.output_capacity)
+
+    def release(self):
+        for block in (self.input, self.output):
+            block.close()
+            block.unlink()
+
+
+class EncodePool:
+    def __init__(self, processes=1, ring=None):
+        # spawn: forking a process that already runs Qt and capture threads is unsafe
+        self.executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+        self.slots = {}
+        self.ring = ring
+
+    def encode(self, key, screenshot, image_path, max_image_size=None, image_format="PNG"):
+        # Returns (FrameSlot holding the base64 or None, digest); key identifies the
+        # shared memory slot, e.g. the monitor index. The caller releases the FrameSlot.
+        raw = screenshot.raw  # the bgra property would make another copy
+        slot = self.slots.get(key)
+        if slot is None or slot.raw_size < len(raw):
+            if slot:
+                slot.release()
+            slot = self.slots[key] = SharedSlot(len(raw))
+        slot.input.buf[:len(raw)] = raw
+        future = self.executor.submit(encode_shared_frame, slot.input.name, tuple(screenshot.size), slot.output.name,
+                                      slot.output_capacity, image_path, max_image_size, image_format)
+        digest, length, _ = future.result()
+        # Copy out before the slot is reused by the next capture; without a
+        # free buffer the analyzer streams the frame from disk instead
+        frame_slot = self.ring.acquire(length) if self.ring else None
+        if frame_slot:
+            frame_slot.fill(slot.output.buf[:length])
+        return frame_slot, digest
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for slot in self.slots.values():
+            slot.release()
+        self.slots = {}
@@ -0,0 +1,981 @@
+import os
+import json
+import time
+import socket
+import datetime
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import mss
+import requests
+from PIL import Image
+
+import metrics
+from encode_pool import EncodePool, encode_image, frame_digest
+from frame_ring import FrameRing, release_screens
+from frame_history import FrameHistory
+from stats_store import CheckLog
+from stats_sync import StatsReplica, SyncFolder, counters_path, default_device
+from dirty_regions import DirtyRegionTracker, crop_frame, tile_sums
+from embedding_index import EmbeddingIndex, frame_embedding
+from inference_scheduler import InferenceScheduler, ResultOrderer
+from request_body import base64_length, generate_request_body
+from smoothing import make_verdict_filter
+from window_probe import MetadataClassifier, monitor_for_window, probe_active_window
+from capture_triggers import WindowWatcher
+from idle import IdleMonitor
+from power import PowerPolicy
+
+# The capture -> analyze -> record pipeline, free of any Qt dependency so it
+# can run inside the GUI process or headless under daemon.py.
+
+DEFAULT_CONFIG = {
+    "capture_interval": 30,
+    "possible_activities": ["being productive", "coding", "writing", "learning", "social media", "gaming", "watching livestream"],
+    "blacklisted_words": ["social media", "gaming", "stream"],
+    "notification_sound": "Radar.mp3",
+    # Alerts and praise, see rules.py; fired by the GUI
+    "intervention_rules": [
+        {"name": "distraction_alert", "when": "distracted", "action": "alert",
+         "message": "You seem distracted! Get back to work!"},
+        {"name": "praise", "when": "focused", "for": 1800, "cooldown": 1800, "chance": 0.3, "action": "praise",
+         "enabled": False},
+        {"name": "evening_praise", "when": "focused", "for": 1800, "cooldown": 1800, "hours": [20, 24],
+         "chance": 0.125, "action": "sound", "sound": "bladerunner.m4a"}
+    ],
+    "metrics_port": None,
+    "backend": "ollama",  # or "transformers" to run a model in-process
+    "ollama_url": "http://localhost:11434",
+    "model": "llava",
+    "prompt_template": "Describe what this person in this image is doing briefly (5 words max) from these options: {options}",
+    "transformers_model": "openai/clip-vit-base-patch32",
+    "transformers_task": "zero-shot-image-classification",  # or "visual-question-answering"
+    "transformers_quantize": True,  # int8 dynamic quantization of linear layers
+    "transformers_threads": None,
+    "transformers_batch_size": 4,
+    "transformers_batch_wait": 0.05,
+    "capture_mode": "combined",  # or "per_monitor"
+    "max_image_size": 1280,
+    "encode_processes": 1,  # worker processes for PNG/base64 encoding; 0 encodes on the capture thread
+    "frame_buffers": 4,
+    "frame_buffer_bytes": 64 * 1024 * 1024,
+    "rss_sample_interval": 60,
+    "rss_log_file": None,
+    "stats_sync_dir": None,  # shared folder for merging stats across devices, see stats_sync.py
+    "stats_device_id": None,  # defaults to the host name
+    "stats_sync_interval": 300,
+    "profile_dir": "profiles",  # where the tray menu's CPU and heap profiles are written
+    "history_dir": None,  # keep a rolling, delta-compressed history of analyzed frames here
+    "history_max_bytes": 200 * 1024 * 1024,
+    "history_keyframe_interval": 30,
+    "analysis_server": None,  # URL of a shared analysis_server.py; None talks to ollama_url directly
+    "analysis_server_token": None,
+    "client_id": None,  # defaults to the host name
+    "server_host": "127.0.0.1",
+    "server_port": 47312,
+    "server_backends": ["http://localhost:11434"],
+    "server_parallel": 2,  # requests in flight per backend, e.g. OLLAMA_NUM_PARALLEL
+    "server_batch_size": 4,
+    "server_batch_wait": 0.05,
+    "server_rate_limit": 6,  # frames per minute per client; 0 disables
+    "server_rate_burst": 3,
+    "server_queue_limit": 2,
+    "inference_workers": 1,  # requests kept in flight; match OLLAMA_NUM_PARALLEL to use spare GPU capacity
+    "inference_queue_limit": 2,  # frames waiting for the analyzer; the least useful is shed beyond this
+    "frame_deadline_factor": 1.0,  # a frame is shed if not analyzed within this many capture intervals
+    "dirty_tile_size": 64,  # pixels per side of the change-detection tiles; 0 disables
+    "dirty_reuse_threshold": 0.01,  # reuse the last verdict when at most this fraction of tiles changed
+    "dirty_crop_threshold": 0.0,  # analyze only the changed region up to this fraction; 0 disables cropping
+    "embedding_index_dir": None,  # learn answers for recurring scenes here; needs dirty_tile_size
+    "embedding_similarity": 0.97,
+    "embedding_neighbours": 3,  # this many nearest scenes must all pass the similarity bar and agree
+    "embedding_max_entries": 5000,
+    "fusion_policy": "any",  # "any", "focused" or "weighted"
+    "focused_monitor": 1,  # for "focused" when the active window's position is unknown
+    "monitor_weights": {},
+    "weighted_threshold": 0.5,
+    "smoothing_method": "ema",  # "ema", "window", "hmm" or "none"
+    "smoothing_alpha": 0.6,
+    "smoothing_enter_threshold": 0.7,
+    "smoothing_exit_threshold": 0.3,
+    "recheck_delay": 5,
+    "stable_checks": 3,
+    "stable_interval_multiplier": 2.0,
+    "idle_threshold": 300,  # seconds without input before capture pauses; 0 disables
+    "pause_when_locked": True,
+    "idle_probe_file": None,
+    "power_policy": True,  # monitor more cheaply on battery or when the machine runs hot
+    "power_poll_interval": 30,
+    "power_hot_temperature": 85,  # degrees C in the hottest thermal zone
+    "power_low_battery": 20,  # percent
+    "power_probe_file": None,
+    "power_profiles": {
+        "battery": {"interval_multiplier": 2, "max_image_size": 960},
+        "low_battery": {"interval_multiplier": 4, "max_image_size": 640, "metadata_only": True},
+        "hot": {"interval_multiplier": 4, "max_image_size": 640, "metadata_only": True}
+    },
+    "metadata_fast_path": True,
+    "window_probe_file": None,
+    "capture_triggers": True,  # also capture when the focused window, its title or the set of windows changes
+    "trigger_poll_interval": 1.0,
+    "trigger_debounce": 2.0,  # seconds without further changes before a triggered capture
+    "trigger_max_per_minute": 4,  # 0 removes the cap
+    "trigger_min_gap": 5.0,  # seconds a triggered capture keeps from the last and the next timed one
+    "metadata_rules": {
+        "twitch": "watching livestream",
+        "youtube shorts": "social media",
+        "tiktok": "social media",
+        "twitter": "social media",
+        "reddit": "social media",
+        "instagram": "social media",
+        "steam": "gaming",
+        "visual studio code": "coding",
+        "pycharm": "coding"
+    }
+}
+
+# How MonitorEngine.apply_config propagates each setting; keys not listed
+# (sounds, praise timing, probe files) are read from the config on each use
+ANALYZER_KEYS = {"possible_activities", "blacklisted_words", "ollama_url", "model", "prompt_template", "backend",
+                 "transformers_model", "transformers_task", "transformers_quantize", "transformers_threads",
+                 "transformers_batch_size", "transformers_batch_wait",
+                 "analysis_server", "analysis_server_token", "client_id", "fusion_policy",
+                 "dirty_reuse_threshold", "dirty_crop_threshold", "embedding_index_dir", "embedding_similarity",
+                 "embedding_neighbours", "embedding_max_entries", "focused_monitor", "monitor_weights", "weighted_threshold"}
+SMOOTHING_KEYS = {"smoothing_method", "smoothing_alpha", "smoothing_enter_threshold", "smoothing_exit_threshold",
+                  "recheck_delay", "stable_checks", "stable_interval_multiplier"}
+METADATA_KEYS = {"metadata_fast_path", "metadata_rules", "possible_activities", "blacklisted_words"}
+IDLE_KEYS = {"idle_threshold", "pause_when_locked", "idle_probe_file"}
+POWER_KEYS = {"power_policy", "power_poll_interval", "power_hot_temperature", "power_low_battery", "power_probe_file",
+              "power_profiles"}
+RESTART_KEYS = {"capture_mode", "dirty_tile_size", "encode_processes", "frame_buffers", "frame_buffer_bytes", "metrics_port", "metrics_host",
+                "rss_sample_interval", "rss_log_file", "stats_sync_dir", "stats_device_id", "stats_sync_interval", "history_dir", "history_max_bytes", "history_keyframe_interval",
+                "server_host", "server_port", "server_backends", "server_parallel", "server_batch_size", "server_batch_wait",
+                "server_rate_limit", "server_rate_burst", "server_queue_limit", "inference_workers", "inference_queue_limit"}
+
+
+def load_config(filename='config.json'):
+    config = dict(DEFAULT_CONFIG)
+    try:
+        with open(filename, 'r') as config_file:
+            config.update(json.load(config_file))
+    except FileNotFoundError:
+        print("Configuration file not found. Using default settings.")
+    return config
+
+
+def save_config(config, filename='config.json'):
+    # Write then rename so a crash or a reader never sees half a file
+    temp_path = filename + ".tmp"
+    with open(temp_path, 'w') as config_file:
+        json.dump(config, config_file, indent=4)
+    os.replace(temp_path, filename)
+
+
+class StatsTracker:
+    def __init__(self, filename='distraction_stats.json', check_log='distraction_checks.bin', sync_dir=None, device=None,
+                 sync_interval=300):
+        self.filename = filename
+        self.stats = self.load_stats()
+        # Every check, for long-range reports with stats_store.py
+        self.check_log = CheckLog(check_log) if check_log else None
+        # With a sync folder, self.stats is the merged view of every device's counters
+        self.replica = None
+        self.sync_folder = None
+        self.sync_interval = sync_interval
+        self.synced_at = 0
+        if sync_dir:
+            self.replica = StatsReplica(counters_path(filename), device or default_device(), self.stats)
+            self.sync_folder = SyncFolder(sync_dir, self.replica)
+            self.stats = self.replica.merged_stats()
+            self.sync()
+
+    @classmethod
+    def from_config(cls, config, filename='distraction_stats.json', check_log='distraction_checks.bin'):
+        return cls(filename, check_log, config['stats_sync_dir'], config['stats_device_id'], config['stats_sync_interval'])
+
+    def load_stats(self):
+        if os.path.exists(self.filename):
+            with open(self.filename, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def save_stats(self):
+        with open(self.filename, 'w') as f:
+            json.dump(self.stats, f, indent=2)
+        if self.replica:
+            self.replica.save()
+
+    def sync(self):
+        # Exchanges deltas with the other devices and folds their new counts into self.stats
+        self.synced_at = time.monotonic()
+        try:
+            changes = self.sync_folder.sync()
+        except OSError as e:
+            print(f"Error syncing stats: {e}")
+            return {}
+        for hour_key, added in changes.items():
+            for key in (hour_key[:10], hour_key):
+                totals = self.stats.setdefault(key, {'distractions': 0, 'checks': 0, 'total_time': 0})
+                totals['checks'] += added[0]
+                totals['distractions'] += added[1]
+                totals['total_time'] += added[2]
+        if changes:
+            print(f"Merged stats from other devices for {len(changes)} hour(s)")
+        self.save_stats()
+        return changes
+
+    def update_stats(self, is_distracted, interval):
+        now = datetime.datetime.now()
+        date_key = now.strftime('%Y-%m-%d')
+        hour_key = now.strftime('%Y-%m-%d %H:00')
+
+        if date_key not in self.stats:
+            self.stats[date_key] = {'distractions': 0, 'checks': 0, 'total_time': 0}
+        if hour_key not in self.stats:
+            self.stats[hour_key] = {'distractions': 0, 'checks': 0, 'total_time': 0}
+
+        self.stats[date_key]['checks'] += 1
+        self.stats[date_key]['total_time'] += interval
+        self.stats[hour_key]['checks'] += 1
+        self.stats[hour_key]['total_time'] += interval
+
+        if is_distracted:
+            self.stats[date_key]['distractions'] += 1
+            self.stats[hour_key]['distractions'] += 1
+        if self.check_log:
+            self.check_log.append(is_distracted, interval, now.timestamp())
+        if self.replica:
+            self.replica.increment(hour_key, is_distracted, interval)
+
+        metrics.CHECKS.inc()
+        if is_distracted:
+            metrics.DISTRACTIONS.inc()
+        metrics.DISTRACTION_RATIO.set(self.stats[date_key]['distractions'] / self.stats[date_key]['checks'])
+
+        if self.replica and time.monotonic() - self.synced_at >= self.sync_interval:
+            self.sync()
+        else:
+            self.save_stats()
+
+    def get_summary(self):
+        summary = "Distraction Statistics:\n"
+        for key, data in self.stats.items():
+            if ' ' in key:  # Hourly stats
+                summary += f"\nHour: {key}\n"
+            else:  # Daily stats
+                summary += f"\nDate: {key}\n"
+
+            total_checks = data['checks']
+            if total_checks > 0:
+                distraction_percentage = (data['distractions'] / total_checks) * 100
+                total_time = timedelta(seconds=data['total_time'])
+                summary += f"  Distractions: {data['distractions']}\n"
+                summary += f"  Percentage Distracted: {distraction_percentage:.2f}%\n"
+                summary += f"  Total Time: {total_time}\n"
+        return summary
+
+
+class ScreenCaptureThread(threading.Thread):
+    def __init__(self, interval=30, on_capture=None, debug_dir="debug_images", per_monitor=False, max_image_size=None, pre_capture=None,
+                 is_paused=None, pause_poll_interval=2, encode_processes=0, frame_ring=None, tile_size=0):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.on_capture = on_capture
+        # Called before each grab; returning True skips the screenshot for that tick
+        self.pre_capture = pre_capture
+        # While this returns True nothing is captured; it is polled so capture resumes right away
+        self.is_paused = is_paused
+        self.pause_poll_interval = pause_poll_interval
+        self.encode_processes = encode_processes
+        self.encode_pool = None
+        self.frame_ring = frame_ring
+        self.debug_dir = debug_dir
+        self.per_monitor = per_monitor
+        self.max_image_size = max_image_size
+        self.tile_size = tile_size  # 0 skips the per-tile sums used for dirty-region checks
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.next_capture_at = 0
+        self.last_capture_at = 0
+        self.sequence = 0
+        # mss handles are not shareable between threads, so each pool thread opens its own
+        self.local = threading.local()
+        self.grabbers = []
+        if not os.path.exists(self.debug_dir):
+            os.makedirs(self.debug_dir)
+
+    def run(self):
+        with mss.mss() as sct:
+            monitors = list(enumerate(sct.monitors))
+        # monitors[0] is the union of all screens; the rest are physical displays
+        targets = monitors[1:] if self.per_monitor and len(monitors) > 2 else monitors[:1]
+        if self.encode_processes:
+            try:
+                self.encode_pool = EncodePool(self.encode_processes, self.frame_ring)
+            except (OSError, ImportError) as e:
+                print(f"Encoding on the capture thread, could not start encode workers: {e}")
+        try:
+            with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="capture") as pool:
+                while not self.stop_event.is_set():
+                    if self.is_paused and self.is_paused():
+                        self.stop_event.wait(self.pause_poll_interval)
+                        continue
+                    self.sequence += 1
+                    self.last_capture_at = time.monotonic()
+                    self.next_capture_at = self.last_capture_at + self.interval
+                    if not (self.pre_capture and self.pre_capture(self.sequence)):
+                        screens = list(pool.map(lambda target: self.grab_screen(*target), targets))
+                        if self.on_capture:
+                            self.on_capture(self.sequence, screens)
+                    self.wait_for_next_capture()
+        finally:
+            for grabber in self.grabbers:
+                grabber.close()
+            if self.encode_pool:
+                self.encode_pool.close()
+                self.encode_pool = None
+
+    def grab_screen(self, index, monitor):
+        sct = getattr(self.local, "sct", None)
+        if sct is None:
+            sct = self.local.sct = mss.mss()
+            self.grabbers.append(sct)
+        screenshot = sct.grab(monitor)
+        name = "capture_latest.png" if index == 0 else f"capture_monitor{index}.png"
+        image_path = os.path.join(self.debug_dir, name)
+        tiles = tile_sums(screenshot.raw, screenshot.width, screenshot.height, self.tile_size) if self.tile_size else None
+        frame_slot = None
+        if self.encode_pool:
+            frame_slot, digest = self.encode_pool.encode(index, screenshot, image_path, self.max_image_size)
+        else:
+            # raw, not bgra: that property makes another copy of the pixels
+            digest = frame_digest(screenshot.raw)
+            img = Image.frombuffer("RGB", screenshot.size, screenshot.raw, "raw", "BGRX", 0, 1)
+            data, _ = encode_image(img, image_path, self.max_image_size)
+            # Queued frames must not read the file back: the next capture overwrites it
+            frame_slot = self.frame_ring.acquire(base64_length(len(data))) if self.frame_ring else None
+            if frame_slot:
+                frame_slot.fill_base64(data)
+        return {
+            "monitor": index,
+            "image_path": image_path,
+            "digest": digest,
+            # Without a buffer the frame is streamed from the file when the request is sent
+            "base64": frame_slot.view() if frame_slot else None,
+            "frame_slot": frame_slot,
+            "tiles": tiles,
+            "capture_size": tuple(screenshot.size),
+            "geometry": [monitor["left"], monitor["top"], monitor["width"], monitor["height"]]
+        }
+
+    def wait_for_next_capture(self):
+        # Returns early as soon as stop() is called; schedule() may move the deadline
+        while not self.stop_event.is_set():
+            remaining = self.next_capture_at - time.monotonic()
+            if remaining <= 0:
+                return
+            self.wake_event.wait(remaining)
+            self.wake_event.clear()
+
+    def schedule(self, delay):
+        self.next_capture_at = time.monotonic() + delay
+        self.wake_event.set()
+
+    def trigger(self, min_gap):
+        # Captures now unless a capture just happened or is about to anyway
+        now = time.monotonic()
+        if now - self.last_capture_at < min_gap or self.next_capture_at - now < min_gap:
+            return False
+        self.schedule(0)
+        return True
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+
+class SkippedFrame(Exception):
+    # The backend declined the frame (rate limited, superseded): no verdict, and not a check
+    pass
+
+
+class DistractionAnalyzer:
+    backend = "ollama"
+
+    def __init__(self, possible_activities=None, blacklisted_words=None, ollama_url=DEFAULT_CONFIG['ollama_url'], model=DEFAULT_CONFIG['model'],
+                 prompt_template=DEFAULT_CONFIG['prompt_template']):
+        self.possible_activities = possible_activities or []
+        self.blacklisted_words = blacklisted_words or []
+        self.ollama_url = ollama_url.rstrip('/')
+        self.model = model
+        self.prompt_template = prompt_template
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['possible_activities'], config['blacklisted_words'], config['ollama_url'], config['model'],
+                   config['prompt_template'])
+
+    def build_prompt(self):
+        options = ", ".join(self.possible_activities)
+        return self.prompt_template.format(options=options)
+
+    def analyze(self, image_path, base64_image=None):
+        question = self.build_prompt()
+        try:
+            start_time = time.monotonic()
+            answer = self.ask_llava(question, image_path, base64_image)
+            metrics.INFERENCE_LATENCY.observe(time.monotonic() - start_time, backend=self.backend)
+            print(f"LLaVA response: {answer}")
+            return self.check_distraction(answer), answer
+        except SkippedFrame:
+            raise
+        except Exception as e:
+            print(f"Error in LLaVA analysis: {e}")
+            metrics.BACKEND_ERRORS.inc(backend=self.backend, kind=type(e).__name__)
+            return False, f"Error: {e}"
+
+    def check_distraction(self, activity):
+        activity = activity.lower()
+        for blacklisted in self.blacklisted_words:
+            if blacklisted.lower() in activity:
+                return True
+        return False
+
+    def ask_llava(self, prompt, image_path, base64_image=None):
+        # The capture side usually hands over the base64 it already produced
+        response = self.generate(prompt, base64_image, image_path)
+
+        if response.status_code == 200:
+            return response.json()['response']
+        else:
+            metrics.BACKEND_ERRORS.inc(backend="ollama", kind=f"http_{response.status_code}")
+            return f"Error: {response.status_code}, {response.text}"
+
+    def generate(self, prompt, base64_image=None, image_path=None):
+        # Raw /api/generate call; the JSON body also carries token counts.
+        # The body is streamed so the image is never held as one JSON string.
+        body = generate_request_body(self.model, prompt, image_path, base64_image, {'temperature': 0})
+        return requests.post(f'{self.ollama_url}/api/generate', data=body,
+                             headers={'Content-Type': 'application/json'})
+
+
+class RemoteAnalyzer(DistractionAnalyzer):
+    # Sends frames to a shared analysis_server.py instead of a local Ollama
+    backend = "server"
+
+    def __init__(self, server_url, client_id=None, token=None, timeout=120, **kwargs):
+        super().__init__(**kwargs)
+        self.server_url = server_url.rstrip('/')
+        self.client_id = client_id or socket.gethostname()
+        self.token = token
+        self.timeout = timeout
+        self.sequence = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['analysis_server'], config['client_id'], config['analysis_server_token'],
+                   possible_activities=config['possible_activities'], blacklisted_words=config['blacklisted_words'],
+                   model=config['model'], prompt_template=config['prompt_template'])
+
+    def headers(self):
+        headers = {'X-Client-Id': self.client_id}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        return headers
+
+    def ask_llava(self, prompt, image_path, base64_image=None):
+        self.sequence += 1
+        body = generate_request_body(self.model, prompt, image_path, base64_image, {'temperature': 0})
+        headers = dict(self.headers(), **{'Content-Type': 'application/json', 'X-Sequence': str(self.sequence)})
+        response = requests.post(f'{self.server_url}/v1/frames', data=body, headers=headers)
+        if response.status_code == 429:
+            raise SkippedFrame("rate limited by the analysis server")
+        if response.status_code != 202:
+            metrics.BACKEND_ERRORS.inc(backend=self.backend, kind=f"http_{response.status_code}")
+            return f"Error: {response.status_code}, {response.text}"
+        job_id = response.json()['id']
+        # The server queues the frame; long-poll until its verdict is ready
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            response = requests.get(f'{self.server_url}/v1/verdicts/{job_id}', params={'wait': 25}, headers=self.headers())
+            if response.status_code == 204:
+                continue
+            if response.status_code != 200:
+                metrics.BACKEND_ERRORS.inc(backend=self.backend, kind=f"http_{response.status_code}")
+                return f"Error: {response.status_code}, {response.text}"
+            result = response.json()
+            if result.get('skipped'):
+                raise SkippedFrame(result['error'])
+            if 'error' in result:
+                return f"Error: {result['error']}"
+            return result['response']
+        metrics.BACKEND_ERRORS.inc(backend=self.backend, kind="timeout")
+        return "Error: timed out waiting for the analysis server"
+
+
+def make_analyzer(config):
+    if config['analysis_server']:
+        return RemoteAnalyzer.from_config(config)
+    if config['backend'] == "transformers":
+        # Imported on demand: it pulls in torch
+        from local_backend import TransformersAnalyzer
+        return TransformersAnalyzer.from_config(config)
+    return DistractionAnalyzer.from_config(config)
+
+
+def fuse_verdicts(verdicts, policy="any", weights=None, focused_monitor=None, threshold=0.5):
+    # verdicts maps monitor index -> is_distracted
+    if policy == "focused" and focused_monitor in verdicts:
+        return verdicts[focused_monitor]
+    if policy == "weighted":
+        weights = weights or {}
+        total = sum(float(weights.get(str(monitor), 1.0)) for monitor in verdicts)
+        distracted = sum(float(weights.get(str(monitor), 1.0)) for monitor, verdict in verdicts.items() if verdict)
+        return total > 0 and distracted / total >= threshold
+    return any(verdicts.values())
+
+
+class MultiScreenAnalyzer:
+    def __init__(self, analyzer, policy="any", weights=None, focused_monitor=1, threshold=0.5, tile_size=64,
+                 reuse_threshold=0.0, crop_threshold=0.0, embedding_index=None):
+        self.analyzer = analyzer
+        self.policy = policy
+        self.weights = weights or {}
+        self.focused_monitor = focused_monitor
+        self.threshold = threshold
+        # monitor index -> (digest, is_distracted, answer) of the last analyzed frame
+        self.cache = {}
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        # Below reuse_threshold of tiles changed the cached verdict stands; up
+        # to crop_threshold only the changed region is analyzed
+        self.dirty = DirtyRegionTracker(tile_size)
+        self.reuse_threshold = reuse_threshold
+        self.crop_threshold = crop_threshold
+        # Answers seen-before scenes from past model answers; None when disabled
+        self.embedding_index = embedding_index
+
+    @classmethod
+    def from_config(cls, config):
+        analyzer = make_analyzer(config)
+        embedding_index = EmbeddingIndex.from_config(config, f"{analyzer.model}\n{analyzer.build_prompt()}")
+        return cls(analyzer, config['fusion_policy'], config['monitor_weights'],
+                   config['focused_monitor'], config['weighted_threshold'], config['dirty_tile_size'],
+                   config['dirty_reuse_threshold'], config['dirty_crop_threshold'], embedding_index)
+
+    def classify(self, screen):
+        cached = self.cache.get(screen["monitor"])
+        if cached and cached[0] == screen["digest"]:
+            metrics.record_cache("screen", True)
+            return cached[1], cached[2]
+        metrics.record_cache("screen", False)
+        tiles = screen.get("tiles")
+        change = self.dirty.compare(screen["monitor"], tiles, screen["capture_size"]) if cached and tiles is not None else None
+        if change is not None:
+            fraction, box = change
+            metrics.record_cache("dirty_region", fraction <= self.reuse_threshold)
+            if fraction <= self.reuse_threshold:
+                return cached[1], cached[2]
+            if fraction <= self.crop_threshold:
+                crop = crop_frame(screen["image_path"], screen.get("base64"), box, screen["capture_size"])
+                is_distracted, answer = self.analyzer.analyze(screen["image_path"], crop)
+                if not answer.startswith("Error"):
+                    # The rest of the screen still shows what the cached verdict saw
+                    return is_distracted or cached[1], f"{answer} (changed region; rest: {cached[2]})"
+        embedding = frame_embedding(tiles) if self.embedding_index and tiles is not None else None
+        if embedding is not None:
+            match = self.embedding_index.lookup(embedding, self.analyzer.check_distraction)
+            metrics.record_cache("embedding", match is not None)
+            if match:
+                answer, similarity = match
+                is_distracted = self.analyzer.check_distraction(answer)
+                self.remember(screen, is_distracted, answer)
+                return is_distracted, f"{answer} (seen before, similarity {similarity:.3f})"
+        is_distracted, answer = self.analyzer.analyze(screen["image_path"], screen.get("base64"))
+        if not answer.startswith("Error"):
+            self.remember(screen, is_distracted, answer)
+            if embedding is not None:
+                self.embedding_index.add(embedding, answer)
+        return is_distracted, answer
+
+    def remember(self, screen, is_distracted, answer):
+        self.cache[screen["monitor"]] = (screen["digest"], is_distracted, answer)
+        if screen.get("tiles") is not None:
+            self.dirty.commit(screen["monitor"], screen["tiles"], screen["capture_size"])
+
+    def analyze(self, screens):
+        if len(screens) == 1:
+            return self.classify(screens[0])
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=len(screens), thread_name_prefix="analyze")
+        results = list(self.pool.map(self.classify, screens))
+        verdicts = {screen["monitor"]: result[0] for screen, result in zip(screens, results)}
+        focused = next((screen["monitor"] for screen in screens if screen.get("focused")), self.focused_monitor)
+        is_distracted = fuse_verdicts(verdicts, self.policy, self.weights, focused, self.threshold)
+        answer = "; ".join(f"screen {screen['monitor']}: {result[1]}" for screen, result in zip(screens, results))
+        return is_distracted, answer
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+
+class AnalysisWorker(threading.Thread):
+    def __init__(self, analyzer, on_result, scheduler=None, on_release=None):
+        super().__init__(daemon=True)
+        self.analyzer = analyzer
+        self.on_result = on_result
+        self.scheduler = scheduler or InferenceScheduler()
+        # Called with each analyzer this worker is done with; the analyzer may
+        # be shared with other workers, so only its owner decides to close it
+        self.on_release = on_release or (lambda analyzer: analyzer.close())
+        self.pending_analyzer = None
+        self.pending_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def submit(self, sequence, screens, deadline=float("inf"), priority=0):
+        return self.scheduler.submit(sequence, screens, deadline, priority)
+
+    def replace_analyzer(self, analyzer):
+        # Takes effect from the next frame; the old one is released by run()
+        with self.pending_lock:
+            skipped, self.pending_analyzer = self.pending_analyzer, analyzer
+        if skipped:
+            self.release(skipped)
+
+    def release(self, analyzer):
+        try:
+            self.on_release(analyzer)
+        except Exception as e:
+            print(f"Error closing analyzer: {e}")
+
+    def run(self):
+        while not self.stop_event.is_set():
+            frame = self.scheduler.take(timeout=0.1)
+            if frame is None:
+                continue
+            sequence, screens = frame
+            with self.pending_lock:
+                old = None
+                if self.pending_analyzer:
+                    old, self.analyzer, self.pending_analyzer = self.analyzer, self.pending_analyzer, None
+            if old:
+                self.release(old)
+            metrics.ANALYSIS_WORKERS_BUSY.inc()
+            try:
+                is_distracted, answer = self.analyzer.analyze(screens)
+            except SkippedFrame as e:
+                # Like a frame shed from the queue: later results needn't wait for it
+                print(f"Frame {sequence} skipped: {e}")
+                metrics.SHED_FRAMES.inc(reason="skipped")
+                if self.scheduler.on_shed:
+                    self.scheduler.on_shed(sequence)
+                continue
+            except Exception as e:
+                # Still answer the frame, or the orderer holds back every later result
+                print(f"Error in analysis worker: {e}")
+                is_distracted, answer = False, f"Error: {e}"
+            finally:
+                release_screens(screens)
+                metrics.ANALYSIS_WORKERS_BUSY.dec()
+            if not self.stop_event.is_set():
+                self.on_result(sequence, is_distracted, answer)
+        self.scheduler.drain()
+        with self.pending_lock:
+            pending, self.pending_analyzer = self.pending_analyzer, None
+        if pending:
+            self.release(pending)
+        self.release(self.analyzer)
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+
+class MonitorEngine:
+    def __init__(self, config, stats_tracker=None):
+        self.config = config
+        self.stats_tracker = stats_tracker or StatsTracker.from_config(config)
+        self.listeners = []
+        self.capture_thread = None
+        self.window_watcher = None
+        self.analysis_workers = []
+        self.result_orderer = ResultOrderer(self.handle_result)
+        self.verdict_filter = make_verdict_filter(config)
+        self.metadata_classifier = None
+        self.idle_monitor = None
+        self.power_policy = None
+        self.away = False
+        self.run_id = 0  # bumped on every start; capture sequences restart with it
+        self.analyzer_users = {}  # id -> [analyzer, workers still using it]
+        self.analyzer_lock = threading.Lock()
+        self.window_hint = (0, False)  # (sequence, title suggests distraction) from the metadata probe
+        self.window_metadata = (0, None)  # (sequence, probed active window)
+        # Shared by every capture thread so buffers survive stop/start
+        # Enough for every frame in flight or queued, plus the one being captured
+        self.frame_ring = FrameRing(max(config['frame_buffers'], config['inference_workers'] + config['inference_queue_limit'] + 1),
+                                    config['frame_buffer_bytes'])
+        self.rss_sampler = metrics.start_rss_sampler(config)
+        self.frame_history = FrameHistory.from_config(config)
+        if self.frame_history:
+            self.frame_history.start()
+            self.add_listener(self.frame_history.handle_event)
+        self.lock = threading.Lock()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def emit(self, event):
+        event.setdefault("timestamp", time.time())
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Error in engine listener: {e}")
+
+    def is_running(self):
+        return self.capture_thread is not None
+
+    def status(self):
+        return {
+            "type": "status",
+            "running": self.is_running(),
+            "distracted": self.verdict_filter.distracted,
+            "away": self.away,
+            "interval": self.setting('capture_interval'),
+            "power_profile": self.power_policy.profile if self.power_policy else "normal",
+            "possible_activities": self.config['possible_activities'],
+            "blacklisted_words": self.config['blacklisted_words']
+        }
+
+    def start(self, **overrides):
+        with self.lock:
+            if self.capture_thread:
+                return
+            self.config.update(overrides)
+            self.verdict_filter = make_verdict_filter(self.config)
+            self.metadata_classifier = MetadataClassifier.from_config(self.config) if self.config['metadata_fast_path'] else None
+            self.idle_monitor = IdleMonitor.from_config(self.config)
+            self.power_policy = PowerPolicy.from_config(self.config)
+            if self.power_policy:
+                self.power_policy.check()
+            self.away = False
+            self.run_id += 1
+            # Workers share one analyzer (and its per-screen cache) and one queue;
+            # their verdicts are put back in capture order before handle_result
+            analyzer = MultiScreenAnalyzer.from_config(self.config)
+            self.share_analyzer(analyzer, self.config['inference_workers'])
+            self.result_orderer = ResultOrderer(self.handle_result)
+            scheduler = InferenceScheduler(self.config['inference_queue_limit'], self.result_orderer.cancel)
+            self.analysis_workers = [AnalysisWorker(analyzer, self.result_orderer.complete, scheduler, self.release_analyzer)
+                                     for _ in range(self.config['inference_workers'])]
+            for worker in self.analysis_workers:
+                worker.start()
+            self.capture_thread = ScreenCaptureThread(self.setting('capture_interval'), self.handle_capture,
+                                                      per_monitor=self.config['capture_mode'] == "per_monitor",
+                                                      max_image_size=self.setting('max_image_size'),
+                                                      pre_capture=self.handle_metadata,
+                                                      is_paused=self.check_presence,
+                                                      encode_processes=self.config['encode_processes'],
+                                                      frame_ring=self.frame_ring,
+                                                      tile_size=self.config['dirty_tile_size'])
+            self.capture_thread.start()
+            self.window_watcher = WindowWatcher(self.config, self.handle_trigger, is_paused=lambda: self.away)
+            self.window_watcher.start()
+        self.emit(self.status())
+
+    def stop(self):
+        with self.lock:
+            if not self.capture_thread:
+                return
+            self.capture_thread.stop()
+            self.window_watcher.stop()
+            for worker in self.analysis_workers:
+                worker.stop_event.set()
+            for worker in self.analysis_workers:
+                worker.stop()
+            self.capture_thread = None
+            self.window_watcher = None
+            self.analysis_workers = []
+        self.emit(self.status())
+
+    def shutdown(self):
+        # stop() plus the threads that live as long as the engine
+        self.stop()
+        if self.frame_history:
+            self.remove_listener(self.frame_history.handle_event)
+            self.frame_history.stop()
+            self.frame_history = None
+        if self.rss_sampler:
+            self.rss_sampler.stop()
+            self.rss_sampler = None
+
+    def apply_config(self, changes):
+        # Pushes changed settings into the running pipeline instead of restarting it
+        with self.lock:
+            self.config.update(changes)
+            keys = set(changes)
+            if keys & SMOOTHING_KEYS:
+                self.verdict_filter = make_verdict_filter(self.config)
+            if keys & METADATA_KEYS:
+                self.metadata_classifier = MetadataClassifier.from_config(self.config) if self.config['metadata_fast_path'] else None
+            if keys & IDLE_KEYS:
+                self.idle_monitor = IdleMonitor.from_config(self.config)
+            if keys & POWER_KEYS:
+                self.power_policy = PowerPolicy.from_config(self.config)
+            running = self.capture_thread is not None
+            if running and keys & ANALYZER_KEYS:
+                # A fresh analyzer also drops cached verdicts made under the old options
+                analyzer = MultiScreenAnalyzer.from_config(self.config)
+                self.share_analyzer(analyzer, len(self.analysis_workers))
+                for worker in self.analysis_workers:
+                    worker.replace_analyzer(analyzer)
+            if running and keys & ({'max_image_size'} | POWER_KEYS):
+                self.capture_thread.max_image_size = self.setting('max_image_size')
+            if running and keys & ({'capture_interval'} | POWER_KEYS):
+                self.capture_thread.interval = self.setting('capture_interval')
+                self.capture_thread.schedule(self.verdict_filter.next_delay(self.setting('capture_interval')))
+            if keys & RESTART_KEYS:
+                print(f"Takes effect after a restart: {', '.join(sorted(keys & RESTART_KEYS))}")
+        self.emit({"type": "config", "changes": changes})
+
+    def share_analyzer(self, analyzer, users):
+        with self.analyzer_lock:
+            self.analyzer_users[id(analyzer)] = [analyzer, users]
+
+    def release_analyzer(self, analyzer):
+        # Closed once the last worker using it has moved on or stopped
+        with self.analyzer_lock:
+            entry = self.analyzer_users[id(analyzer)]
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self.analyzer_users[id(analyzer)]
+        analyzer.close()
+
+    def setting(self, key):
+        # The user's setting as adjusted by the current power profile
+        power_policy = self.power_policy
+        return power_policy.adjust(key, self.config[key]) if power_policy else self.config[key]
+
+    def check_power(self):
+        power_policy = self.power_policy
+        if power_policy is None or power_policy.check() is None:
+            return
+        print(f"Power profile: {power_policy.profile}")
+        capture_thread = self.capture_thread
+        if capture_thread:
+            # Runs on the capture thread just before it schedules the next tick
+            capture_thread.max_image_size = self.setting('max_image_size')
+            capture_thread.interval = self.setting('capture_interval')
+        self.emit({"type": "power", "profile": power_policy.profile, "interval": self.setting('capture_interval')})
+
+    def check_presence(self):
+        # Polled by the capture thread on every tick, paused or not
+        self.check_power()
+        idle_monitor = self.idle_monitor
+        if idle_monitor is None:
+            return False
+        away = idle_monitor.is_away()
+        if away != self.away:
+            self.away = away
+            metrics.USER_AWAY.set(1 if away else 0)
+            self.emit({"type": "presence", "away": away})
+        return away
+
+    def handle_trigger(self, reason):
+        capture_thread = self.capture_thread
+        if capture_thread is None or self.away:
+            return False
+        return capture_thread.trigger(self.config['trigger_min_gap'])
+
+    def handle_metadata(self, sequence):
+        classifier = self.metadata_classifier
+        if classifier is None:
+            return False
+        metadata = probe_active_window(self.config['window_probe_file'])
+        self.window_metadata = (sequence, metadata)
+        verdict = classifier.classify(metadata)
+        if verdict is None:
+            metrics.METADATA_VERDICTS.inc(result="ambiguous")
+            self.window_hint = (sequence, classifier.hints_distraction(metadata))
+            # A power profile may rule out screenshots; the tick then has no verdict
+            power_policy = self.power_policy
+            return bool(power_policy and power_policy.metadata_only())
+        is_distracted, activity = verdict
+        metrics.METADATA_VERDICTS.inc(result="distracted" if is_distracted else "focused")
+        self.emit({"type": "window", "run": self.run_id, "seq": sequence, "title": metadata.get("title", ""), "process": metadata.get("process", "")})
+        # Still waits for any earlier frame in flight, so results stay in capture order
+        self.result_orderer.complete(sequence, is_distracted, f"{activity} (from window: {metadata.get('title') or metadata.get('process')})")
+        return True
+
+    def handle_capture(self, sequence, screens):
+        if len(screens) > 1 and self.config['fusion_policy'] == "focused":
+            self.mark_focused_screen(sequence, screens)
+        # Listeners run before the next capture overwrites the files
+        self.emit({
+            "type": "capture",
+            "run": self.run_id,
+            "seq": sequence,
+            "image_path": os.path.abspath(screens[0]["image_path"]),
+            "screens": [{"monitor": screen["monitor"], "image_path": os.path.abspath(screen["image_path"]),
+                         "focused": screen.get("focused", False)} for screen in screens]
+        })
+        workers = self.analysis_workers
+        if workers:
+            # Frames the window title flags, or that decide a pending state
+            # change, jump the queue when the analyzer is behind
+            priority = 0
+            if self.window_hint == (sequence, True):
+                priority += 2
+            if self.verdict_filter.is_uncertain():
+                priority += 1
+            deadline = time.monotonic() + self.setting('capture_interval') * self.config['frame_deadline_factor']
+            self.result_orderer.expect(sequence)
+            workers[0].submit(sequence, screens, deadline, priority)
+        else:
+            release_screens(screens)
+
+    def mark_focused_screen(self, sequence, screens):
+        # Where the active window is now, not where focused_monitor says
+        probed_sequence, metadata = self.window_metadata
+        if probed_sequence != sequence:
+            metadata = probe_active_window(self.config['window_probe_file'])
+        focused = monitor_for_window((metadata or {}).get("geometry"), screens)
+        if focused is not None:
+            for screen in screens:
+                screen["focused"] = screen["monitor"] == focused
+
+    def handle_result(self, sequence, is_distracted, answer):
+        self.stats_tracker.update_stats(is_distracted, self.setting('capture_interval'))
+
+        # Failed checks carry no evidence either way
+        confidence = 0.0 if answer.startswith("Error") else 1.0
+        verdict_filter = self.verdict_filter
+        changed = verdict_filter.update(is_distracted, confidence)
+        self.emit({"type": "result", "run": self.run_id, "seq": sequence, "distracted": is_distracted, "answer": answer,
+                   "state": verdict_filter.distracted, "probability": verdict_filter.probability})
+        if changed:
+            metrics.STATE_TRANSITIONS.inc(state="distracted" if verdict_filter.distracted else "focused")
+            self.emit({"type": "state", "run": self.run_id, "seq": sequence, "distracted": verdict_filter.distracted,
+                       "probability": verdict_filter.probability})
+
+        capture_thread = self.capture_thread
+        if capture_thread:
+            interval = self.setting('capture_interval')
+            delay = verdict_filter.next_delay(interval)
+            if delay != interval:
+                if delay < interval:
+                    metrics.RECHECKS.inc()
+                capture_thread.schedule(delay)
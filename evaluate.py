@@ -0,0 +1,204 @@
+import io
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from engine import load_config, make_analyzer
+from fake_ollama import FakeOllamaServer
+from replay import percentile
+
+# Runs a labeled frame corpus through several prompt/model/preprocessing
+# configurations and reports accuracy next to what each one costs.
+#
+# A corpus is a directory of frames plus labels.json mapping file names to
+# true (distracted) or false (focused). The configuration file is a JSON
+# list; each entry overrides keys of config.json and may add preprocessing:
+#   {"name": "llava-small-jpeg", "model": "llava", "max_size": 768,
+#    "format": "JPEG", "quality": 80, "blacklisted_words": [...]}
+# See eval_configs.example.json. Variants run on whichever backend their
+# config selects (Ollama, transformers or an analysis server); token
+# counts are only reported by Ollama.
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+VARIANT_KEYS = ("name", "max_size", "format", "quality")
+
+
+def load_corpus(corpus_dir):
+    with open(os.path.join(corpus_dir, "labels.json"), "r") as f:
+        labels = json.load(f)
+    frames = []
+    for name, label in sorted(labels.items()):
+        path = os.path.join(corpus_dir, name)
+        if not name.lower().endswith(IMAGE_EXTENSIONS) or not os.path.exists(path):
+            print(f"Skipping missing or unsupported frame: {name}")
+            continue
+        frames.append((path, bool(label)))
+    return frames
+
+
+def preprocess(image_path, max_size=None, image_format=None, quality=85):
+    if not max_size and not image_format:
+        with open(image_path, "rb") as f:
+            return f.read()
+    img = Image.open(image_path)
+    img = img.convert("RGB")
+    if max_size and max(img.size) > max_size:
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image_format = (image_format or "PNG").upper()
+    if image_format in ("JPEG", "WEBP"):
+        img.save(buffer, image_format, quality=quality)
+    else:
+        img.save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def evaluate_frame(analyzer, settings, image_path, label):
+    payload = base64.b64encode(preprocess(image_path, settings.get("max_size"), settings.get("format"),
+                                          settings.get("quality", 85)))
+    start_time = time.monotonic()
+    try:
+        if analyzer.backend == "ollama":
+            response = analyzer.generate(analyzer.build_prompt(), payload)
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            result = response.json()
+        else:
+            answer = analyzer.ask_llava(analyzer.build_prompt(), image_path, payload)
+            if answer.startswith("Error"):
+                raise RuntimeError(answer)
+            result = {"response": answer}
+        latency = time.monotonic() - start_time
+    except Exception as e:
+        print(f"Error evaluating {image_path} with {settings['name']}: {e}")
+        return {"label": label, "error": True, "latency": time.monotonic() - start_time, "payload": len(payload)}
+    return {
+        "label": label,
+        "error": False,
+        "predicted": analyzer.check_distraction(result.get("response", "")),
+        "latency": latency,
+        "prompt_tokens": result.get("prompt_eval_count", 0),
+        "output_tokens": result.get("eval_count", 0),
+        "payload": len(payload)
+    }
+
+
+def summarize(name, results):
+    scored = [r for r in results if not r["error"]]
+    true_positive = sum(1 for r in scored if r["predicted"] and r["label"])
+    false_positive = sum(1 for r in scored if r["predicted"] and not r["label"])
+    false_negative = sum(1 for r in scored if not r["predicted"] and r["label"])
+    correct = sum(1 for r in scored if r["predicted"] == r["label"])
+    precision = true_positive / (true_positive + false_positive) if true_positive + false_positive else 0.0
+    recall = true_positive / (true_positive + false_negative) if true_positive + false_negative else 0.0
+    latencies = [r["latency"] for r in scored]
+    count = len(scored) or 1
+    return {
+        "name": name,
+        "frames": len(results),
+        "errors": len(results) - len(scored),
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "accuracy": correct / count,
+        "latency_p50": percentile(latencies, 0.50),
+        "latency_p90": percentile(latencies, 0.90),
+        "prompt_tokens": sum(r["prompt_tokens"] for r in scored) / count,
+        "output_tokens": sum(r["output_tokens"] for r in scored) / count,
+        "payload_kb": sum(r["payload"] for r in results) / (len(results) or 1) / 1024
+    }
+
+
+def run_evaluation(frames, base_config, variants, workers=4):
+    jobs = []
+    for settings in variants:
+        unknown = sorted(key for key in settings if key not in base_config and key not in VARIANT_KEYS)
+        if unknown:
+            print(f"Ignoring unknown settings in {settings['name']}: {', '.join(unknown)}")
+        config = dict(base_config)
+        config.update({key: value for key, value in settings.items() if key in base_config})
+        analyzer = make_analyzer(config)
+        jobs.extend((settings, analyzer, path, label) for path, label in frames)
+
+    # All configurations share one pool, so slow ones don't serialize the run
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(lambda job: (job[0]["name"], evaluate_frame(job[1], job[0], job[2], job[3])), jobs))
+
+    results = {settings["name"]: [] for settings in variants}
+    for name, outcome in outcomes:
+        results[name].append(outcome)
+    return [summarize(name, results[name]) for name in results]
+
+
+def format_table(summaries, best=None):
+    header = f"{'config':<24} {'prec':>6} {'recall':>6} {'f1':>6} {'p50 ms':>8} {'p90 ms':>8} {'in tok':>7} {'out tok':>7} {'KB':>8} {'err':>4}"
+    lines = [header, "-" * len(header)]
+    for s in summaries:
+        marker = " *" if best and s["name"] == best["name"] else ""
+        lines.append(f"{s['name'][:24]:<24} {s['precision']:>6.2f} {s['recall']:>6.2f} {s['f1']:>6.2f} "
+                     f"{s['latency_p50'] * 1000:>8.0f} {s['latency_p90'] * 1000:>8.0f} {s['prompt_tokens']:>7.0f} "
+                     f"{s['output_tokens']:>7.1f} {s['payload_kb']:>8.1f} {s['errors']:>4}{marker}")
+    return "\n".join(lines)
+
+
+def cheapest_passing(summaries, min_precision=0.0, min_recall=0.0):
+    passing = [s for s in summaries if s["precision"] >= min_precision and s["recall"] >= min_recall and not s["errors"]]
+    if not passing:
+        return None
+    return min(passing, key=lambda s: (s["latency_p50"], s["prompt_tokens"] + s["output_tokens"], s["payload_kb"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare prompt/model/preprocessing configurations on a labeled frame corpus.")
+    parser.add_argument("corpus", help="Directory with frames and labels.json")
+    parser.add_argument("--variants", default=None, help="JSON list of configurations (defaults to config.json alone)")
+    parser.add_argument("--config", default="config.json", help="Base configuration every variant starts from")
+    parser.add_argument("--workers", type=int, default=4, help="Requests kept in flight across all configurations")
+    parser.add_argument("--min-precision", type=float, default=0.0)
+    parser.add_argument("--min-recall", type=float, default=0.0)
+    parser.add_argument("--fake", action="store_true", help="Run against a local fake Ollama server")
+    parser.add_argument("--json", action="store_true", help="Print the summaries as JSON")
+    args = parser.parse_args(argv)
+
+    base_config = load_config(args.config)
+    if args.variants:
+        with open(args.variants, "r") as f:
+            variants = json.load(f)
+    else:
+        variants = [{"name": "current"}]
+
+    fake_server = None
+    if args.fake:
+        fake_server = FakeOllamaServer()
+        fake_server.start()
+        base_config.update({"ollama_url": fake_server.url, "backend": "ollama", "analysis_server": None})
+        for settings in variants:
+            for key in ("ollama_url", "backend", "analysis_server"):
+                settings.pop(key, None)
+
+    try:
+        summaries = run_evaluation(load_corpus(args.corpus), base_config, variants, args.workers)
+    finally:
+        if fake_server:
+            fake_server.stop()
+
+    best = cheapest_passing(summaries, args.min_precision, args.min_recall)
+    if args.json:
+        print(json.dumps({"summaries": summaries, "best": best["name"] if best else None}, indent=2))
+    else:
+        print(format_table(summaries, best))
+        if best:
+            print(f"\nCheapest configuration meeting precision >= {args.min_precision} and recall >= {args.min_recall}: {best['name']}")
+        else:
+            print("\nNo configuration meets the accuracy bar.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
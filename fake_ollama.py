@@ -0,0 +1,93 @@
+import sys
+import json
+import time
+import zlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stand-in for Ollama's /api/generate so the pipeline can be exercised and
+# benchmarked without a GPU. The answer for a frame is picked from a fixed
+# list by hashing the image, so repeated runs give identical verdicts.
+
+DEFAULT_ANSWERS = ["coding", "writing", "learning", "social media", "gaming", "watching livestream"]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    answers = DEFAULT_ANSWERS
+    delay = 0.0
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length))
+        except json.JSONDecodeError:
+            self.send_error(400, "Invalid JSON")
+            return
+
+        start_time = time.monotonic()
+        if self.delay:
+            time.sleep(self.delay)
+        images = request.get("images") or [""]
+        answer = self.answers[zlib.crc32(images[0].encode("ascii")) % len(self.answers)]
+        body = json.dumps({
+            "model": request.get("model", "llava"),
+            "response": answer,
+            "done": True,
+            # Rough token counts in the same fields Ollama reports
+            "prompt_eval_count": len(request.get("prompt", "").split()) + 576 * len(images),
+            "eval_count": len(answer.split()),
+            "total_duration": int((time.monotonic() - start_time) * 1e9)
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeOllamaServer(threading.Thread):
+    def __init__(self, port=0, host="127.0.0.1", answers=None, delay=0.0):
+        super().__init__(daemon=True)
+        attributes = {"answers": list(answers or DEFAULT_ANSWERS), "delay": delay}
+        handler = type("BoundFakeOllamaHandler", (FakeOllamaHandler,), attributes)
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def run(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve canned LLaVA answers on an Ollama-compatible endpoint.")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to sleep per request to simulate inference")
+    parser.add_argument("--answers", nargs="+", default=DEFAULT_ANSWERS)
+    args = parser.parse_args(argv)
+
+    server = FakeOllamaServer(args.port, answers=args.answers, delay=args.delay)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
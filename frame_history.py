@@ -0,0 +1,284 @@
+import io
+import os
+import sys
+import json
+import zlib
+import queue
+import argparse
+import threading
+
+import numpy as np
+from PIL import Image
+
+import metrics
+
+# Optional rolling history of analyzed frames, so a disputed alert can be
+# looked at afterwards. Frames are grouped into segments: the first frame
+# of a segment is kept as its PNG (the keyframe) and every later frame as
+# the zlib-compressed XOR against the previous one, which is mostly zeros
+# for a screen that barely changed. Each segment is a .bin file of blobs
+# plus a .idx file of JSON lines pointing into it. Every engine run starts
+# new segments (capture sequences restart with it) and in per_monitor mode
+# each monitor has its own, so a frame is keyed by segment and sequence.
+# Result events are linked to their frames through dicts, so finding the
+# frames behind an alert is O(1) plus at most one segment of deltas to
+# replay. Whole segments are pruned oldest-first on the writer thread to
+# stay under max_bytes.
+
+
+def _result_key(timestamp):
+    return int(round(timestamp * 1000))
+
+
+class FrameHistory:
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, keyframe_interval=30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keyframe_interval = keyframe_interval
+        self.frames = {}      # (segment, seq) -> frame entry
+        self.results = {}     # result timestamp in ms -> [(segment, seq)], one per monitor
+        self.run_frames = {}  # (run, seq) -> [(segment, seq)] for frames still waiting for their verdict
+        self.segments = []    # segment names, oldest first
+        self.segment_sizes = {}
+        self.run_id = None
+        self.streams = {}     # monitor -> current segment, with the pixels of its last frame for the next delta
+        self.lock = threading.Lock()
+        self.pending = queue.Queue(maxsize=8)
+        self.writer = None
+        os.makedirs(directory, exist_ok=True)
+        self.load_index()
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.get('history_dir'):
+            return None
+        return cls(config['history_dir'], config['history_max_bytes'], config['history_keyframe_interval'])
+
+    def path(self, segment, extension):
+        return os.path.join(self.directory, f"{segment}.{extension}")
+
+    def load_index(self):
+        names = sorted(name[:-4] for name in os.listdir(self.directory) if name.endswith(".idx"))
+        for segment in names:
+            if not os.path.exists(self.path(segment, "bin")):
+                continue
+            self.segments.append(segment)
+            self.segment_sizes[segment] = os.path.getsize(self.path(segment, "bin")) + os.path.getsize(self.path(segment, "idx"))
+            with open(self.path(segment, "idx"), "r") as f:
+                for line in f:
+                    try:
+                        self.index_entry(segment, json.loads(line))
+                    except json.JSONDecodeError:
+                        break  # Torn final line after a crash
+
+    def index_entry(self, segment, entry):
+        key = (segment, entry["seq"])
+        if "offset" in entry:
+            entry["segment"] = segment
+            self.frames[key] = entry
+        elif key in self.frames:
+            self.frames[key].update(entry)
+            self.results.setdefault(_result_key(entry["result_timestamp"]), []).append(key)
+
+    def append(self, segment, blob, entry):
+        with open(self.path(segment, "bin"), "ab") as f:
+            entry["offset"] = f.tell()
+            f.write(blob)
+        entry["length"] = len(blob)
+        self.write_index(segment, entry)
+        self.index_entry(segment, entry)
+        self.segment_sizes[segment] = self.segment_sizes.get(segment, 0) + len(blob)
+
+    def write_index(self, segment, entry):
+        line = json.dumps({key: value for key, value in entry.items() if key != "segment"}) + "\n"
+        with open(self.path(segment, "idx"), "a") as f:
+            f.write(line)
+        self.segment_sizes[segment] = self.segment_sizes.get(segment, 0) + len(line)
+
+    # Engine listener. Only the file read happens on the capture thread;
+    # decoding, diffing and compression run on the writer thread.
+    def handle_event(self, event):
+        run = event.get("run")
+        if event["type"] == "capture":
+            screens = event.get("screens") or [{"monitor": 0, "image_path": event["image_path"]}]
+            try:
+                pngs = []
+                for screen in screens:
+                    with open(screen["image_path"], "rb") as f:
+                        pngs.append((screen["monitor"], f.read()))
+                self.pending.put_nowait(("frame", run, event["seq"], event["timestamp"], pngs))
+            except (OSError, queue.Full):
+                metrics.HISTORY_SKIPPED.inc()
+        elif event["type"] == "result":
+            try:
+                self.pending.put_nowait(("result", run, event["seq"], event["timestamp"], event))
+            except queue.Full:
+                metrics.HISTORY_SKIPPED.inc()
+
+    def start(self):
+        self.prune()  # max_bytes may have shrunk since the last run
+        self.writer = threading.Thread(target=self.run, daemon=True)
+        self.writer.start()
+
+    def stop(self):
+        if self.writer:
+            self.pending.put(None)
+            self.writer.join(5)
+            self.writer = None
+
+    def run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            kind, run, sequence, timestamp, payload = item
+            try:
+                with self.lock:
+                    if kind == "frame":
+                        if run != self.run_id:
+                            # Sequences restart with the engine; so do segments
+                            self.run_id = run
+                            self.streams = {}
+                            self.run_frames = {}
+                        for monitor, png in payload:
+                            self.store_frame(run, sequence, timestamp, monitor, png)
+                    else:
+                        self.store_result(run, sequence, timestamp, payload)
+                self.prune()
+            except Exception as e:
+                print(f"Error writing frame history: {e}")
+
+    def store_frame(self, run, sequence, timestamp, monitor, png):
+        pixels = np.asarray(Image.open(io.BytesIO(png)).convert("RGB"))
+        current = self.streams.get(monitor)
+        if current is None or current["pixels"].shape != pixels.shape or current["count"] >= self.keyframe_interval:
+            # Named by wall clock, so segments from different runs never share a name
+            segment = f"seg_{int(timestamp * 1000):015d}" + (f"_m{monitor}" if monitor else "")
+            current = self.streams[monitor] = {"name": segment, "count": 0}
+            self.segments.append(segment)
+            entry = {"seq": sequence, "timestamp": timestamp, "monitor": monitor, "kind": "key"}
+            self.append(segment, png, entry)
+        else:
+            delta = np.bitwise_xor(pixels, current["pixels"])
+            entry = {"seq": sequence, "timestamp": timestamp, "monitor": monitor, "kind": "delta",
+                     "previous": current["last_seq"], "shape": list(pixels.shape)}
+            self.append(current["name"], zlib.compress(delta.tobytes(), 6), entry)
+        self.run_frames.setdefault((run, sequence), []).append((current["name"], sequence))
+        current["count"] += 1
+        current["last_seq"] = sequence
+        current["pixels"] = pixels
+
+    def store_result(self, run, sequence, timestamp, event):
+        # Fast-path verdicts have no frame
+        for key in self.run_frames.pop((run, sequence), []):
+            frame = self.frames.get(key)
+            if frame is None:
+                continue
+            entry = {"seq": sequence, "result_timestamp": timestamp, "distracted": event["distracted"], "answer": event["answer"]}
+            self.write_index(frame["segment"], entry)
+            self.index_entry(frame["segment"], entry)
+
+    def total_bytes(self):
+        return sum(self.segment_sizes.values())
+
+    def prune(self):
+        with self.lock:
+            while len(self.segments) > 1 and self.total_bytes() > self.max_bytes:
+                segment = self.segments.pop(0)
+                for key in [key for key in self.frames if key[0] == segment]:
+                    frame = self.frames.pop(key)
+                    if "result_timestamp" in frame:
+                        result = _result_key(frame["result_timestamp"])
+                        keys = [other for other in self.results.get(result, []) if other != key]
+                        if keys:
+                            self.results[result] = keys
+                        else:
+                            self.results.pop(result, None)
+                # Frames whose verdict never came (dropped by a busy analyzer)
+                for frame_key, keys in list(self.run_frames.items()):
+                    keys = [key for key in keys if key[0] != segment]
+                    if keys:
+                        self.run_frames[frame_key] = keys
+                    else:
+                        del self.run_frames[frame_key]
+                for monitor, current in list(self.streams.items()):
+                    if current["name"] == segment:
+                        del self.streams[monitor]
+                for extension in ("bin", "idx"):
+                    try:
+                        os.remove(self.path(segment, extension))
+                    except OSError:
+                        pass
+                self.segment_sizes.pop(segment, None)
+            metrics.HISTORY_BYTES.set(self.total_bytes())
+
+    def read_blob(self, frame):
+        with open(self.path(frame["segment"], "bin"), "rb") as f:
+            f.seek(frame["offset"])
+            return f.read(frame["length"])
+
+    def frame_for_key(self, key):
+        with self.lock:
+            chain = []
+            seen = set()
+            frame = self.frames.get(key)
+            while frame is not None and frame["kind"] == "delta":
+                if key in seen:
+                    return None  # A cycle in the "previous" links: not a chain that ends in a keyframe
+                seen.add(key)
+                chain.append(frame)
+                key = (frame["segment"], frame["previous"])
+                frame = self.frames.get(key)
+            if frame is None:
+                return None
+            pixels = np.asarray(Image.open(io.BytesIO(self.read_blob(frame))).convert("RGB"))
+            for delta in reversed(chain):
+                data = np.frombuffer(zlib.decompress(self.read_blob(delta)), dtype=np.uint8).reshape(delta["shape"])
+                pixels = np.bitwise_xor(pixels, data)
+        return Image.fromarray(pixels)
+
+    def frame_for_result(self, timestamp):
+        # timestamp is the "timestamp" of a result event; several monitors come out side by side
+        with self.lock:
+            keys = sorted(self.results.get(_result_key(timestamp), []),
+                          key=lambda key: self.frames[key].get("monitor", 0) if key in self.frames else 0)
+        images = [image for image in (self.frame_for_key(key) for key in keys) if image is not None]
+        if len(images) <= 1:
+            return images[0] if images else None
+        combined = Image.new("RGB", (sum(image.width for image in images), max(image.height for image in images)))
+        left = 0
+        for image in images:
+            combined.paste(image, (left, 0))
+            left += image.width
+        return combined
+
+    def list_results(self):
+        with self.lock:
+            return [self.frames[keys[0]] for _, keys in sorted(self.results.items()) if keys[0] in self.frames]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the rolling frame history.")
+    parser.add_argument("directory", help="history_dir from config.json")
+    parser.add_argument("--list", action="store_true", help="List stored results with their verdicts")
+    parser.add_argument("--at", type=float, default=None, help="Result timestamp to extract")
+    parser.add_argument("--out", default="history_frame.png", help="Where to write the extracted frame")
+    args = parser.parse_args(argv)
+
+    history = FrameHistory(args.directory, max_bytes=float("inf"))
+    if args.list:
+        for frame in history.list_results():
+            verdict = "distracted" if frame["distracted"] else "focused"
+            print(f"{frame['result_timestamp']:.3f}  seq {frame['seq']:>6}  {verdict:<10}  {frame['answer']}")
+    if args.at is not None:
+        image = history.frame_for_result(args.at)
+        if image is None:
+            print("No frame stored for that event.")
+            return 1
+        image.save(args.out)
+        print(f"Saved {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
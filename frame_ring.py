@@ -0,0 +1,79 @@
+import threading
+
+import metrics
+from request_body import base64_into
+
+# Reusable buffers for encoded frames. The capture side borrows a buffer,
+# fills it in place, and the analyzer returns it once the request has been
+# sent, so a long session recycles the same few buffers instead of
+# allocating a new multi-megabyte object every tick. The ring never holds
+# more than max_bytes; when it is exhausted, acquire() returns None and the
+# caller falls back to streaming the frame from disk.
+
+
+class FrameSlot:
+    def __init__(self, ring, size):
+        self.ring = ring
+        self.buffer = bytearray(size)
+        self.length = 0
+
+    def view(self):
+        return memoryview(self.buffer)[:self.length]
+
+    def fill(self, data):
+        length = len(data)
+        self.buffer[:length] = data
+        self.length = length
+
+    def fill_base64(self, data):
+        self.length = base64_into(self.buffer, data)
+
+    def release(self):
+        self.ring.release(self)
+
+
+class FrameRing:
+    def __init__(self, slot_count=4, max_bytes=64 * 1024 * 1024):
+        self.slot_count = slot_count
+        self.max_bytes = max_bytes
+        self.free = []
+        self.allocated = 0
+        self.in_use = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, size):
+        with self.lock:
+            for i, slot in enumerate(self.free):
+                if len(slot.buffer) >= size:
+                    return self.lend(self.free.pop(i))
+            # Only a resolution change gets here once the ring is warm:
+            # drop free buffers that are too small to make room
+            while self.free and (self.allocated + size > self.max_bytes or len(self.free) + self.in_use >= self.slot_count):
+                self.allocated -= len(self.free.pop().buffer)
+            if self.allocated + size > self.max_bytes or self.in_use >= self.slot_count:
+                metrics.FRAME_BUFFER_EXHAUSTED.inc()
+                return None
+            self.allocated += size
+            metrics.FRAME_BUFFER_BYTES.set(self.allocated)
+            return self.lend(FrameSlot(self, size))
+
+    def lend(self, slot):
+        self.in_use += 1
+        metrics.FRAME_BUFFERS_IN_USE.set(self.in_use)
+        return slot
+
+    def release(self, slot):
+        with self.lock:
+            slot.length = 0
+            self.free.append(slot)
+            self.in_use -= 1
+            metrics.FRAME_BUFFERS_IN_USE.set(self.in_use)
+            metrics.FRAME_BUFFER_BYTES.set(self.allocated)
+
+
+def release_screens(screens):
+    for screen in screens:
+        slot = screen.pop("frame_slot", None)
+        if slot:
+            screen["base64"] = None
+            slot.release()
@@ -0,0 +1,116 @@
+import os
+import re
+import sys
+import json
+import shutil
+import subprocess
+
+# Detects when nobody is at the keyboard (input idle time) or the screen is
+# locked, so the engine can stop capturing and calling the model until the
+# user is back. Every source is best effort; a missing one just means "not
+# idle" rather than an error.
+
+PROBE_TIMEOUT = 1
+
+
+def _run(command):
+    if not shutil.which(command[0]):
+        return None
+    try:
+        return subprocess.run(command, capture_output=True, text=True, timeout=PROBE_TIMEOUT, check=True).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def idle_seconds_linux():
+    if os.environ.get("DISPLAY"):
+        output = _run(["xprintidle"])
+        if output and output.strip().isdigit():
+            return int(output) / 1000
+    # GNOME on Wayland exposes the idle time over D-Bus
+    output = _run(["gdbus", "call", "--session", "--dest", "org.gnome.Mutter.IdleMonitor",
+                   "--object-path", "/org/gnome/Mutter/IdleMonitor/Core",
+                   "--method", "org.gnome.Mutter.IdleMonitor.GetIdletime"])
+    match = re.search(r"uint64 (\d+)", output or "")
+    return int(match.group(1)) / 1000 if match else None
+
+
+def locked_linux():
+    session = os.environ.get("XDG_SESSION_ID")
+    if session:
+        output = _run(["loginctl", "show-session", session, "-p", "LockedHint", "--value"])
+        if output:
+            return output.strip() == "yes"
+    output = _run(["gdbus", "call", "--session", "--dest", "org.gnome.ScreenSaver",
+                   "--object-path", "/org/gnome/ScreenSaver", "--method", "org.gnome.ScreenSaver.GetActive"])
+    return "true" in output if output else None
+
+
+def idle_seconds_macos():
+    output = _run(["ioreg", "-c", "IOHIDSystem", "-d", "4"])
+    match = re.search(r'"HIDIdleTime" = (\d+)', output or "")
+    return int(match.group(1)) / 1e9 if match else None
+
+
+def idle_seconds_windows():
+    import ctypes
+
+    class LASTINPUTINFO(ctypes.Structure):
+        _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+    info = LASTINPUTINFO()
+    info.cbSize = ctypes.sizeof(info)
+    if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+        return None
+    # Both are 32-bit millisecond counters that wrap after 49.7 days of uptime
+    get_tick_count = ctypes.windll.kernel32.GetTickCount
+    get_tick_count.restype = ctypes.c_uint32
+    return ((get_tick_count() - info.dwTime) % 2 ** 32) / 1000
+
+
+def probe_file(path):
+    # Stand-in for tests: {"idle_seconds": 600, "locked": false}
+    try:
+        with open(path, "r") as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None, None
+    return state.get("idle_seconds"), state.get("locked")
+
+
+def probe_idle(probe_path=None):
+    # Returns (idle seconds or None, locked or None)
+    if probe_path:
+        return probe_file(probe_path)
+    try:
+        if sys.platform == "darwin":
+            return idle_seconds_macos(), None
+        if sys.platform == "win32":
+            return idle_seconds_windows(), None
+        return idle_seconds_linux(), locked_linux()
+    except Exception as e:
+        print(f"Error probing idle time: {e}")
+        return None, None
+
+
+class IdleMonitor:
+    def __init__(self, threshold=300, pause_when_locked=True, probe_path=None):
+        self.threshold = threshold
+        self.pause_when_locked = pause_when_locked
+        self.probe_path = probe_path
+        self.warned = False
+
+    @classmethod
+    def from_config(cls, config):
+        if not config['idle_threshold']:
+            return None
+        return cls(config['idle_threshold'], config['pause_when_locked'], config['idle_probe_file'])
+
+    def is_away(self):
+        idle_seconds, locked = probe_idle(self.probe_path)
+        if idle_seconds is None and locked is None and not self.warned:
+            print("No idle time source found; capture will not pause when you are away.")
+            self.warned = True
+        if self.pause_when_locked and locked:
+            return True
+        return idle_seconds is not None and idle_seconds >= self.threshold
@@ -0,0 +1,113 @@
+import time
+import heapq
+import threading
+
+import metrics
+from frame_ring import release_screens
+
+# Sits between capture and the analysis worker(s). Every frame carries a
+# deadline (capture time plus a multiple of the capture interval: past it,
+# a newer frame is on its way and the verdict would be stale) and a
+# priority from cheap signals such as the window title or a pending state
+# change. Workers take the highest priority first, earliest deadline
+# within a priority; frames that expire while queued are shed instead of
+# analyzed, and when the queue is full the least useful frame is dropped.
+# Under overload this bounds the delay between a capture and its verdict.
+#
+# With several workers verdicts finish out of order; ResultOrderer holds
+# them back until every earlier frame still in flight has been answered or
+# shed, so stats and the verdict filter always see capture order.
+
+
+class InferenceScheduler:
+    def __init__(self, queue_limit=2, on_shed=None):
+        self.queue_limit = queue_limit
+        self.on_shed = on_shed  # called with the sequence of every frame that won't be analyzed
+        self.heap = []  # (-priority, deadline, sequence, captured_at, screens)
+        self.condition = threading.Condition()
+
+    def submit(self, sequence, screens, deadline, priority=0):
+        entry = (-priority, deadline, sequence, time.monotonic(), screens)
+        with self.condition:
+            heapq.heappush(self.heap, entry)
+            if len(self.heap) > self.queue_limit:
+                # Lowest priority first, then the frame closest to going stale
+                victim = max(self.heap, key=lambda item: (item[0], -item[1]))
+                self.heap.remove(victim)
+                heapq.heapify(self.heap)
+                self.shed(victim, "overflow")
+                metrics.DROPPED_FRAMES.inc()
+                if victim is entry:
+                    metrics.QUEUE_DEPTH.set(len(self.heap))
+                    return False
+            metrics.QUEUE_DEPTH.set(len(self.heap))
+            self.condition.notify()
+        return True
+
+    def take(self, timeout=0.1):
+        # Returns (sequence, screens) for the next frame worth analyzing, or None
+        with self.condition:
+            end = time.monotonic() + timeout
+            while True:
+                while self.heap:
+                    entry = heapq.heappop(self.heap)
+                    metrics.QUEUE_DEPTH.set(len(self.heap))
+                    now = time.monotonic()
+                    if entry[1] < now:
+                        self.shed(entry, "expired")
+                        continue
+                    metrics.FRAME_WAIT.observe(now - entry[3])
+                    return entry[2], entry[4]
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def shed(self, entry, reason):
+        metrics.SHED_FRAMES.inc(reason=reason)
+        release_screens(entry[4])
+        if self.on_shed:
+            self.on_shed(entry[2])
+
+    def drain(self):
+        with self.condition:
+            for entry in self.heap:
+                release_screens(entry[4])
+                if self.on_shed:
+                    self.on_shed(entry[2])
+            self.heap = []
+            metrics.QUEUE_DEPTH.set(0)
+
+
+class ResultOrderer:
+    def __init__(self, deliver):
+        self.deliver = deliver  # deliver(sequence, *result), called in capture order
+        self.outstanding = set()
+        self.ready = []  # (sequence, result) heap
+        self.lock = threading.Lock()
+
+    def expect(self, sequence):
+        with self.lock:
+            self.outstanding.add(sequence)
+
+    def cancel(self, sequence):
+        with self.lock:
+            self.outstanding.discard(sequence)
+            self.flush()
+
+    def complete(self, sequence, *result):
+        # Also takes results that were never expected, e.g. window-title verdicts
+        with self.lock:
+            self.outstanding.discard(sequence)
+            if self.outstanding and min(self.outstanding) < sequence:
+                metrics.HELD_RESULTS.inc()
+            heapq.heappush(self.ready, (sequence, result))
+            self.flush()
+
+    def flush(self):
+        while self.ready and (not self.outstanding or self.ready[0][0] < min(self.outstanding)):
+            sequence, result = heapq.heappop(self.ready)
+            try:
+                self.deliver(sequence, *result)
+            except Exception as e:
+                print(f"Error delivering result {sequence}: {e}")
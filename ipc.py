@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import errno
+import socket
+import tempfile
+import threading
+
+# Local IPC between the headless daemon and GUI clients: newline-delimited
+# JSON over a Unix socket (or loopback TCP where Unix sockets are missing).
+# Clients send {"cmd": ...} requests; the daemon replies on the same
+# connection and broadcasts engine events to every connected client.
+
+DEFAULT_TCP_PORT = 47311
+
+
+def default_address():
+    if hasattr(socket, "AF_UNIX") and sys.platform != "win32":
+        return os.path.join(tempfile.gettempdir(), f"aimonitor-{os.getuid()}.sock")
+    return ("127.0.0.1", DEFAULT_TCP_PORT)
+
+
+def parse_address(value):
+    if value is None:
+        return default_address()
+    if isinstance(value, tuple):
+        return value
+    host, sep, port = value.rpartition(":")
+    if sep and port.isdigit() and os.sep not in value:
+        return (host or "127.0.0.1", int(port))
+    return value
+
+
+def _family(address):
+    return socket.AF_INET if isinstance(address, tuple) else socket.AF_UNIX
+
+
+def send_message(sock, message, lock=None):
+    data = (json.dumps(message) + "\n").encode("utf-8")
+    if lock:
+        with lock:
+            sock.sendall(data)
+    else:
+        sock.sendall(data)
+
+
+def read_messages(sock):
+    reader = sock.makefile("r", encoding="utf-8")
+    for line in reader:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            print(f"Ignoring malformed IPC message: {line[:200]}")
+
+
+def remove_stale_socket(address):
+    # Only a socket nobody answers on is left over from a previous run;
+    # a live one belongs to a daemon that is still running
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    probe.settimeout(1)
+    try:
+        probe.connect(address)
+    except (ConnectionRefusedError, FileNotFoundError):
+        try:
+            os.remove(address)
+        except FileNotFoundError:
+            pass
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, f"Another daemon is already listening on {address}")
+
+
+class IPCServer(threading.Thread):
+    def __init__(self, address, handle_command):
+        super().__init__(daemon=True)
+        self.address = address
+        self.handle_command = handle_command
+        self.clients = {}
+        self.clients_lock = threading.Lock()
+        self.sock = socket.socket(_family(address), socket.SOCK_STREAM)
+        if isinstance(address, tuple):
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind(address)
+        else:
+            if os.path.exists(address):
+                remove_stale_socket(address)
+            # Created owner-only from the start, not chmod-ed after clients could connect
+            umask = os.umask(0o177)
+            try:
+                self.sock.bind(address)
+            finally:
+                os.umask(umask)
+        self.sock.listen()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            with self.clients_lock:
+                self.clients[conn] = threading.Lock()
+            threading.Thread(target=self.serve_client, args=(conn,), daemon=True).start()
+
+    def serve_client(self, conn):
+        try:
+            for message in read_messages(conn):
+                try:
+                    reply = self.handle_command(message)
+                except Exception as e:
+                    print(f"Error handling IPC command {message.get('cmd')}: {e}")
+                    reply = {"type": "error", "message": str(e)}
+                if reply is not None:
+                    self.send(conn, reply)
+        except OSError:
+            pass
+        finally:
+            self.drop_client(conn)
+
+    def send(self, conn, message):
+        with self.clients_lock:
+            lock = self.clients.get(conn)
+        if lock is None:
+            return
+        try:
+            send_message(conn, message, lock)
+        except OSError:
+            self.drop_client(conn)
+
+    def broadcast(self, message):
+        with self.clients_lock:
+            conns = list(self.clients)
+        for conn in conns:
+            self.send(conn, message)
+
+    def drop_client(self, conn):
+        with self.clients_lock:
+            self.clients.pop(conn, None)
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def stop(self):
+        self.running = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        with self.clients_lock:
+            conns = list(self.clients)
+        for conn in conns:
+            self.drop_client(conn)
+        if not isinstance(self.address, tuple) and os.path.exists(self.address):
+            os.remove(self.address)
+
+
+class IPCClient:
+    def __init__(self, address=None, timeout=5):
+        self.address = parse_address(address)
+        self.sock = socket.socket(_family(self.address), socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(self.address)
+        self.sock.settimeout(None)
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        send_message(self.sock, message, self.lock)
+
+    def messages(self):
+        return read_messages(self.sock)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
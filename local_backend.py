@@ -0,0 +1,145 @@
+import io
+import base64
+import threading
+from concurrent.futures import Future
+
+from PIL import Image
+
+import metrics
+from engine import DistractionAnalyzer
+
+# In-process inference through transformers, for machines without an Ollama
+# server. The default is CLIP zero-shot classification over
+# possible_activities: it answers with the best-matching activity, which
+# check_distraction handles like a LLaVA answer, and runs on a laptop CPU
+# in well under a second. A visual-question-answering model can be used
+# instead with transformers_task. Linear layers are dynamically quantized
+# to int8 on CPU. One worker thread per loaded model owns it and runs
+# requests in batches; the model is loaded once per process and survives
+# config reloads that rebuild the analyzer, which only retune its thread
+# count and batching.
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def load_pipeline(model, task, quantize=True, threads=None):
+    # Imported here: torch and transformers are heavy and only needed for this backend
+    import torch
+    from transformers import pipeline
+
+    if threads:
+        torch.set_num_threads(threads)
+    pipe = pipeline(task, model=model, device=-1)
+    if quantize:
+        pipe.model = torch.quantization.quantize_dynamic(pipe.model, {torch.nn.Linear}, dtype=torch.qint8)
+    pipe.model.eval()
+    return pipe
+
+
+class BatchWorker(threading.Thread):
+    def __init__(self, pipe, task, batch_size=4, batch_wait=0.05, threads=None):
+        super().__init__(daemon=True)
+        self.pipe = pipe
+        self.task = task
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.threads = threads
+        self.pending = []
+        self.condition = threading.Condition()
+
+    def configure(self, threads, batch_size, batch_wait):
+        with self.condition:
+            self.batch_size = batch_size
+            self.batch_wait = batch_wait
+            self.condition.notify()
+        if threads and threads != self.threads:
+            import torch
+            torch.set_num_threads(threads)  # process-wide, like at load
+            self.threads = threads
+
+    def submit(self, image, prompt, labels):
+        future = Future()
+        with self.condition:
+            self.pending.append((image, prompt, tuple(labels), future))
+            self.condition.notify()
+        return future
+
+    def take_batch(self):
+        # Same shape as the analysis server's batching: wait for one request,
+        # then briefly for more with the same prompt and labels
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            self.condition.wait_for(lambda: len(self.pending) >= self.batch_size, self.batch_wait)
+            key = self.pending[0][1:3]
+            # By position: comparing items would compare the images pixel by pixel
+            taken = [index for index, item in enumerate(self.pending) if item[1:3] == key][:self.batch_size]
+            batch = [self.pending[index] for index in taken]
+            taken = set(taken)
+            self.pending = [item for index, item in enumerate(self.pending) if index not in taken]
+            return batch
+
+    def run(self):
+        while True:
+            batch = self.take_batch()
+            metrics.LOCAL_BATCH_SIZE.observe(len(batch))
+            images = [item[0] for item in batch]
+            _, prompt, labels, _ = batch[0]
+            try:
+                if self.task == "zero-shot-image-classification":
+                    outputs = self.pipe(images, candidate_labels=list(labels))
+                    answers = [output[0]["label"] for output in outputs]
+                else:
+                    outputs = self.pipe(image=images, question=prompt)
+                    answers = [output[0]["answer"] if isinstance(output, list) else output["answer"] for output in outputs]
+            except Exception as e:
+                for item in batch:
+                    item[3].set_exception(e)
+                continue
+            for item, answer in zip(batch, answers):
+                item[3].set_result(answer)
+
+
+def get_worker(model, task, quantize, threads, batch_size, batch_wait):
+    # Keyed by what needs a reload; the other settings are applied to the running worker
+    key = (model, task, quantize)
+    with _workers_lock:
+        worker = _workers.get(key)
+        if worker is None:
+            print(f"Loading {model} for {task}{' (int8)' if quantize else ''}...")
+            worker = _workers[key] = BatchWorker(load_pipeline(model, task, quantize, threads), task, batch_size, batch_wait,
+                                                 threads)
+            worker.start()
+        elif (worker.threads, worker.batch_size, worker.batch_wait) != (threads or worker.threads, batch_size, batch_wait):
+            worker.configure(threads, batch_size, batch_wait)
+        return worker
+
+
+class TransformersAnalyzer(DistractionAnalyzer):
+    backend = "transformers"
+
+    def __init__(self, model_name, task="zero-shot-image-classification", quantize=True, threads=None, batch_size=4,
+                 batch_wait=0.05, timeout=60, **kwargs):
+        super().__init__(**kwargs)
+        self.model = model_name
+        self.task = task
+        self.timeout = timeout
+        self.worker_settings = (model_name, task, quantize, threads, batch_size, batch_wait)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['transformers_model'], config['transformers_task'], config['transformers_quantize'],
+                   config['transformers_threads'], config['transformers_batch_size'], config['transformers_batch_wait'],
+                   possible_activities=config['possible_activities'], blacklisted_words=config['blacklisted_words'],
+                   prompt_template=config['prompt_template'])
+
+    def ask_llava(self, prompt, image_path, base64_image=None):
+        # Decode now: the file may be overwritten by the next capture while queued
+        if base64_image is not None:
+            image = Image.open(io.BytesIO(base64.b64decode(bytes(base64_image))))
+        else:
+            image = Image.open(image_path)
+        image = image.convert("RGB")
+        worker = get_worker(*self.worker_settings)
+        return worker.submit(image, prompt, self.possible_activities).result(self.timeout)
@@ -0,0 +1,354 @@
+import os
+import sys
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal Prometheus/OpenMetrics exporter. Metrics live in a process-wide
+# registry so any part of the monitor can record into them; the HTTP server
+# only renders the current values when scraped.
+
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(label_names, labels):
+    if set(labels) != set(label_names):
+        raise ValueError(f"Expected labels {label_names}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in label_names)
+
+
+def _format_labels(label_names, key, extra=None):
+    pairs = list(zip(label_names, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    type_name = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.values = {} if self.label_names else {(): 0}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = _label_key(self.label_names, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        key = _label_key(self.label_names, labels)
+        with self.lock:
+            return self.values.get(key, 0)
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield f"{self.name}_total{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Gauge:
+    type_name = "gauge"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.values = {} if self.label_names else {(): 0}
+        self.functions = {}
+        self.lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function, **labels):
+        # Evaluated lazily on every scrape, e.g. for process RSS
+        key = _label_key(self.label_names, labels)
+        with self.lock:
+            self.functions[key] = function
+
+    def get(self, **labels):
+        key = _label_key(self.label_names, labels)
+        with self.lock:
+            function = self.functions.get(key)
+            value = self.values.get(key, 0)
+        return function() if function else value
+
+    def samples(self):
+        with self.lock:
+            items = dict(self.values)
+            functions = dict(self.functions)
+        for key, function in functions.items():
+            try:
+                items[key] = function()
+            except Exception as e:
+                print(f"Error evaluating gauge {self.name}: {e}")
+        for key, value in items.items():
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Histogram:
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        key = _label_key(self.label_names, labels)
+        with self.lock:
+            counts, _ = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            return counts[-1]
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self.values.items()]
+        for key, counts, total in items:
+            for bound, count in zip(self.buckets, counts):
+                labels = _format_labels(self.label_names, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_count{labels} {counts[-1]}"
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+
+
+class MetricsRegistry:
+    def __init__(self, prefix="aimonitor_"):
+        self.prefix = prefix
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                return self.metrics[metric.name]
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self.register(Counter(self.prefix + name, help_text, label_names))
+
+    def gauge(self, name, help_text, label_names=()):
+        return self.register(Gauge(self.prefix + name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(self.prefix + name, help_text, label_names, buckets))
+
+    def render(self, openmetrics=False):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            # OpenMetrics names a counter's family without the _total its
+            # samples carry; the Prometheus text format names it after them
+            name = metric.name if openmetrics or metric.type_name != "counter" else metric.name + "_total"
+            lines.append(f"# HELP {name} {metric.help_text}")
+            lines.append(f"# TYPE {name} {metric.type_name}")
+            lines.extend(metric.samples())
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def process_rss_bytes():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS, but the best we get without /proc
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+REGISTRY = MetricsRegistry()
+
+CHECKS = REGISTRY.counter("checks", "Screen checks recorded by the stats tracker")
+DISTRACTIONS = REGISTRY.counter("distractions", "Checks classified as distracted")
+DISTRACTION_RATIO = REGISTRY.gauge("distraction_ratio", "Fraction of today's checks classified as distracted")
+INFERENCE_LATENCY = REGISTRY.histogram("inference_latency_seconds", "Time spent waiting for a verdict from the backend", ("backend",))
+QUEUE_DEPTH = REGISTRY.gauge("queue_depth", "Captured frames waiting in the inference scheduler's queue")
+DROPPED_FRAMES = REGISTRY.counter("dropped_frames", "Frames dropped because the inference scheduler's queue was full (shed_frames with reason overflow)")
+SHED_FRAMES = REGISTRY.counter("shed_frames", "Frames discarded instead of analyzed: expired or overflow in the inference scheduler, skipped by the analysis server", ("reason",))
+FRAME_WAIT = REGISTRY.histogram("frame_wait_seconds", "Time a frame waited in the inference scheduler before analysis")
+HELD_RESULTS = REGISTRY.counter("held_results", "Verdicts held back until an earlier frame's verdict arrived")
+CROPPED_FRAMES = REGISTRY.counter("cropped_frames", "Frames analyzed as just their changed region")
+EMBEDDING_ENTRIES = REGISTRY.gauge("embedding_index_entries", "Scenes remembered by the embedding index")
+EMBEDDING_DISAGREEMENTS = REGISTRY.counter("embedding_disagreements", "Close matches sent to the model because neighbours disagreed")
+ANALYSIS_WORKERS_BUSY = REGISTRY.gauge("analysis_workers_busy", "Inference requests currently in flight")
+CACHE_REQUESTS = REGISTRY.counter("cache_requests", "Verdict cache lookups by outcome", ("cache", "result"))
+BACKEND_ERRORS = REGISTRY.counter("backend_errors", "Failed inference requests", ("backend", "kind"))
+STATE_TRANSITIONS = REGISTRY.counter("state_transitions", "Smoothed focus state changes", ("state",))
+RECHECKS = REGISTRY.counter("rechecks", "Early confirming checks requested by the verdict filter")
+METADATA_VERDICTS = REGISTRY.counter("metadata_verdicts", "Window-title fast path outcomes", ("result",))
+CAPTURE_TRIGGERS = REGISTRY.counter("capture_triggers", "Window events that asked for a capture outside the timer", ("reason", "result"))
+POWER_PROFILE = REGISTRY.gauge("power_profile", "1 for the power profile currently applied", ("profile",))
+POWER_PROFILE_SWITCHES = REGISTRY.counter("power_profile_switches", "Switches between power profiles, by the profile switched to", ("profile",))
+BATTERY_PERCENT = REGISTRY.gauge("battery_percent", "Battery charge as last read by the power policy")
+TEMPERATURE = REGISTRY.gauge("temperature_celsius", "Hottest thermal zone as last read by the power policy")
+RULE_FIRINGS = REGISTRY.counter("rule_firings", "Alert and praise rules fired", ("rule",))
+USER_AWAY = REGISTRY.gauge("user_away", "1 while capture is paused because the user is idle or the screen is locked")
+FRAME_BUFFER_BYTES = REGISTRY.gauge("frame_buffer_bytes", "Memory held by the reusable frame buffer ring")
+FRAME_BUFFERS_IN_USE = REGISTRY.gauge("frame_buffers_in_use", "Frame buffers currently borrowed by the pipeline")
+FRAME_BUFFER_EXHAUSTED = REGISTRY.counter("frame_buffer_exhausted", "Frames streamed from disk because no buffer was free")
+PROCESS_RSS = REGISTRY.gauge("process_resident_memory_bytes", "Resident set size of the monitor process")
+PROCESS_RSS.set_function(process_rss_bytes)
+PROCESS_RSS_PEAK = REGISTRY.gauge("process_resident_memory_peak_bytes", "Highest RSS seen by the RSS sampler")
+HISTORY_BYTES = REGISTRY.gauge("history_bytes", "Disk used by the rolling frame history")
+HISTORY_SKIPPED = REGISTRY.counter("history_skipped", "Frames or verdicts left out of the history because its writer fell behind")
+CONFIG_UPDATES = REGISTRY.counter("config_updates", "Configuration changes by source and outcome", ("source", "result"))
+SERVER_FRAMES = REGISTRY.counter("server_frames", "Frames submitted to the analysis server by outcome", ("result",))
+SERVER_QUEUE_DEPTH = REGISTRY.gauge("server_queue_depth", "Frames queued on the analysis server across all clients")
+SERVER_BATCH_SIZE = REGISTRY.histogram("server_batch_size", "Frames per batch pulled by an analysis server worker",
+                                       buckets=(1, 2, 4, 8, 16, 32))
+LOCAL_BATCH_SIZE = REGISTRY.histogram("local_batch_size", "Frames per batch run by the in-process transformers backend",
+                                      buckets=(1, 2, 4, 8, 16, 32))
+
+
+class RssSampler(threading.Thread):
+    # Tracks RSS over long runs: peak as a gauge, and optionally a CSV of
+    # "unix_time,rss_bytes" lines to plot week-long daemon sessions
+    def __init__(self, interval=60, log_path=None):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.log_path = log_path
+        self.peak = 0
+        self.stop_event = threading.Event()
+
+    def sample(self):
+        rss = process_rss_bytes()
+        if rss > self.peak:
+            self.peak = rss
+            PROCESS_RSS_PEAK.set(rss)
+        if self.log_path:
+            try:
+                with open(self.log_path, "a") as f:
+                    f.write(f"{time.time():.0f},{rss}\n")
+            except OSError as e:
+                print(f"Could not write RSS log: {e}")
+        return rss
+
+    def run(self):
+        self.sample()
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def start_rss_sampler(config):
+    if not config.get("rss_sample_interval"):
+        return None
+    sampler = RssSampler(config["rss_sample_interval"], config.get("rss_log_file"))
+    sampler.start()
+    return sampler
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = self.registry.render(openmetrics).encode("utf-8")
+        if openmetrics:
+            content_type = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+        else:
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes happen every few seconds; keep stdout for the monitor itself
+        pass
+
+
+class MetricsServer(threading.Thread):
+    def __init__(self, port=9464, host="127.0.0.1", registry=REGISTRY):
+        super().__init__(daemon=True)
+        handler = type("BoundMetricsRequestHandler", (MetricsRequestHandler,), {"registry": registry})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def run(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_metrics_server(config):
+    port = config.get("metrics_port")
+    if port is None:
+        return None
+    try:
+        server = MetricsServer(int(port), config.get("metrics_host", "127.0.0.1"))
+    except OSError as e:
+        print(f"Could not start metrics exporter on port {port}: {e}")
+        return None
+    server.start()
+    print(f"Metrics exporter listening on http://{config.get('metrics_host', '127.0.0.1')}:{server.port}/metrics")
+    return server
@@ -1,78 +1,23 @@
 import sys
-import mss
 import time
 import random
+import argparse
 from PyQt6.QtWidgets import QDialog, QApplication, QMainWindow, QPushButton, QHBoxLayout, QVBoxLayout, QWidget, QLabel, QSpinBox, QLineEdit, QSystemTrayIcon, QMenu, QMessageBox
-from PyQt6.QtCore import QThread, pyqtSignal, Qt, QTimer, QRectF
-from PyQt6.QtGui import QPixmap, QImage, QIcon, QColor, QPainter, QPainterPath, QPen
-from PIL import Image
-import os
-import base64
-import requests
+from PyQt6.QtCore import QThread, QObject, pyqtSignal, Qt, QTimer, QRectF
+from PyQt6.QtGui import QPixmap, QIcon, QColor, QPainter, QPainterPath, QPen
 from dotenv import load_dotenv
 from gtts import gTTS
 from playsound import playsound
-import datetime
-import json
-from datetime import timedelta
-import os
+import metrics
+import ipc
+from config_service import ConfigService
+from engine import MonitorEngine, load_config
+from profiler import Profiler
+from rules import RuleEngine
 
 # Load environment variables
 load_dotenv()
 
-class StatsTracker:
-    def __init__(self, filename='distraction_stats.json'):
-        self.filename = filename
-        self.stats = self.load_stats()
-
-    def load_stats(self):
-        if os.path.exists(self.filename):
-            with open(self.filename, 'r') as f:
-                return json.load(f)
-        return {}
-
-    def save_stats(self):
-        with open(self.filename, 'w') as f:
-            json.dump(self.stats, f, indent=2)
-
-    def update_stats(self, is_distracted, interval):
-        now = datetime.datetime.now()
-        date_key = now.strftime('%Y-%m-%d')
-        hour_key = now.strftime('%Y-%m-%d %H:00')
-
-        if date_key not in self.stats:
-            self.stats[date_key] = {'distractions': 0, 'checks': 0, 'total_time': 0}
-        if hour_key not in self.stats:
-            self.stats[hour_key] = {'distractions': 0, 'checks': 0, 'total_time': 0}
-
-        self.stats[date_key]['checks'] += 1
-        self.stats[date_key]['total_time'] += interval
-        self.stats[hour_key]['checks'] += 1
-        self.stats[hour_key]['total_time'] += interval
-
-        if is_distracted:
-            self.stats[date_key]['distractions'] += 1
-            self.stats[hour_key]['distractions'] += 1
-
-        self.save_stats()
-
-    def get_summary(self):
-        summary = "Distraction Statistics:\n"
-        for key, data in self.stats.items():
-            if ' ' in key:  # Hourly stats
-                summary += f"\nHour: {key}\n"
-            else:  # Daily stats
-                summary += f"\nDate: {key}\n"
-            
-            total_checks = data['checks']
-            if total_checks > 0:
-                distraction_percentage = (data['distractions'] / total_checks) * 100
-                total_time = timedelta(seconds=data['total_time'])
-                summary += f"  Distractions: {data['distractions']}\n"
-                summary += f"  Percentage Distracted: {distraction_percentage:.2f}%\n"
-                summary += f"  Total Time: {total_time}\n"
-        return summary
-
 class DistractionPopup(QDialog):
     def __init__(self, message, parent=None):
         super().__init__(parent, Qt.WindowType.WindowStaysOnTopHint | Qt.WindowType.FramelessWindowHint)
@@ -116,92 +61,120 @@ class DistractionPopup(QDialog):
         self.center_on_screen()
         super().resizeEvent(event)
 
-class ScreenCaptureThread(QThread):
-    captured = pyqtSignal(QImage)
+def emit_engine_event(target, event):
+    # Translate engine/daemon event dicts into Qt signals on the GUI side
+    if event["type"] == "capture":
+        target.captured.emit(event["image_path"])
+    elif event["type"] == "result":
+        # Smoothed state, not the raw per-frame verdict
+        target.analysis_complete.emit(event["state"])
+    elif event["type"] == "presence":
+        target.presence_changed.emit(event["away"])
+    elif event["type"] == "status":
+        target.status_changed.emit(event)
+    elif event["type"] == "stats":
+        target.stats_received.emit(event["summary"])
+    elif event["type"] == "config":
+        target.config_changed.emit(event["changes"])
+    elif event["type"] == "profile":
+        target.profile_changed.emit(event)
+    elif event["type"] == "error":
+        print(f"Engine error: {event['message']}")
+
+class LocalEngine(QObject):
+    captured = pyqtSignal(str)
+    analysis_complete = pyqtSignal(bool)
+    presence_changed = pyqtSignal(bool)
+    status_changed = pyqtSignal(dict)
+    stats_received = pyqtSignal(str)
+    config_changed = pyqtSignal(dict)
+    profile_changed = pyqtSignal(dict)
 
-    def __init__(self, interval=30):
+    def __init__(self, config_service):
         super().__init__()
-        self.interval = interval
-        self.debug_dir = "debug_images"
-        self.running = True
-        if not os.path.exists(self.debug_dir):
-            os.makedirs(self.debug_dir)
+        self.config_service = config_service
+        self.engine = MonitorEngine(config_service.config)
+        self.profiler = Profiler(config_service.config['profile_dir'])
+        # Listeners run on engine threads; Qt queues the signals onto the GUI thread
+        self.engine.add_listener(lambda event: emit_engine_event(self, event))
+        config_service.add_listener(self.engine.apply_config)
+        config_service.start()
+
+    def request_status(self):
+        self.status_changed.emit(self.engine.status())
+
+    def start_monitoring(self, **config):
+        # Same path as the daemon: validated and saved before the engine starts
+        self.config_service.update(config)
+        self.engine.start()
 
-    def run(self):
-        with mss.mss() as sct:
-            while self.running:
-                monitor = sct.monitors[0]
-                screenshot = sct.grab(monitor)
-                img = Image.frombytes("RGB", screenshot.size, screenshot.bgra, "raw", "BGRX")
-                image_path = os.path.join(self.debug_dir, "capture_latest.png")
-                img.save(image_path, "PNG")
-
-                qimage = QImage(img.tobytes(), img.width, img.height, QImage.Format.Format_RGB888)
-                self.captured.emit(qimage)
-                for _ in range(int(self.interval * 10)):  # Check every 100ms if we should stop
-                    if not self.running:
-                        return
-                    time.sleep(0.1)
-
-    def stop(self):
-        self.running = False
-        self.wait(5000)  # Wait for up to 2 seconds for the thread to finish
-
-class DistractionAnalyzer(QThread):
-    analysis_complete = pyqtSignal(bool)
+    def stop_monitoring(self):
+        self.engine.stop()
 
-    def __init__(self, possible_activities=None, blacklisted_words=None):
-        super().__init__()
-        self.possible_activities = possible_activities or []
-        self.blacklisted_words = blacklisted_words or []
-        self.image_path = None
+    def request_stats(self):
+        self.stats_received.emit(self.engine.stats_tracker.get_summary())
 
-    def set_image(self, image_path):
-        self.image_path = image_path
+    def update_config(self, changes):
+        self.config_service.update(changes)
+
+    def profile(self, kind, action):
+        self.profile_changed.emit(self.profiler.command(kind, action))
+
+    def shutdown(self):
+        self.engine.shutdown()
+        self.config_service.stop()
+
+class DaemonClientThread(QThread):
+    captured = pyqtSignal(str)
+    analysis_complete = pyqtSignal(bool)
+    presence_changed = pyqtSignal(bool)
+    status_changed = pyqtSignal(dict)
+    stats_received = pyqtSignal(str)
+    config_changed = pyqtSignal(dict)
+    profile_changed = pyqtSignal(dict)
+    disconnected = pyqtSignal()
+
+    def __init__(self, address):
+        super().__init__()
+        self.client = ipc.IPCClient(address)
 
     def run(self):
-        if self.image_path is not None:
-            options = ", ".join(self.possible_activities)
-            question = f"Describe what this person in this image is doing briefly (5 words max) from these options: {options}"
-            try:
-                answer = self.ask_llava(question, self.image_path)
-                print(f"LLaVA response: {answer}")
-
-                is_distracted = self.check_distraction(answer)
-                self.analysis_complete.emit(is_distracted)
-            except Exception as e:
-                print(f"Error in LLaVA analysis: {e}")
-                self.analysis_complete.emit(False)
-    
-    def check_distraction(self, activity):
-        activity = activity.lower()
-        for blacklisted in self.blacklisted_words:
-            if blacklisted.lower() in activity:
-                return True
-        return False
-
-    def ask_llava(self, prompt, image_path):
-        base64_image = self.encode_image(image_path)
-        
-        response = requests.post('http://localhost:11434/api/generate',
-            json={
-                'model': 'llava',
-                'prompt': prompt,
-                'images': [base64_image],
-                'stream': False,
-                'options': {
-                    'temperature': 0
-                }
-            })
-        
-        if response.status_code == 200:
-            return response.json()['response']
-        else:
-            return f"Error: {response.status_code}, {response.text}"
+        try:
+            for event in self.client.messages():
+                emit_engine_event(self, event)
+        except OSError:
+            pass
+        self.disconnected.emit()
+
+    def send(self, message):
+        try:
+            self.client.send(message)
+        except OSError as e:
+            print(f"Lost connection to daemon: {e}")
+
+    def request_status(self):
+        self.send({"cmd": "status"})
+
+    def start_monitoring(self, **config):
+        self.send({"cmd": "start", "config": config})
+
+    def stop_monitoring(self):
+        self.send({"cmd": "stop"})
+
+    def request_stats(self):
+        self.send({"cmd": "stats"})
+
+    def update_config(self, changes):
+        self.send({"cmd": "config", "config": changes})
+
+    def profile(self, kind, action):
+        # Profiles the daemon, where capture and analysis run
+        self.send({"cmd": "profile", "kind": kind, "action": action})
 
-    def encode_image(self, image_path):
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+    def shutdown(self):
+        # Detach only; the daemon keeps monitoring
+        self.client.close()
+        self.wait(2000)
 
 class AudioThread(QThread):
     def __init__(self, text="", audio_path="Radar.mp3"):
@@ -293,12 +266,19 @@ class ReflectionDialog(QDialog):
         self.accept()
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, attach_address=None):
         super().__init__()
         self.setWindowTitle("Distraction Monitor")
         self.setGeometry(100, 100, 600, 200)
 
-        self.load_config()
+        # In-process, the GUI owns config.json; attached, the daemon does
+        self.config_service = ConfigService() if attach_address is None else None
+        self.config = self.config_service.config if self.config_service else load_config()
+        # Edits are pushed to the engine once typing pauses, not per keystroke
+        self.config_timer = QTimer(self)
+        self.config_timer.setSingleShot(True)
+        self.config_timer.setInterval(800)
+        self.config_timer.timeout.connect(self.save_config)
 
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -310,7 +290,7 @@ class MainWindow(QMainWindow):
         self.interval_spinbox = QSpinBox()
         self.interval_spinbox.setRange(5, 3600)
         self.interval_spinbox.setValue(self.config['capture_interval'])
-        self.interval_spinbox.valueChanged.connect(self.save_config)
+        self.interval_spinbox.valueChanged.connect(self.config_timer.start)
         interval_layout.addWidget(interval_label)
         interval_layout.addWidget(self.interval_spinbox)
         layout.addLayout(interval_layout)
@@ -320,7 +300,7 @@ class MainWindow(QMainWindow):
         possible_label = QLabel("Possible Activities:")
         self.possible_input = QLineEdit()
         self.possible_input.setText(", ".join(self.config['possible_activities']))
-        self.possible_input.textChanged.connect(self.save_config)
+        self.possible_input.textChanged.connect(self.config_timer.start)
         possible_layout.addWidget(possible_label)
         possible_layout.addWidget(self.possible_input)
         layout.addLayout(possible_layout)
@@ -330,7 +310,7 @@ class MainWindow(QMainWindow):
         blacklisted_label = QLabel("Blacklisted Activities:")
         self.blacklisted_input = QLineEdit()
         self.blacklisted_input.setText(", ".join(self.config['blacklisted_words']))
-        self.blacklisted_input.textChanged.connect(self.save_config)
+        self.blacklisted_input.textChanged.connect(self.config_timer.start)
         blacklisted_layout.addWidget(blacklisted_label)
         blacklisted_layout.addWidget(self.blacklisted_input)
         layout.addLayout(blacklisted_layout)
@@ -347,14 +327,32 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.monitoring_status_label)
 
 
-        self.capture_thread = None
-        self.analyzer = DistractionAnalyzer()  # Initialize without starting the thread yet
+        # The pipeline runs either in-process or in a separate daemon.py
+        if attach_address is not None:
+            self.engine = DaemonClientThread(ipc.parse_address(attach_address or None))
+            self.engine.disconnected.connect(self.handle_daemon_disconnected)
+            self.engine.start()
+        else:
+            self.engine = LocalEngine(self.config_service)
+        self.engine.captured.connect(self.process_capture)
+        self.engine.analysis_complete.connect(self.handle_analysis_result)
+        self.engine.status_changed.connect(self.update_monitoring_status)
+        self.engine.presence_changed.connect(self.update_presence)
+        self.engine.stats_received.connect(self.display_statistics)
+        self.engine.config_changed.connect(self.update_config_fields)
+        self.engine.profile_changed.connect(self.update_profile_actions)
         # self.task_locked = False
 
         # Initialize the notification app
         self.tray_icon = QSystemTrayIcon(self)
         self.tray_icon.setIcon(QIcon("debug_images/image.png"))  # Replace with your icon path
         self.tray_menu = QMenu()
+        self.profiling = {"cpu": False, "heap": False}
+        self.cpu_profile_action = self.tray_menu.addAction("Start CPU profile", lambda: self.toggle_profile("cpu"))
+        self.heap_profile_action = self.tray_menu.addAction("Start heap tracking", lambda: self.toggle_profile("heap"))
+        self.heap_snapshot_action = self.tray_menu.addAction("Save heap diff", lambda: self.engine.profile("heap", "snapshot"))
+        self.heap_snapshot_action.setEnabled(False)
+        self.tray_menu.addSeparator()
         self.tray_menu.addAction("Exit", self.close)
         self.tray_icon.setContextMenu(self.tray_menu)
         self.tray_icon.show()
@@ -362,40 +360,63 @@ class MainWindow(QMainWindow):
         self.distraction_popup = None
         self.reflection_popup = None
 
-        self.last_distraction_time = datetime.datetime.now()  # Track the last time a distraction was detected
-        self.last_praise_time = None  # Track the last time praise was given
-        self.last_praise_time2 = datetime.datetime.now()  # Track the last time praise was given
+        # Alerts and praise are rules from config; the timer lets them fire between results
+        self.rules = RuleEngine(self.config['intervention_rules'], self.run_rule)
+        self.rules_timer = QTimer(self)
+        self.rules_timer.timeout.connect(lambda: self.rules.advance(time.time()))
+        self.rules_timer.start(1000)
 
-        self.stats_tracker = StatsTracker()
+        # When attached, the daemon serves its own metrics
+        self.metrics_server = None if attach_address is not None else metrics.start_metrics_server(self.config)
         
         # Add a button to show statistics
         self.show_stats_button = QPushButton("Show Statistics")
         self.show_stats_button.clicked.connect(self.show_statistics)
         layout.addWidget(self.show_stats_button)
 
-    def load_config(self):
-        try:
-            with open('config.json', 'r') as config_file:
-                self.config = json.load(config_file)
-        except FileNotFoundError:
-            print("Configuration file not found. Using default settings.")
-            self.config = {
-                "capture_interval": 30,
-                "possible_activities": ["being productive", "coding", "writing", "learning", "social media", "gaming", "watching livestream"],
-                "blacklisted_words": ["social media", "gaming", "stream"],
-                "notification_sound": "Radar.mp3",
-                "positive_reinforcement_interval": 1800,
-                "positive_reinforcement_chance": 0.3
-            }
+        self.engine.request_status()
 
     def save_config(self):
-        self.config['capture_interval'] = self.interval_spinbox.value()
-        self.config['possible_activities'] = [a.strip() for a in self.possible_input.text().split(',') if a.strip()]
-        self.config['blacklisted_words'] = [a.strip() for a in self.blacklisted_input.text().split(',') if a.strip()]
-        
-        with open('config.json', 'w') as config_file:
-            json.dump(self.config, config_file, indent=4)
-                      
+        # The engine validates, applies the change live and writes config.json
+        changes = {'capture_interval': self.interval_spinbox.value()}
+        possible_activities = [a.strip() for a in self.possible_input.text().split(',') if a.strip()]
+        blacklisted_words = [a.strip() for a in self.blacklisted_input.text().split(',') if a.strip()]
+        # A field cleared mid-edit keeps its previous value
+        if possible_activities:
+            changes['possible_activities'] = possible_activities
+        if blacklisted_words:
+            changes['blacklisted_words'] = blacklisted_words
+        self.engine.update_config(changes)
+
+    def update_config_fields(self, changes):
+        # Reflect changes made elsewhere (config.json edits, other clients)
+        self.config.update(changes)
+        widgets = [(self.interval_spinbox, 'capture_interval'), (self.possible_input, 'possible_activities'),
+                   (self.blacklisted_input, 'blacklisted_words')]
+        for widget, key in widgets:
+            if key not in changes:
+                continue
+            widget.blockSignals(True)
+            if widget is self.interval_spinbox:
+                widget.setValue(changes[key])
+            elif [a.strip() for a in widget.text().split(',') if a.strip()] != changes[key]:
+                widget.setText(", ".join(changes[key]))
+            widget.blockSignals(False)
+        if 'intervention_rules' in changes:
+            self.rules.set_rules(changes['intervention_rules'])
+        if 'capture_interval' in changes and self.start_button.text() == "Stop Monitoring":
+            self.monitoring_status_label.setText(f"Status: Monitoring (Interval: {changes['capture_interval']}s)")
+
+    def toggle_profile(self, kind):
+        self.engine.profile(kind, "stop" if self.profiling[kind] else "start")
+
+    def update_profile_actions(self, status):
+        self.profiling = {"cpu": status["cpu"], "heap": status["heap"]}
+        self.cpu_profile_action.setText("Stop CPU profile" if status["cpu"] else "Start CPU profile")
+        self.heap_profile_action.setText("Stop heap tracking" if status["heap"] else "Start heap tracking")
+        self.heap_snapshot_action.setEnabled(status["heap"])
+        self.show_notification("Profiling", status["message"])
+
     def toggle_monitoring(self):
         if self.start_button.text() == "Start Monitoring":
             possible_activities = [a.strip() for a in self.possible_input.text().split(',') if a.strip()]
@@ -410,88 +431,75 @@ class MainWindow(QMainWindow):
                 self.blacklisted_input.setText(", ".join(blacklisted_words))
 
             interval = self.interval_spinbox.value()
-            self.analyzer = DistractionAnalyzer(possible_activities, blacklisted_words)
-            self.analyzer.analysis_complete.connect(self.handle_analysis_result)
-
-            self.capture_thread = ScreenCaptureThread(interval)
-            self.capture_thread.captured.connect(self.process_capture)
-            self.capture_thread.start()
-
-            self.start_button.setText("Stop Monitoring")
-            self.monitoring_status_label.setText(f"Status: Monitoring (Interval: {interval}s)")
-            self.interval_spinbox.setEnabled(False)
-            self.possible_input.setEnabled(False)
-            self.blacklisted_input.setEnabled(False)
+            # The engine answers with a status event, which updates the controls
+            self.engine.start_monitoring(capture_interval=interval,
+                                         possible_activities=possible_activities,
+                                         blacklisted_words=blacklisted_words)
         else:
             self.start_button.setEnabled(False)
             self.monitoring_status_label.setText("Status: Stopping monitoring...")
             QTimer.singleShot(100, self.stop_monitoring)
 
     def stop_monitoring(self):
-        if self.capture_thread:
-            self.capture_thread.stop()
-            self.capture_thread = None
-        
-        if self.analyzer and self.analyzer.isRunning():
-            self.analyzer.quit()
-            self.analyzer.wait()
-
-        self.start_button.setText("Start Monitoring")
-        self.monitoring_status_label.setText("Status: Not monitoring")
-        self.interval_spinbox.setEnabled(True)
-        self.possible_input.setEnabled(True)
-        self.blacklisted_input.setEnabled(True)
+        self.engine.stop_monitoring()
+
+    def update_monitoring_status(self, status):
+        running = status['running']
+        if running:
+            self.start_button.setText("Stop Monitoring")
+            self.monitoring_status_label.setText(f"Status: Monitoring (Interval: {status['interval']}s)")
+        else:
+            self.start_button.setText("Start Monitoring")
+            self.monitoring_status_label.setText("Status: Not monitoring")
+            self.rules.reset()
         self.start_button.setEnabled(True)
 
-    def process_capture(self, qimage):
-        scaled_pixmap = QPixmap.fromImage(qimage).scaled(300, 200, Qt.AspectRatioMode.KeepAspectRatio)
-        self.image_label.setPixmap(scaled_pixmap)
-        # Save the QImage to a file, since the analyzer works with file paths
-        image_path = os.path.join("debug_images", "capture_latest.png")
-        qimage.save(image_path)
+    def update_presence(self, away):
+        if away:
+            self.monitoring_status_label.setText("Status: Paused (you are away)")
+            # No results while away; "for" durations start over once they resume
+            self.rules.reset()
+        else:
+            self.monitoring_status_label.setText(f"Status: Monitoring (Interval: {self.interval_spinbox.value()}s)")
 
-        # Set the image path in the analyzer
-        self.analyzer.set_image(image_path)
+    def handle_daemon_disconnected(self):
+        self.monitoring_status_label.setText("Status: Disconnected from daemon")
+        self.start_button.setEnabled(False)
 
-        # Start the analysis in a separate thread
-        self.analyzer.start()  # This will call the `run` method in the DistractionAnalyzer
+    def process_capture(self, image_path):
+        # The engine has already written the frame; just show a preview
+        scaled_pixmap = QPixmap(image_path).scaled(300, 200, Qt.AspectRatioMode.KeepAspectRatio)
+        self.image_label.setPixmap(scaled_pixmap)
 
     def handle_analysis_result(self, is_distracted):
-        current_time = datetime.datetime.now()
-        interval = self.interval_spinbox.value()
-        self.stats_tracker.update_stats(is_distracted, interval)
-
-        if is_distracted:
-            print("You seem distracted!")
-            self.last_distraction_time = current_time
-            self.show_notification("Distraction Alert", "You seem to be distracted. Focus on your work!")
-
-            message = "You seem distracted! Get back to work!"
-
-            
-            self.show_distraction_popup(message)
-            self.play_audio_alert(message)
-
-            if not self.reflection_popup:
-                self.reflection_popup = ReflectionDialog()
-                self.reflection_popup.refocus_clicked.connect(self.hide_distraction_popup)
-            if self.reflection_popup.exec():
-                print(f"User reflection: {self.reflection_popup.reflection_input.text()}")
-                self.show_notification("Great!", "Let's get back to work!")
-        else:
-            if (current_time - self.last_distraction_time).total_seconds() > self.config['positive_reinforcement_interval']:
-                if not self.last_praise_time or (current_time - self.last_praise_time).total_seconds() > self.config['positive_reinforcement_interval']:
-                    # print(current_time)
-                    # if random.random() < self.config['positive_reinforcement_chance']:  
-                    #     self.give_positive_reinforcement()
-                    #     self.last_praise_time = current_time 
-                    
-                    if current_time.hour >= 20:
-                        if not self.last_praise_time2 or (current_time - self.last_praise_time2).total_seconds() > 1800:
-                            if random.random() < 1/8:
-                                self.praise_audio_thread2 = AudioThread(audio_path="bladerunner.m4a")
-                                self.praise_audio_thread2.start()
-                                self.last_praise_time2 = current_time
+        # Stats are recorded by the engine before the result reaches the GUI.
+        # This is the smoothed state, so one odd frame doesn't alert; the
+        # rules only do work when it flips. State events carry nothing more.
+        self.rules.observe(is_distracted, time.time())
+
+    def run_rule(self, rule):
+        if rule["action"] == "alert":
+            self.distraction_alert(rule.get("message", "You seem distracted! Get back to work!"))
+        elif rule["action"] == "praise":
+            self.give_positive_reinforcement()
+        elif rule["action"] == "sound":
+            self.rule_audio_thread = AudioThread(audio_path=rule["sound"])
+            self.rule_audio_thread.start()
+        elif rule["action"] == "notify":
+            self.show_notification(rule.get("title", "Distraction Monitor"), rule.get("message", ""))
+
+    def distraction_alert(self, message):
+        print("You seem distracted!")
+        self.show_notification("Distraction Alert", "You seem to be distracted. Focus on your work!")
+        self.show_distraction_popup(message)
+        self.play_audio_alert(message)
+
+        if not self.reflection_popup:
+            self.reflection_popup = ReflectionDialog()
+            self.reflection_popup.refocus_clicked.connect(self.hide_distraction_popup)
+        if self.reflection_popup.exec():
+            print(f"User reflection: {self.reflection_popup.reflection_input.text()}")
+            self.show_notification("Great!", "Let's get back to work!")
 
     def give_positive_reinforcement(self):
         # TODO: make this better
@@ -508,9 +516,6 @@ class MainWindow(QMainWindow):
         self.show_notification("Well Done!", praise_message)
         self.praise_audio_thread = AudioThread(text=praise_message)
         self.praise_audio_thread.start()
-
-
-        self.interval_spinbox.setEnabled(False)
     
     def play_audio_alert(self, message):
         self.audio_thread = AudioThread(text=message)
@@ -530,12 +535,18 @@ class MainWindow(QMainWindow):
             self.distraction_popup.hide()
 
     def show_statistics(self):
-        stats_summary = self.stats_tracker.get_summary()
+        self.engine.request_stats()
+
+    def display_statistics(self, stats_summary):
         QMessageBox.information(self, "Distraction Statistics", stats_summary)
 
     def closeEvent(self, event):
-        # Stop monitoring threads
-        self.stop_monitoring()
+        if self.config_timer.isActive():
+            self.config_timer.stop()
+            self.save_config()
+
+        # Stop the in-process engine, or detach from the daemon
+        self.engine.shutdown()
 
         # Close and delete any open dialogs
         if self.distraction_popup:
@@ -545,6 +556,9 @@ class MainWindow(QMainWindow):
             self.reflection_popup.close()
             self.reflection_popup.deleteLater()
 
+        if self.metrics_server:
+            self.metrics_server.stop()
+
         # Clean up the tray icon
         if self.tray_icon:
             self.tray_icon.hide()
@@ -564,7 +578,12 @@ class MainWindow(QMainWindow):
         super().closeEvent(event)
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = MainWindow()
+    parser = argparse.ArgumentParser(description="Distraction monitor GUI")
+    parser.add_argument("--attach", nargs="?", const="", default=None, metavar="ADDRESS",
+                        help="Attach to a running daemon.py (optionally at a socket path or host:port) instead of monitoring in-process")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = MainWindow(args.attach)
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,169 @@
+import os
+import glob
+import json
+import time
+
+import metrics
+
+# Picks a cheaper way to monitor when the machine is on battery or running
+# hot. Power state comes from /sys/class/power_supply and the thermal zones
+# under /sys/class/thermal on Linux; elsewhere, or when nothing is found,
+# the policy stays on "normal". A profile is a set of overrides from
+# power_profiles (a longer capture interval, smaller frames, or
+# metadata_only to rely on the window-title classifier alone) that the
+# engine applies on top of the user's settings without saving them. The
+# hot profile is left only once the temperature has dropped a few degrees
+# below power_hot_temperature, so it doesn't flap.
+
+HOT_HYSTERESIS = 5
+PROFILES = ("battery", "low_battery", "hot")
+PROFILE_KEYS = ("interval_multiplier", "max_image_size", "metadata_only")
+
+
+def validate_profiles(profiles):
+    # Returns a list of problems, empty when the profiles are usable
+    if not isinstance(profiles, dict):
+        return ["must be an object"]
+    errors = []
+    for name, profile in profiles.items():
+        if name not in PROFILES:
+            errors.append(f"{name}: not a profile; use {', '.join(PROFILES)}")
+        if not isinstance(profile, dict):
+            errors.append(f"{name}: must be an object")
+            continue
+        for key in profile:
+            if key not in PROFILE_KEYS:
+                errors.append(f"{name}: unknown setting {key}; use {', '.join(PROFILE_KEYS)}")
+        multiplier = profile.get("interval_multiplier", 1)
+        if isinstance(multiplier, bool) or not isinstance(multiplier, (int, float)) or multiplier < 1:
+            errors.append(f"{name}: interval_multiplier must be a number >= 1")
+        size = profile.get("max_image_size")
+        if size is not None and (isinstance(size, bool) or not isinstance(size, int) or size < 64):
+            errors.append(f"{name}: max_image_size must be a whole number >= 64")
+        if not isinstance(profile.get("metadata_only", False), bool):
+            errors.append(f"{name}: metadata_only must be true or false")
+    return errors
+
+
+def read_sysfs(root="/sys/class"):
+    # Returns {"on_battery", "battery_percent", "temperature"}, each None when unknown
+    on_battery = None
+    percents = []
+    for supply in glob.glob(os.path.join(root, "power_supply", "*")):
+        kind = _read(os.path.join(supply, "type"))
+        if kind in ("Mains", "USB", "USB_C"):
+            online = _read(os.path.join(supply, "online"))
+            if online == "1":
+                on_battery = False
+            elif online == "0" and on_battery is None:
+                on_battery = True
+        elif kind == "Battery":
+            capacity = _read(os.path.join(supply, "capacity"))
+            if capacity and capacity.isdigit():
+                percents.append(int(capacity))
+            if _read(os.path.join(supply, "status")) == "Discharging" and on_battery is None:
+                on_battery = True
+    temperatures = []
+    for zone in glob.glob(os.path.join(root, "thermal", "thermal_zone*")):
+        temperature = _read(os.path.join(zone, "temp"))
+        if temperature and temperature.lstrip("-").isdigit():
+            temperatures.append(int(temperature) / 1000)
+    return {
+        "on_battery": on_battery,
+        "battery_percent": min(percents) if percents else None,
+        "temperature": max(temperatures) if temperatures else None
+    }
+
+
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def probe_file(path):
+    # Stand-in for tests: {"on_battery": true, "battery_percent": 15, "temperature": 90}
+    try:
+        with open(path, "r") as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {"on_battery": None, "battery_percent": None, "temperature": None}
+    return {key: state.get(key) for key in ("on_battery", "battery_percent", "temperature")}
+
+
+def probe_power(probe_path=None, sysfs_root="/sys/class"):
+    if probe_path:
+        return probe_file(probe_path)
+    if not os.path.isdir(os.path.join(sysfs_root, "power_supply")) and not os.path.isdir(os.path.join(sysfs_root, "thermal")):
+        return {"on_battery": None, "battery_percent": None, "temperature": None}
+    return read_sysfs(sysfs_root)
+
+
+class PowerPolicy:
+    def __init__(self, profiles, hot_temperature=85, low_battery=20, poll_interval=30, probe_path=None, sysfs_root="/sys/class"):
+        self.profiles = profiles
+        self.hot_temperature = hot_temperature
+        self.low_battery = low_battery
+        self.poll_interval = poll_interval
+        self.probe_path = probe_path
+        self.sysfs_root = sysfs_root
+        self.profile = "normal"
+        self.checked_at = None
+
+    @classmethod
+    def from_config(cls, config):
+        if not config['power_policy']:
+            return None
+        return cls(config['power_profiles'], config['power_hot_temperature'], config['power_low_battery'],
+                   config['power_poll_interval'], config['power_probe_file'])
+
+    def overrides(self):
+        return self.profiles.get(self.profile, {})
+
+    def adjust(self, key, value):
+        # Profiles only ever make monitoring cheaper than the user's own setting
+        overrides = self.overrides()
+        if key == 'capture_interval':
+            return value * max(1, overrides.get('interval_multiplier', 1))
+        if key == 'max_image_size' and overrides.get('max_image_size'):
+            return min(value, overrides['max_image_size']) if value else overrides['max_image_size']
+        return value
+
+    def metadata_only(self):
+        return bool(self.overrides().get('metadata_only'))
+
+    def choose(self, state):
+        temperature = state["temperature"]
+        if temperature is not None and "hot" in self.profiles:
+            limit = self.hot_temperature - (HOT_HYSTERESIS if self.profile == "hot" else 0)
+            if temperature >= limit:
+                return "hot"
+        if state["on_battery"]:
+            percent = state["battery_percent"]
+            if percent is not None and percent <= self.low_battery and "low_battery" in self.profiles:
+                return "low_battery"
+            if "battery" in self.profiles:
+                return "battery"
+        return "normal"
+
+    def check(self, now=None):
+        # Returns the new profile name when it changed, else None; reads sysfs at most every poll_interval
+        now = time.monotonic() if now is None else now
+        if self.checked_at is not None and now - self.checked_at < self.poll_interval:
+            return None
+        self.checked_at = now
+        state = probe_power(self.probe_path, self.sysfs_root)
+        if state["battery_percent"] is not None:
+            metrics.BATTERY_PERCENT.set(state["battery_percent"])
+        if state["temperature"] is not None:
+            metrics.TEMPERATURE.set(state["temperature"])
+        profile = self.choose(state)
+        if profile == self.profile:
+            return None
+        metrics.POWER_PROFILE_SWITCHES.inc(profile=profile)
+        for name in set(self.profiles) | {"normal"}:
+            metrics.POWER_PROFILE.set(1 if name == profile else 0, profile=name)
+        self.profile = profile
+        return profile
@@ -0,0 +1,219 @@
+import os
+import re
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+
+# On-demand profiling of the running monitor, for "it makes my machine lag"
+# reports. The CPU profiler is a sampling thread reading every thread's
+# Python stack with sys._current_frames() about 100 times a second; the
+# heap profiler uses tracemalloc and diffs a snapshot against the one taken
+# at start. Both attribute cost to a part of the pipeline (capture, encode,
+# analyzer, GUI, ...) from the files and functions on each stack. Nothing
+# is installed while they are off: no sampling thread, no trace hook, and
+# tracemalloc is stopped again afterwards.
+
+SAMPLE_INTERVAL = 0.01
+HEAP_FRAMES = 16
+
+# Checked from the innermost frame outwards; the first match names the part
+FILE_PARTS = {
+    "encode_pool.py": "encode",
+    "request_body.py": "encode",
+    "frame_ring.py": "encode",
+    "dirty_regions.py": "capture",
+    "window_probe.py": "capture",
+    "capture_triggers.py": "capture",
+    "idle.py": "capture",
+    "local_backend.py": "analyzer",
+    "embedding_index.py": "analyzer",
+    "inference_scheduler.py": "analyzer",
+    "smoothing.py": "analyzer",
+    "frame_history.py": "history",
+    "stats_store.py": "stats",
+    "metrics.py": "metrics",
+    "ipc.py": "ipc",
+    "monitor3-v2.py": "gui",
+}
+PACKAGE_PARTS = {"mss": "capture", "PIL": "encode", "requests": "analyzer", "urllib3": "analyzer",
+                 "transformers": "analyzer", "torch": "analyzer", "PyQt6": "gui"}
+FUNCTION_PARTS = {
+    "grab_screen": "capture",
+    "encode_image": "encode",
+    "ask_llava": "analyzer",
+    "analyze": "analyzer",
+    "classify": "analyzer",
+    "update_stats": "stats",
+    "save_stats": "stats",
+}
+# Innermost Python frames of a thread that is blocked rather than working
+IDLE_FUNCTIONS = {"wait", "_wait_for_tstate_lock", "select", "poll", "accept", "readinto", "recv_into",
+                  "serve_forever", "take", "take_batch", "wait_for_next_capture", "get"}
+
+
+def part_for_file(filename):
+    name = os.path.basename(filename)
+    if name in FILE_PARTS:
+        return FILE_PARTS[name]
+    for directory in reversed(os.path.normpath(filename).split(os.sep)[:-1]):
+        if directory in PACKAGE_PARTS:
+            return PACKAGE_PARTS[directory]
+    return None
+
+
+def part_for_stack(frames):
+    # frames: (filename, function) pairs, innermost first
+    for filename, function in frames:
+        part = FUNCTION_PARTS.get(function) if os.path.basename(filename) == "engine.py" else None
+        part = part or part_for_file(filename)
+        if part:
+            return part
+    return "other"
+
+
+def timestamp():
+    return time.strftime("%Y%m%d-%H%M%S")
+
+
+class SamplingProfiler(threading.Thread):
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True, name="profiler")
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.stacks = Counter()  # (thread, part, frames outermost first) -> samples
+        self.samples = 0
+        self.started = time.monotonic()
+
+    def sample(self):
+        names = {thread.ident: re.sub(r"[-_]\d+.*$", "", thread.name) for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self.ident:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append((frame.f_code.co_filename, frame.f_code.co_name))
+                frame = frame.f_back
+            if not frames:
+                continue
+            leaf_file, leaf_function = frames[0]
+            if leaf_function in IDLE_FUNCTIONS or (os.path.basename(leaf_file) == "monitor3-v2.py" and leaf_function in ("main", "<module>")):
+                part = "idle"  # includes the Qt event loop waiting in app.exec()
+            else:
+                part = part_for_stack(frames)
+            self.stacks[(names.get(ident, "unknown"), part, tuple(reversed(frames)))] += 1
+        self.samples += 1
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stop_event.set()
+        self.join(5)
+
+    def write(self, directory):
+        # <name>.folded works with flamegraph.pl and speedscope; <name>.txt is the summary
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"cpu_{timestamp()}")
+        with open(base + ".folded", "w") as f:
+            for (thread, part, frames), count in self.stacks.most_common():
+                path = ";".join(f"{os.path.basename(filename)}:{function}" for filename, function in frames)
+                f.write(f"{part};{thread};{path} {count}\n")
+        parts = Counter()
+        functions = Counter()
+        for (thread, part, frames), count in self.stacks.items():
+            parts[part] += count
+            if part != "idle":
+                filename, function = frames[-1]
+                functions[f"{os.path.basename(filename)}:{function} ({part})"] += count
+        busy = sum(count for part, count in parts.items() if part != "idle") or 1
+        with open(base + ".txt", "w") as f:
+            f.write(f"{self.samples} samples over {time.monotonic() - self.started:.1f}s, every {self.interval * 1000:.0f} ms\n")
+            f.write("\nThread samples by part (idle = blocked waiting):\n")
+            for part, count in parts.most_common():
+                share = "" if part == "idle" else f"  {count / busy * 100:5.1f}% of busy"
+                f.write(f"  {part:<10} {count:>8}{share}\n")
+            f.write("\nTop functions (innermost Python frame, busy samples):\n")
+            for function, count in functions.most_common(30):
+                f.write(f"  {count:>8}  {function}\n")
+        return base + ".txt"
+
+
+class HeapTracker:
+    def __init__(self, frames=HEAP_FRAMES):
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start(frames)
+        self.baseline = self.snapshot()
+
+    def snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"heap_{timestamp()}.txt")
+        snapshot = self.snapshot()
+        parts = Counter()
+        for diff in snapshot.compare_to(self.baseline, "traceback"):
+            # tracemalloc keeps no function names, so this goes by file
+            frames = [(frame.filename, None) for frame in reversed(diff.traceback)]
+            parts[part_for_stack(frames)] += diff.size_diff
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, "w") as f:
+            f.write(f"Traced now {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n")
+            f.write("\nGrowth since tracking started, by part:\n")
+            for part, size in sorted(parts.items(), key=lambda item: -abs(item[1])):
+                f.write(f"  {part:<10} {size / 1024:+12.1f} KiB\n")
+            f.write("\nTop growth by line:\n")
+            for diff in snapshot.compare_to(self.baseline, "lineno")[:30]:
+                frame = diff.traceback[0]
+                f.write(f"  {diff.size_diff / 1024:+10.1f} KiB {diff.count_diff:+7d} blocks  {frame.filename}:{frame.lineno}\n")
+        return path
+
+    def stop(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+
+
+class Profiler:
+    # What the GUI tray menu and the daemon's "profile" command drive
+    def __init__(self, directory="profiles"):
+        self.directory = directory
+        self.cpu = None
+        self.heap = None
+        self.lock = threading.Lock()
+
+    def status(self):
+        return {"type": "profile", "cpu": self.cpu is not None, "heap": self.heap is not None}
+
+    def command(self, kind, action):
+        # Returns a status dict with a human-readable message for the tray
+        with self.lock:
+            if kind == "cpu" and action == "start" and self.cpu is None:
+                self.cpu = SamplingProfiler()
+                self.cpu.start()
+                message = "CPU profile started"
+            elif kind == "cpu" and action == "stop" and self.cpu is not None:
+                self.cpu.stop()
+                message = f"CPU profile saved to {self.cpu.write(self.directory)}"
+                self.cpu = None
+            elif kind == "heap" and action == "start" and self.heap is None:
+                self.heap = HeapTracker()
+                message = "Heap tracking started"
+            elif kind == "heap" and action == "snapshot" and self.heap is not None:
+                message = f"Heap diff saved to {self.heap.write(self.directory)}"
+            elif kind == "heap" and action == "stop" and self.heap is not None:
+                path = self.heap.write(self.directory)
+                self.heap.stop()
+                self.heap = None
+                message = f"Heap diff saved to {path}"
+            else:
+                message = f"Nothing to do for {kind} {action}"
+        print(message)
+        return dict(self.status(), message=message)
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import DEFAULT_CONFIG, SkippedFrame, fuse_verdicts, load_config, make_analyzer
+from fake_ollama import FakeOllamaServer
+
+# Capture sessions are zip files of the PNG frames the engine wrote, named
+# "<run>-<seq>_<timestamp>.png" (sequences restart with every engine run),
+# or "<run>-<seq>-<monitor>_<timestamp>.png" for each screen of a
+# per_monitor capture, plus a session.json index holding the verdicts
+# seen while recording and the prompt and fusion settings in use. PNGs are
+# stored, not deflated again. The frame names alone are enough to replay a
+# session whose index was never written (e.g. the recorder was killed).
+
+INDEX_NAME = "session.json"
+SESSION_KEYS = ("possible_activities", "blacklisted_words", "model",
+                "fusion_policy", "monitor_weights", "focused_monitor", "weighted_threshold")
+
+
+class SessionRecorder:
+    def __init__(self, path, config=None):
+        self.path = path
+        self.archive = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED)
+        self.frames = {}  # (run, seq) -> frame entry
+        self.config = {key: (config or {}).get(key) for key in SESSION_KEYS}
+        self.lock = threading.Lock()
+
+    def handle_event(self, event):
+        # Engine listener; runs on the capture thread before the file is overwritten
+        if event["type"] == "capture":
+            screens = event.get("screens") or [{"monitor": 0, "image_path": event["image_path"]}]
+            self.add_frame(event.get("run", 0), event["seq"], screens, event["timestamp"])
+        elif event["type"] == "result":
+            self.add_verdict(event.get("run", 0), event["seq"], event["distracted"], event["answer"])
+
+    def add_frame(self, run, sequence, screens, timestamp):
+        if len(screens) == 1:
+            names = [f"{run:03d}-{sequence:06d}_{timestamp:.3f}.png"]
+        else:
+            names = [f"{run:03d}-{sequence:06d}-{screen['monitor']}_{timestamp:.3f}.png" for screen in screens]
+        with self.lock:
+            if self.archive is None:
+                return
+            for screen, name in zip(screens, names):
+                self.archive.write(screen["image_path"], name)
+            frame = {"name": names[0], "timestamp": timestamp}
+            if len(screens) > 1:
+                frame["screens"] = [{"monitor": screen["monitor"], "name": name} for screen, name in zip(screens, names)]
+                focused = [screen["monitor"] for screen in screens if screen.get("focused")]
+                if focused:
+                    frame["focused"] = focused[0]
+            self.frames[(run, sequence)] = frame
+
+    def add_verdict(self, run, sequence, is_distracted, answer):
+        with self.lock:
+            if (run, sequence) in self.frames:
+                self.frames[(run, sequence)].update({"distracted": is_distracted, "answer": answer})
+
+    def close(self):
+        with self.lock:
+            if self.archive is None:
+                return
+            index = {"version": 1, "config": self.config, "frames": [self.frames[key] for key in sorted(self.frames)]}
+            self.archive.writestr(INDEX_NAME, json.dumps(index, indent=2))
+            self.archive.close()
+            self.archive = None
+
+
+def load_session(path):
+    archive = zipfile.ZipFile(path, "r")
+    names = archive.namelist()
+    if INDEX_NAME in names:
+        index = json.loads(archive.read(INDEX_NAME))
+    else:
+        frames = {}
+        for name in sorted(n for n in names if n.endswith(".png")):
+            stem, _, timestamp = name[:-4].rpartition("_")
+            parts = stem.split("-")
+            frame = frames.setdefault("-".join(parts[:2]), {"name": name, "timestamp": float(timestamp)})
+            if len(parts) > 2:
+                frame.setdefault("screens", []).append({"monitor": int(parts[2]), "name": name})
+        index = {"version": 1, "config": {}, "frames": list(frames.values())}
+    return archive, index
+
+
+def frame_screens(frame):
+    return frame.get("screens") or [{"monitor": 0, "name": frame["name"]}]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def run_replay(session_path, analyzer, workers=1, limit=None):
+    archive, index = load_session(session_path)
+    frames = index["frames"][:limit] if limit else index["frames"]
+    fusion = {key: index["config"].get(key) if index["config"].get(key) is not None else DEFAULT_CONFIG[key]
+              for key in ("fusion_policy", "monitor_weights", "focused_monitor", "weighted_threshold")}
+    # Unpack up front so file I/O is not part of the measured time
+    work_dir = tempfile.mkdtemp(prefix="aimonitor-replay-")
+    try:
+        for frame in frames:
+            for screen in frame_screens(frame):
+                archive.extract(screen["name"], work_dir)
+        archive.close()
+
+        def analyze_frame(frame):
+            screens = frame_screens(frame)
+            if len(screens) == 1:
+                return analyzer.analyze(os.path.join(work_dir, screens[0]["name"]))
+            # A per_monitor capture: every screen, fused as while recording
+            results = [analyzer.analyze(os.path.join(work_dir, screen["name"])) for screen in screens]
+            verdicts = {screen["monitor"]: result[0] for screen, result in zip(screens, results)}
+            is_distracted = fuse_verdicts(verdicts, fusion["fusion_policy"], fusion["monitor_weights"],
+                                          frame.get("focused", fusion["focused_monitor"]), fusion["weighted_threshold"])
+            return is_distracted, "; ".join(f"screen {screen['monitor']}: {result[1]}" for screen, result in zip(screens, results))
+
+        def analyze(frame):
+            start_time = time.monotonic()
+            try:
+                is_distracted, answer = analyze_frame(frame)
+            except SkippedFrame as e:
+                # Declined by a shared analysis server: no verdict to compare
+                is_distracted, answer = None, f"Skipped: {e}"
+            return is_distracted, answer, time.monotonic() - start_time
+
+        wall_start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(analyze, frames))
+        wall_time = time.monotonic() - wall_start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    latencies = [latency for _, _, latency in results]
+    compared = [(frame["distracted"], result[0]) for frame, result in zip(frames, results)
+                if "distracted" in frame and result[0] is not None]
+    return {
+        "frames": len(results),
+        "wall_time": wall_time,
+        "frames_per_second": len(results) / wall_time if wall_time > 0 else 0.0,
+        "latency_p50": percentile(latencies, 0.50),
+        "latency_p90": percentile(latencies, 0.90),
+        "latency_p99": percentile(latencies, 0.99),
+        "errors": sum(1 for _, answer, _ in results if answer.startswith("Error")),
+        "skipped": sum(1 for is_distracted, _, _ in results if is_distracted is None),
+        "compared": len(compared),
+        "agreement": sum(1 for recorded, replayed in compared if recorded == replayed) / len(compared) if compared else None,
+        "distracted": sum(1 for is_distracted, _, _ in results if is_distracted)
+    }
+
+
+def format_report(report):
+    lines = [
+        f"Frames:        {report['frames']} in {report['wall_time']:.2f}s ({report['frames_per_second']:.2f} frames/s)",
+        f"Latency:       p50 {report['latency_p50'] * 1000:.0f}ms  p90 {report['latency_p90'] * 1000:.0f}ms  p99 {report['latency_p99'] * 1000:.0f}ms",
+        f"Distracted:    {report['distracted']}",
+        f"Errors:        {report['errors']}"
+    ]
+    if report["skipped"]:
+        lines.append(f"Skipped:       {report['skipped']} (declined by the analysis server)")
+    if report["agreement"] is not None:
+        lines.append(f"Agreement:     {report['agreement'] * 100:.1f}% over {report['compared']} recorded verdicts")
+    else:
+        lines.append("Agreement:     n/a (session has no recorded verdicts)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded capture session through the analyzer as fast as possible.")
+    parser.add_argument("session", help="Session file written by daemon.py --record")
+    parser.add_argument("--config", default="config.json", help="Config providing activities, blacklist and backend "
+                                                                 "(Ollama, transformers or an analysis server)")
+    parser.add_argument("--ollama-url", default=None, help="Override the backend URL from the config")
+    parser.add_argument("--model", default=None, help="Override the model from the config")
+    parser.add_argument("--fake", action="store_true", help="Run against a local fake Ollama server")
+    parser.add_argument("--fake-delay", type=float, default=0.0, help="Simulated inference time for --fake")
+    parser.add_argument("--use-session-config", action="store_true", help="Use the prompt settings stored in the session")
+    parser.add_argument("--workers", type=int, default=1, help="Requests kept in flight")
+    parser.add_argument("--limit", type=int, default=None, help="Only replay the first N frames")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    if args.use_session_config:
+        archive, index = load_session(args.session)
+        archive.close()
+        config.update({key: value for key, value in index["config"].items() if value})
+    if args.ollama_url:
+        config["ollama_url"] = args.ollama_url
+    if args.model:
+        config["model"] = args.model
+
+    fake_server = None
+    if args.fake:
+        fake_server = FakeOllamaServer(delay=args.fake_delay)
+        fake_server.start()
+        config.update({"ollama_url": fake_server.url, "backend": "ollama", "analysis_server": None})
+
+    try:
+        report = run_replay(args.session, make_analyzer(config), args.workers, args.limit)
+    finally:
+        if fake_server:
+            fake_server.stop()
+
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import os
+import json
+import base64
+
+# Builds the /api/generate JSON body as a stream: the envelope, then the
+# image base64-encoded a chunk at a time, then the closing brackets. Only
+# one chunk is materialized at once instead of the file bytes, the base64
+# string, the JSON string and its encoded copy all being alive together.
+# The total length is known up front, so requests sends a Content-Length
+# header rather than chunked transfer encoding.
+
+RAW_CHUNK_SIZE = 3 * 16 * 1024  # multiple of 3 so base64 chunks concatenate cleanly
+BUFFER_CHUNK_SIZE = 64 * 1024
+
+
+def base64_length(raw_size):
+    return 4 * ((raw_size + 2) // 3)
+
+
+def base64_file_chunks(image_file, size, chunk_size=RAW_CHUNK_SIZE):
+    # Streams exactly size bytes from the handle Content-Length was taken
+    # from, so a file replaced or grown meanwhile can't break the length
+    with image_file:
+        while size > 0:
+            data = image_file.read(min(chunk_size, size))
+            if not data:
+                raise IOError(f"{image_file.name} was truncated while it was being sent")
+            size -= len(data)
+            yield base64.b64encode(data)
+
+
+def base64_into(target, data, chunk_size=RAW_CHUNK_SIZE):
+    # Encodes a chunk at a time straight into a preallocated buffer (a
+    # bytearray or shared memory); returns the encoded length
+    length = base64_length(len(data))
+    if length > len(target):
+        raise ValueError(f"Encoded frame ({length} bytes) does not fit its buffer ({len(target)} bytes)")
+    view = memoryview(data)
+    position = 0
+    for start in range(0, len(view), chunk_size):
+        encoded = base64.b64encode(view[start:start + chunk_size])
+        target[position:position + len(encoded)] = encoded
+        position += len(encoded)
+    return position
+
+
+def buffer_chunks(buffer, chunk_size=BUFFER_CHUNK_SIZE):
+    # Slices of an existing base64 buffer; memoryview avoids copying it
+    view = memoryview(buffer)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+
+class StreamingBody:
+    def __init__(self, pieces, length):
+        self.pieces = iter(pieces)
+        self.length = length
+        self.buffer = b""
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self.buffer + b"".join(bytes(piece) for piece in self.pieces)
+        while len(self.buffer) < size:
+            piece = next(self.pieces, None)
+            if piece is None:
+                break
+            self.buffer += bytes(piece)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(BUFFER_CHUNK_SIZE)
+            if not data:
+                return
+            yield data
+
+
+def generate_request_body(model, prompt, image_path=None, base64_image=None, options=None):
+    envelope = {'model': model, 'prompt': prompt, 'stream': False, 'options': options or {}}
+    head = (json.dumps(envelope)[:-1] + ', "images": ["').encode('utf-8')
+    tail = b'"]}'
+    if base64_image is not None:
+        if isinstance(base64_image, str):
+            base64_image = base64_image.encode('ascii')
+        image_length = len(base64_image)
+        image_chunks = buffer_chunks(base64_image)
+    else:
+        image_file = open(image_path, "rb")
+        size = os.fstat(image_file.fileno()).st_size
+        image_length = base64_length(size)
+        image_chunks = base64_file_chunks(image_file, size)
+
+    def pieces():
+        yield head
+        yield from image_chunks
+        yield tail
+
+    return StreamingBody(pieces(), len(head) + image_length + len(tail))
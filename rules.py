@@ -0,0 +1,205 @@
+import math
+import random
+import datetime
+
+import metrics
+
+# Alerts and praise as declarative rules from config instead of timestamp
+# checks on every result. A rule names the smoothed state it applies to and
+# how long that state must have held ("for"), how often it may repeat
+# ("cooldown"), an optional local-hours window and a chance of firing when
+# due (retried every "retry" seconds). Each rule's next due time sits in a
+# timer wheel that the GUI advances once a second, so a rule fires on time
+# even when no check result arrives (capture paused, long intervals).
+# Results only cost anything when the state flips, and then only for the
+# rules of the old and new state.
+#
+#   {"name": "evening_praise", "when": "focused", "for": 1800, "cooldown": 1800,
+#    "hours": [20, 24], "chance": 0.125, "action": "sound", "sound": "bladerunner.m4a"}
+
+RULE_DEFAULTS = {"for": 0, "cooldown": 0, "hours": None, "chance": 1.0, "retry": 30, "enabled": True}
+STATES = ("focused", "distracted")
+ACTIONS = ("alert", "praise", "sound", "notify")
+
+
+def validate_rules(rules):
+    # Returns a list of problems, empty when the rules are usable
+    if not isinstance(rules, list):
+        return ["must be a list of rules"]
+    errors = []
+    names = set()
+    for index, rule in enumerate(rules):
+        where = f"rule {index + 1}"
+        if not isinstance(rule, dict):
+            errors.append(f"{where}: must be an object")
+            continue
+        if not rule.get("name") or rule["name"] in names:
+            errors.append(f"{where}: needs a unique name")
+        names.add(rule.get("name"))
+        if rule.get("when") not in STATES:
+            errors.append(f"{where}: when must be one of {', '.join(STATES)}")
+        if rule.get("action") not in ACTIONS:
+            errors.append(f"{where}: action must be one of {', '.join(ACTIONS)}")
+        if rule.get("action") == "sound" and not rule.get("sound"):
+            errors.append(f"{where}: a sound action needs a sound file")
+        for key in ("for", "cooldown", "retry"):
+            value = rule.get(key, RULE_DEFAULTS[key])
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+                errors.append(f"{where}: {key} must be a number >= 0")
+        chance = rule.get("chance", 1.0)
+        if not isinstance(chance, (int, float)) or not 0 <= chance <= 1:
+            errors.append(f"{where}: chance must be between 0 and 1")
+        hours = rule.get("hours")
+        if hours is not None and not (isinstance(hours, list) and len(hours) == 2
+                                      and all(isinstance(hour, int) and 0 <= hour <= 24 for hour in hours)):
+            errors.append(f"{where}: hours must be [start, end] between 0 and 24")
+    return errors
+
+
+def in_hours(timestamp, hours):
+    start, end = hours
+    hour = datetime.datetime.fromtimestamp(timestamp).hour
+    # [22, 6] wraps around midnight
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def next_hours_start(timestamp, hours):
+    now = datetime.datetime.fromtimestamp(timestamp)
+    start = now.replace(hour=hours[0] % 24, minute=0, second=0, microsecond=0)
+    if start <= now:
+        start += datetime.timedelta(days=1)
+    return start.timestamp()
+
+
+class TimerWheel:
+    # Hashed timer wheel: one bucket per tick, deadlines further out than
+    # the wheel wait in their bucket for later rounds
+    def __init__(self, slots=512, tick=1.0):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]  # key -> deadline tick
+        self.where = {}  # key -> slot index
+        self.current = None  # next tick to process
+
+    def schedule(self, key, when):
+        self.cancel(key)
+        deadline = math.ceil(when / self.tick)
+        if self.current is not None:
+            deadline = max(deadline, self.current)
+        index = deadline % len(self.slots)
+        self.slots[index][key] = deadline
+        self.where[key] = index
+
+    def cancel(self, key):
+        index = self.where.pop(key, None)
+        if index is not None:
+            del self.slots[index][key]
+
+    def clear(self):
+        for slot in self.slots:
+            slot.clear()
+        self.where = {}
+
+    def advance(self, now):
+        # Returns the keys due up to now, earliest first
+        target = math.floor(now / self.tick)
+        if self.current is None:
+            self.current = target
+        due = []
+        # After a long gap (suspend) every slot is visited once, not once per missed tick
+        for deadline in range(self.current, min(target + 1, self.current + len(self.slots))):
+            slot = self.slots[deadline % len(self.slots)]
+            due.extend((tick, key) for key, tick in slot.items() if tick <= target)
+        for _, key in due:
+            self.cancel(key)
+        self.current = max(self.current, target + 1)
+        return [key for _, key in sorted(due, key=lambda item: item[0])]
+
+
+class RuleEngine:
+    def __init__(self, rules, on_fire, chance=random.random):
+        self.on_fire = on_fire  # on_fire(rule dict)
+        self.chance = chance
+        self.wheel = TimerWheel()
+        self.state = None
+        self.since = None
+        self.last_fired = {}  # rule name -> time; kept across state flips and rule edits
+        self.rules = {}
+        self.by_state = {state: [] for state in STATES}
+        self.set_rules(rules)
+
+    def set_rules(self, rules):
+        # Rules that didn't change keep their timers; the rest are rescheduled
+        rules = {rule["name"]: dict(RULE_DEFAULTS, **rule) for rule in rules}
+        rules = {name: rule for name, rule in rules.items() if rule["enabled"]}
+        changed = [name for name in set(self.rules) | set(rules) if self.rules.get(name) != rules.get(name)]
+        for name in changed:
+            self.wheel.cancel(name)
+        self.last_fired = {name: fired for name, fired in self.last_fired.items() if name in rules}
+        self.rules = rules
+        self.by_state = {state: [rule for rule in self.rules.values() if rule["when"] == state] for state in STATES}
+        if self.state is not None:
+            for rule in self.by_state[self.state]:
+                if rule["name"] in changed:
+                    self.schedule(rule, self.due(rule))
+
+    def due(self, rule):
+        last_fired = self.last_fired.get(rule["name"], -math.inf)
+        if not rule["cooldown"] and last_fired >= self.since:
+            return math.inf  # Without a cooldown a rule fires once each time its state is entered
+        return max(self.since + rule["for"], last_fired + rule["cooldown"])
+
+    def schedule(self, rule, when):
+        if when == math.inf:
+            self.wheel.cancel(rule["name"])
+        else:
+            self.wheel.schedule(rule["name"], when)
+
+    def observe(self, distracted, now):
+        # Called with the smoothed state on every result; only a flip does any work
+        state = "distracted" if distracted else "focused"
+        if state == self.state:
+            return
+        if self.state is not None:
+            for rule in self.by_state[self.state]:
+                self.wheel.cancel(rule["name"])
+        self.state = state
+        self.since = now
+        for rule in self.by_state[state]:
+            # Rules due right away (an alert on entering distracted) don't wait for the next tick
+            if self.due(rule) <= now:
+                self.evaluate(rule, now)
+            else:
+                self.schedule(rule, self.due(rule))
+
+    def advance(self, now):
+        for name in self.wheel.advance(now):
+            rule = self.rules.get(name)
+            if rule and rule["when"] == self.state:
+                self.evaluate(rule, now)
+
+    def evaluate(self, rule, now):
+        due = self.due(rule)
+        if due > now:
+            self.schedule(rule, due)
+            return
+        if rule["hours"] and not in_hours(now, rule["hours"]):
+            self.schedule(rule, next_hours_start(now, rule["hours"]))
+            return
+        if rule["chance"] < 1 and self.chance() >= rule["chance"]:
+            self.schedule(rule, now + max(rule["retry"], self.wheel.tick))
+            return
+        self.last_fired[rule["name"]] = now
+        metrics.RULE_FIRINGS.inc(rule=rule["name"])
+        if rule["cooldown"]:
+            self.schedule(rule, now + rule["cooldown"])
+        try:
+            self.on_fire(rule)
+        except Exception as e:
+            print(f"Error running rule {rule['name']}: {e}")
+
+    def reset(self):
+        # Monitoring stopped or the user went away: nothing is known about
+        # the state until results resume, and "for" counts from then
+        self.wheel.clear()
+        self.state = None
+        self.since = None
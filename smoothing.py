@@ -0,0 +1,121 @@
+import collections
+
+# Streaming filters that turn noisy per-frame verdicts into a distracted /
+# focused state with hysteresis. Every filter keeps a probability that the
+# user is distracted; the state only flips once it crosses the enter or exit
+# threshold, so one misclassified frame cannot fire an alert on its own.
+# Filters also suggest when the next check should happen: soon when the
+# evidence is mixed, later when the state has been stable for a while.
+
+
+class VerdictFilter:
+    def __init__(self, enter_threshold=0.7, exit_threshold=0.3, recheck_delay=5, stable_checks=3, stable_interval_multiplier=2.0):
+        self.enter_threshold = enter_threshold
+        self.exit_threshold = exit_threshold
+        self.recheck_delay = recheck_delay
+        self.stable_checks = stable_checks
+        self.stable_interval_multiplier = stable_interval_multiplier
+        self.probability = 0.0
+        self.distracted = False
+        self.stable_count = 0
+
+    def observe(self, is_distracted, confidence):
+        raise NotImplementedError
+
+    def update(self, is_distracted, confidence=1.0):
+        # Returns True when the smoothed state changed
+        if confidence > 0:
+            self.observe(is_distracted, min(confidence, 1.0))
+
+        previous = self.distracted
+        if not self.distracted and self.probability >= self.enter_threshold:
+            self.distracted = True
+        elif self.distracted and self.probability <= self.exit_threshold:
+            self.distracted = False
+
+        if self.distracted == previous and is_distracted == self.distracted and confidence > 0:
+            self.stable_count += 1
+        else:
+            self.stable_count = 0
+        return self.distracted != previous
+
+    def is_uncertain(self):
+        return self.exit_threshold < self.probability < self.enter_threshold and self.stable_count == 0
+
+    def next_delay(self, interval):
+        if self.is_uncertain():
+            return min(self.recheck_delay, interval)
+        if self.stable_count >= self.stable_checks:
+            return interval * self.stable_interval_multiplier
+        return interval
+
+
+class PassthroughFilter(VerdictFilter):
+    def __init__(self):
+        super().__init__(enter_threshold=0.5, exit_threshold=0.5, stable_interval_multiplier=1.0)
+
+    def observe(self, is_distracted, confidence):
+        self.probability = 1.0 if is_distracted else 0.0
+
+    def is_uncertain(self):
+        return False
+
+
+class EmaFilter(VerdictFilter):
+    def __init__(self, alpha=0.6, **kwargs):
+        super().__init__(**kwargs)
+        self.alpha = alpha
+
+    def observe(self, is_distracted, confidence):
+        alpha = self.alpha * confidence
+        self.probability = alpha * (1.0 if is_distracted else 0.0) + (1 - alpha) * self.probability
+
+
+class WindowFilter(VerdictFilter):
+    def __init__(self, window=5, **kwargs):
+        super().__init__(**kwargs)
+        # Starts full of focused verdicts, so a single frame weighs 1/window from the first check on
+        self.window = collections.deque([(0.0, 1.0)] * window, maxlen=window)
+
+    def observe(self, is_distracted, confidence):
+        self.window.append((confidence if is_distracted else 0.0, confidence))
+        total = sum(weight for _, weight in self.window)
+        self.probability = sum(value for value, _ in self.window) / total if total else 0.0
+
+
+class HmmFilter(VerdictFilter):
+    # Two-state hidden Markov model filtered forward one check at a time
+    def __init__(self, switch_probability=0.1, accuracy=0.85, **kwargs):
+        super().__init__(**kwargs)
+        self.switch_probability = switch_probability
+        self.accuracy = accuracy
+
+    def observe(self, is_distracted, confidence):
+        prior = self.probability * (1 - self.switch_probability) + (1 - self.probability) * self.switch_probability
+        accuracy = 0.5 + (self.accuracy - 0.5) * confidence
+        if is_distracted:
+            likely, unlikely = accuracy, 1 - accuracy
+        else:
+            likely, unlikely = 1 - accuracy, accuracy
+        evidence = prior * likely + (1 - prior) * unlikely
+        self.probability = prior * likely / evidence if evidence else prior
+
+
+def make_verdict_filter(config):
+    method = config.get('smoothing_method', 'ema')
+    if method in (None, 'none'):
+        return PassthroughFilter()
+    kwargs = {
+        'enter_threshold': config.get('smoothing_enter_threshold', 0.7),
+        'exit_threshold': config.get('smoothing_exit_threshold', 0.3),
+        'recheck_delay': config.get('recheck_delay', 5),
+        'stable_checks': config.get('stable_checks', 3),
+        'stable_interval_multiplier': config.get('stable_interval_multiplier', 2.0)
+    }
+    if method == 'ema':
+        return EmaFilter(config.get('smoothing_alpha', 0.6), **kwargs)
+    if method == 'window':
+        return WindowFilter(config.get('smoothing_window', 5), **kwargs)
+    if method == 'hmm':
+        return HmmFilter(config.get('smoothing_switch_probability', 0.1), config.get('smoothing_accuracy', 0.85), **kwargs)
+    raise ValueError(f"Unknown smoothing method: {method}")
@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import zlib
+import socket
+import struct
+import argparse
+import datetime
+
+# Combines distraction stats from several machines without double counting.
+# Each device keeps grow-only counters (checks, distractions, seconds) per
+# hour, one set per device that ever contributed: a G-counter per hour.
+# A device only ever increments its own counters, so merging a copy from
+# elsewhere is a per-entry max, and merging the same data twice changes
+# nothing. Daily totals are sums of the hours.
+#
+# Sync goes through a shared folder (Syncthing, Dropbox, a USB stick):
+# every device writes small delta files with just the hours it touched
+# since its last export, numbered by a per-device sequence, into its own
+# subfolder, and reads other devices' deltas past the last sequence it has
+# applied. A sync therefore costs time linear in the new deltas, not in the
+# history. Once a device has written COMPACT_AFTER deltas it replaces them
+# with one snapshot of its counters, so new devices catch up quickly.
+
+MAGIC = b"AIMS"
+VERSION = 1
+HEADER = struct.Struct("<4sBH")  # magic, version, device id length
+SEQUENCES = struct.Struct("<QQI")  # from sequence (exclusive), to sequence, records
+RECORD = struct.Struct("<iIId")  # local hours since 1970-01-01, checks, distractions, seconds
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+COMPACT_AFTER = 64
+
+
+def hour_index(key):
+    moment = datetime.datetime.strptime(key, '%Y-%m-%d %H:00')
+    return (moment.toordinal() - EPOCH) * 24 + moment.hour
+
+
+def hour_key(index):
+    day, hour = divmod(index, 24)
+    return f"{datetime.date.fromordinal(EPOCH + day).isoformat()} {hour:02d}:00"
+
+
+def encode_delta(device, from_seq, to_seq, entries):
+    # entries: hour key -> [checks, distractions, seconds]
+    name = device.encode("utf-8")
+    parts = [HEADER.pack(MAGIC, VERSION, len(name)), name, SEQUENCES.pack(from_seq, to_seq, len(entries))]
+    parts.extend(RECORD.pack(hour_index(key), *counts) for key, counts in sorted(entries.items()))
+    return zlib.compress(b"".join(parts))
+
+
+def decode_delta(data):
+    data = zlib.decompress(data)
+    magic, version, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a stats delta file")
+    offset = HEADER.size
+    device = data[offset:offset + length].decode("utf-8")
+    offset += length
+    from_seq, to_seq, count = SEQUENCES.unpack_from(data, offset)
+    offset += SEQUENCES.size
+    entries = {}
+    for index, checks, distractions, seconds in RECORD.iter_unpack(data[offset:offset + count * RECORD.size]):
+        entries[hour_key(index)] = [checks, distractions, seconds]
+    return device, from_seq, to_seq, entries
+
+
+def write_atomic(path, data):
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+class StatsReplica:
+    def __init__(self, path, device, legacy_stats=None):
+        self.path = path
+        self.device = device
+        self.counters = {}  # hour key -> {device: [checks, distractions, seconds]}
+        self.seq = 0  # sequence of this device's last export
+        self.seen = {}  # device -> last sequence applied from its files
+        self.dirty = set()  # own hours changed since the last export
+        self.deltas = 0  # own delta files written since the last snapshot
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                state = json.load(f)
+            self.counters = state["counters"]
+            self.seq = state["seq"]
+            self.seen = state["seen"]
+            self.dirty = set(state["dirty"])
+            self.deltas = state.get("deltas", 0)
+        elif legacy_stats:
+            # Stats counted here before sync was set up become this device's own
+            for key, data in legacy_stats.items():
+                if ' ' in key:
+                    self.counters[key] = {device: [data['checks'], data['distractions'], data['total_time']]}
+                    self.dirty.add(key)
+
+    def save(self):
+        state = {"device": self.device, "seq": self.seq, "seen": self.seen, "dirty": sorted(self.dirty),
+                 "deltas": self.deltas, "counters": self.counters}
+        write_atomic(self.path, json.dumps(state).encode("utf-8"))
+
+    def increment(self, key, distracted, interval):
+        counts = self.counters.setdefault(key, {}).setdefault(self.device, [0, 0, 0])
+        counts[0] += 1
+        counts[1] += 1 if distracted else 0
+        counts[2] += interval
+        self.dirty.add(key)
+
+    def merge(self, device, entries):
+        # Returns {hour key: [added checks, distractions, seconds]} for the merged view
+        changes = {}
+        for key, counts in entries.items():
+            current = self.counters.setdefault(key, {}).get(device, [0, 0, 0])
+            merged = [max(old, new) for old, new in zip(current, counts)]
+            if merged != current:
+                self.counters[key][device] = merged
+                changes[key] = [new - old for old, new in zip(current, merged)]
+        return changes
+
+    def merged_stats(self):
+        # The combined view in StatsTracker's format: hourly and daily totals over every device
+        stats = {}
+        for key, devices in self.counters.items():
+            for bucket in (key[:10], key):
+                totals = stats.setdefault(bucket, {'distractions': 0, 'checks': 0, 'total_time': 0})
+                for checks, distractions, seconds in devices.values():
+                    totals['checks'] += checks
+                    totals['distractions'] += distractions
+                    totals['total_time'] += seconds
+        return dict(sorted(stats.items()))
+
+
+class SyncFolder:
+    def __init__(self, directory, replica):
+        self.directory = directory
+        self.replica = replica
+
+    def device_dir(self, device):
+        # Device ids become folder names; keep them to safe characters
+        return os.path.join(self.directory, "".join(c if c.isalnum() or c in "-_." else "_" for c in device))
+
+    def export(self):
+        replica = self.replica
+        if not replica.dirty:
+            return None
+        directory = self.device_dir(replica.device)
+        os.makedirs(directory, exist_ok=True)
+        entries = {key: replica.counters[key][replica.device] for key in replica.dirty}
+        path = os.path.join(directory, f"{replica.seq + 1:012d}.delta")
+        write_atomic(path, encode_delta(replica.device, replica.seq, replica.seq + 1, entries))
+        replica.seq += 1
+        replica.dirty = set()
+        replica.deltas += 1
+        if replica.deltas >= COMPACT_AFTER:
+            self.compact()
+        return path
+
+    def compact(self):
+        # One snapshot of every own counter replaces the deltas before it
+        replica = self.replica
+        directory = self.device_dir(replica.device)
+        entries = {key: devices[replica.device] for key, devices in replica.counters.items() if replica.device in devices}
+        write_atomic(os.path.join(directory, f"{replica.seq:012d}.snapshot"),
+                     encode_delta(replica.device, 0, replica.seq, entries))
+        for name in os.listdir(directory):
+            sequence, _, kind = name.partition(".")
+            if kind in ("delta", "snapshot") and sequence.isdigit() and int(sequence) <= replica.seq \
+                    and name != f"{replica.seq:012d}.snapshot":
+                os.remove(os.path.join(directory, name))
+        replica.deltas = 0
+
+    def pending_files(self, directory, seen):
+        # The files still to apply, in order: the latest snapshot past `seen`
+        # when there is one (deltas before it may be gone), then later deltas
+        files = []
+        for name in os.listdir(directory):
+            sequence, _, kind = name.partition(".")
+            if kind in ("delta", "snapshot") and sequence.isdigit() and int(sequence) > seen:
+                files.append((int(sequence), kind == "delta", name))
+        files.sort()
+        snapshots = [index for index, (_, is_delta, _) in enumerate(files) if not is_delta]
+        if snapshots:
+            files = files[snapshots[-1]:]
+            files = [files[0]] + [entry for entry in files[1:] if entry[1]]
+        return [name for _, _, name in files]
+
+    def import_all(self):
+        # Returns the merged-view changes from every other device's new files
+        replica = self.replica
+        changes = {}
+        if not os.path.isdir(self.directory):
+            return changes
+        own = self.device_dir(replica.device)
+        for entry in sorted(os.listdir(self.directory)):
+            directory = os.path.join(self.directory, entry)
+            if directory == own or not os.path.isdir(directory):
+                continue
+            for name in self.pending_files(directory, replica.seen.get(entry, 0)):
+                try:
+                    with open(os.path.join(directory, name), "rb") as f:
+                        device, from_seq, to_seq, entries = decode_delta(f.read())
+                except FileNotFoundError:
+                    break  # compacted while listing; picked up next time
+                except (OSError, ValueError, zlib.error, struct.error) as e:
+                    print(f"Skipping unreadable stats delta {entry}/{name}: {e}")
+                    break
+                if from_seq > replica.seen.get(entry, 0):
+                    break  # a gap: wait for the snapshot or missing delta to arrive
+                for key, added in replica.merge(device, entries).items():
+                    totals = changes.setdefault(key, [0, 0, 0])
+                    for i in range(3):
+                        totals[i] += added[i]
+                replica.seen[entry] = to_seq
+        return changes
+
+    def sync(self):
+        self.export()
+        changes = self.import_all()
+        self.replica.save()
+        return changes
+
+
+def default_device():
+    return socket.gethostname() or "device"
+
+
+def counters_path(stats_filename):
+    return os.path.splitext(stats_filename)[0] + ".counters.json"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge distraction stats with other devices through a shared folder. "
+                                                 "A running monitor with stats_sync_dir set does this by itself.")
+    parser.add_argument("sync_dir")
+    parser.add_argument("--stats", default="distraction_stats.json")
+    parser.add_argument("--device", default=None, help="This device's id (default: the host name)")
+    args = parser.parse_args(argv)
+
+    stats = {}
+    if os.path.exists(args.stats):
+        with open(args.stats, "r") as f:
+            stats = json.load(f)
+    replica = StatsReplica(counters_path(args.stats), args.device or default_device(), stats)
+    changes = SyncFolder(args.sync_dir, replica).sync()
+    write_atomic(args.stats, json.dumps(replica.merged_stats(), indent=2).encode("utf-8"))
+    devices = sorted({device for devices in replica.counters.values() for device in devices})
+    print(f"Merged {len(changes)} changed hours; stats now cover {', '.join(devices) or 'no devices'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import sys
 import requests
 import base64
 from PIL import Image
@@ -7,10 +8,10 @@ def encode_image(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
-def ask_llava(prompt, image_path):
+def ask_llava(prompt, image_path, ollama_url='http://localhost:11434'):
     base64_image = encode_image(image_path)
     
-    response = requests.post('http://localhost:11434/api/generate',
+    response = requests.post(f'{ollama_url}/api/generate',
         json={
             'model': 'llava',
             'prompt': prompt,
@@ -26,10 +27,13 @@ def ask_llava(prompt, image_path):
     else:
         return f"Error: {response.status_code}, {response.text}"
 
-# Example usage
-image_path = '/Users/patrickliu/Desktop/Startups/AIMonitoring/readthistext.png'
+# Example usage: python testllava.py [image] [question]
+# For repeatable measurements over many frames use replay.py instead
+image_path = sys.argv[1] if len(sys.argv) > 1 else 'readthistext.png'
 question = "In this image, is the user doing anything related to this: coding or writing or planning tasks? Reply with 'yes' or 'no' if they are definetely distracted. and reasoning"
 question = "Describe what this user in this image is doing briefly (5 words max) from these options: reading book, learning, coding, watching youtube video, watching tiktok, browsing social media, reading manga, gaming, watching live stream, chatting online."
 question = "Read the text in this image"
+if len(sys.argv) > 2:
+    question = sys.argv[2]
 answer = ask_llava(question, image_path)
-print(answer)
\ No newline at end of file
+print(answer)
@@ -0,0 +1,65 @@
+import time
+import threading
+import importlib
+
+import pytest
+
+pytest.importorskip("mss")
+analysis_server = importlib.import_module("analysis_server")
+
+
+class SlowAnalyzer:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def ask_llava(self, prompt, image_path, base64_image=None):
+        if base64_image == "slow":
+            self.release.wait(5)
+        return f"answer for {base64_image}"
+
+
+def test_superseded_frames_are_marked_skipped():
+    scheduler = analysis_server.FairScheduler(queue_limit=1, rate_limit=0)
+    old = analysis_server.Job("seat", 1, "prompt", "a")
+    scheduler.submit(old)
+    scheduler.submit(analysis_server.Job("seat", 2, "prompt", "b"))
+    assert old.result()["skipped"] is True
+
+
+def test_slow_request_does_not_hold_up_later_batches():
+    scheduler = analysis_server.FairScheduler(queue_limit=4, rate_limit=0)
+    analyzer = SlowAnalyzer()
+    worker = analysis_server.ModelWorker(scheduler, analyzer, parallel=2, batch_size=1, batch_wait=0)
+    worker.start()
+    try:
+        slow = analysis_server.Job("seat-1", 1, "prompt", "slow")
+        fast = analysis_server.Job("seat-2", 1, "prompt", "fast")
+        scheduler.submit(slow)
+        time.sleep(0.05)
+        scheduler.submit(fast)
+        assert fast.done.wait(2)
+        assert fast.result()["response"] == "answer for fast"
+        assert not slow.done.is_set()
+    finally:
+        analyzer.release.set()
+        scheduler.close()
+    assert slow.done.wait(2)
+
+
+def test_rate_limit_follows_the_peer_not_the_client_id():
+    scheduler = analysis_server.FairScheduler(queue_limit=4, rate_limit=1, rate_burst=2)
+    accepted = [scheduler.submit(analysis_server.Job(("10.0.0.5", f"seat-{n}"), 1, "prompt", "a", "10.0.0.5"))
+                for n in range(4)]
+    assert accepted == [True, True, False, False]
+    assert scheduler.submit(analysis_server.Job(("10.0.0.6", "seat-0"), 1, "prompt", "a", "10.0.0.6"))
+
+
+def test_refilled_buckets_are_dropped():
+    scheduler = analysis_server.FairScheduler(queue_limit=4, rate_limit=6, rate_burst=2)
+    for peer in ("10.0.0.5", "10.0.0.6"):
+        scheduler.submit(analysis_server.Job(peer, 1, "prompt", "a"))
+    # 10.0.0.5 has been quiet long enough to refill; 10.0.0.6 has not
+    scheduler.buckets["10.0.0.5"].updated -= 20
+    scheduler.swept -= analysis_server.BUCKET_SWEEP_INTERVAL
+    scheduler.submit(analysis_server.Job("10.0.0.7", 1, "prompt", "a"))
+    assert set(scheduler.buckets) == {"10.0.0.6", "10.0.0.7"}
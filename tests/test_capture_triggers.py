@@ -0,0 +1,50 @@
+import json
+import time
+
+from capture_triggers import WindowWatcher
+
+
+def make_watcher(tmp_path, on_trigger, is_paused=None, **settings):
+    probe = tmp_path / "window.json"
+    config = dict({"window_probe_file": str(probe), "capture_triggers": True, "trigger_poll_interval": 0.01,
+                   "trigger_debounce": 2.0, "trigger_max_per_minute": 4}, **settings)
+    return WindowWatcher(config, on_trigger, is_paused), probe
+
+
+def focus(probe, title, process="firefox", windows=(1,)):
+    probe.write_text(json.dumps({"title": title, "process": process, "app": "", "windows": list(windows)}))
+
+
+def test_trigger_fires_once_changes_settle(tmp_path):
+    fired = []
+    watcher, probe = make_watcher(tmp_path, lambda reason: fired.append(reason) or True)
+    focus(probe, "main.py - editor", "code")
+    watcher.poll(100.0)
+    focus(probe, "Twitch")
+    watcher.poll(101.0)
+    focus(probe, "Twitch - xQc")
+    watcher.poll(102.0)
+    watcher.poll(103.0)
+    assert fired == []
+    watcher.poll(104.0)
+    assert fired == ["focus"]
+
+
+def test_nothing_is_probed_while_paused(tmp_path):
+    fired = []
+    paused = [True]
+    watcher, probe = make_watcher(tmp_path, lambda reason: fired.append(reason) or True, lambda: paused[0],
+                                  trigger_debounce=0)
+    focus(probe, "main.py - editor", "code")
+    watcher.start()
+    try:
+        time.sleep(0.1)
+        assert watcher.window is None
+        paused[0] = False
+        end = time.monotonic() + 5
+        while watcher.window is None and time.monotonic() < end:
+            time.sleep(0.01)
+        assert watcher.window == ("code", "", "main.py - editor")
+    finally:
+        watcher.stop()
+    assert fired == []
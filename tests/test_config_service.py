@@ -0,0 +1,83 @@
+import json
+import time
+import importlib
+
+import pytest
+
+pytest.importorskip("mss")
+config_service = importlib.import_module("config_service")
+engine = importlib.import_module("engine")
+
+
+def test_settings_that_default_to_null_have_a_type():
+    nullable = {key for key, value in engine.DEFAULT_CONFIG.items() if value is None}
+    assert nullable == set(config_service.NULLABLE)
+
+
+@pytest.mark.parametrize("key, value", [
+    ("history_dir", None), ("history_dir", "history"), ("metrics_port", None), ("metrics_port", 9100),
+    ("monitor_weights", {}), ("monitor_weights", {"1": 2, "2": 0.5}),
+    ("prompt_template", "Which of {options}?"), ("some_future_key", [1, 2]),
+])
+def test_valid_values(key, value):
+    assert config_service.validate_value(key, value) is None
+
+
+@pytest.mark.parametrize("key, value", [
+    ("history_dir", 5), ("client_id", ["laptop"]), ("analysis_server", True), ("metrics_port", "9100"),
+    ("metrics_port", 70000), ("transformers_threads", 1.5), ("capture_interval", None),
+    ("monitor_weights", []), ("monitor_weights", {"1": "high"}), ("monitor_weights", {"1": True}),
+    ("monitor_weights", {"1": -1}), ("prompt_template", "Which of {options} on {monitor}?"),
+    ("prompt_template", "Which of {options[0]}?"), ("prompt_template", "Which of {options}? {"),
+])
+def test_invalid_values(key, value):
+    assert config_service.validate_value(key, value)
+
+
+def test_cross_key_checks_skip_values_of_the_wrong_type():
+    errors = config_service.validate_config(dict(engine.DEFAULT_CONFIG, prompt_template=5, smoothing_exit_threshold="high"))
+    assert [error.split(":")[0] for error in errors] == ["prompt_template", "smoothing_exit_threshold"]
+
+
+def test_invalid_settings_in_the_file_fall_back_to_defaults(tmp_path):
+    filename = tmp_path / "config.json"
+    filename.write_text(json.dumps({"history_dir": 5, "capture_interval": 10}))
+    service = config_service.ConfigService(str(filename))
+    assert service.config["history_dir"] is None
+    assert service.config["capture_interval"] == 10
+
+
+def test_updates_are_written_once_after_the_debounce(tmp_path):
+    filename = tmp_path / "config.json"
+    service = config_service.ConfigService(str(filename), debounce=0.1)
+    notified = []
+    service.add_listener(notified.append)
+    for interval in (10, 11, 12):
+        assert service.update({"capture_interval": interval}) == []
+    assert not filename.exists()
+    assert service.update({"capture_interval": 0})  # out of range: rejected, not written
+    assert notified == [{"capture_interval": 10}, {"capture_interval": 11}, {"capture_interval": 12}]
+    deadline = time.monotonic() + 5
+    while not filename.exists() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert json.loads(filename.read_text())["capture_interval"] == 12
+    # Our own write is not picked up as an outside edit
+    service.reload()
+    assert len(notified) == 3
+
+
+def test_reload_applies_valid_edits_and_ignores_invalid_ones(tmp_path):
+    filename = tmp_path / "config.json"
+    filename.write_text(json.dumps({"capture_interval": 30}))
+    service = config_service.ConfigService(str(filename))
+    notified = []
+    service.add_listener(notified.append)
+
+    filename.write_text(json.dumps({"capture_interval": 45, "history_dir": "frames"}))
+    service.reload()
+    assert notified == [{"capture_interval": 45, "history_dir": "frames"}]
+
+    filename.write_text(json.dumps({"capture_interval": 60, "monitor_weights": {"1": "high"}}))
+    service.reload()
+    assert len(notified) == 1
+    assert service.config["capture_interval"] == 45
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+
+from embedding_index import DIMENSIONS, EmbeddingIndex, encode_record
+
+
+def vector(seed):
+    values = np.random.default_rng(seed).standard_normal(DIMENSIONS).astype(np.float32)
+    return values / np.linalg.norm(values)
+
+
+def test_entries_survive_reload(tmp_path):
+    index = EmbeddingIndex(str(tmp_path), "model\nprompt")
+    index.add(vector(1), "Focused on code")
+    index.add(vector(2), "Watching videos ✓")
+    reloaded = EmbeddingIndex(str(tmp_path), "model\nprompt")
+    assert reloaded.answers == ["Focused on code", "Watching videos ✓"]
+    assert np.allclose(reloaded.vectors[1], vector(2))
+
+
+def test_torn_tail_is_cut_off_and_appends_stay_aligned(tmp_path):
+    index = EmbeddingIndex(str(tmp_path), "key")
+    index.add(vector(1), "first")
+    index.add(vector(2), "second")
+    good_size = os.path.getsize(index.path)
+    # A crash halfway through the third append
+    with open(index.path, "ab") as f:
+        f.write(encode_record(vector(3), "third")[:100])
+
+    reloaded = EmbeddingIndex(str(tmp_path), "key")
+    assert reloaded.answers == ["first", "second"]
+    assert os.path.getsize(reloaded.path) == good_size
+
+    reloaded.add(vector(4), "fourth")
+    again = EmbeddingIndex(str(tmp_path), "key")
+    assert again.answers == ["first", "second", "fourth"]
+    assert np.allclose(again.vectors[2], vector(4))
+
+
+def test_corrupt_record_drops_it_and_everything_after(tmp_path):
+    index = EmbeddingIndex(str(tmp_path), "key")
+    for i in range(3):
+        index.add(vector(i), f"answer {i}")
+    with open(index.path, "r+b") as f:
+        f.seek(os.path.getsize(index.path) - 10)
+        f.write(b"\xff" * 4)
+    reloaded = EmbeddingIndex(str(tmp_path), "key")
+    assert reloaded.answers == ["answer 0", "answer 1"]
+    assert reloaded.vectors.shape == (2, DIMENSIONS)
+
+
+def test_trim_rewrites_the_file(tmp_path):
+    index = EmbeddingIndex(str(tmp_path), "key", max_entries=10)
+    for i in range(11):
+        index.add(vector(i), f"answer {i}")
+    assert index.answers == [f"answer {i}" for i in range(2, 11)]
+    reloaded = EmbeddingIndex(str(tmp_path), "key", max_entries=10)
+    assert reloaded.answers == index.answers
+    assert np.allclose(reloaded.vectors, index.vectors)
+
+
+def test_storage_grows_without_losing_entries(tmp_path):
+    index = EmbeddingIndex(str(tmp_path), "key", neighbours=1, max_entries=1000)
+    for i in range(300):
+        index.add(vector(i), f"answer {i}")
+    assert index.vectors.shape == (300, DIMENSIONS)
+    assert len(index.storage) < 2 * 300
+    assert np.allclose(index.vectors[150], vector(150))
+    assert index.lookup(vector(299), lambda answer: False)[0] == "answer 299"
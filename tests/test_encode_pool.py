@@ -0,0 +1,29 @@
+import io
+import base64
+
+import numpy as np
+from PIL import Image
+
+from encode_pool import SharedSlot, encode_shared_frame, frame_digest
+
+
+def test_shared_frame_is_encoded_into_the_output_slot(tmp_path):
+    size = (40, 30)
+    bgrx = np.random.default_rng(1).integers(0, 256, (size[1], size[0], 4), dtype=np.uint8)
+    raw = bgrx.tobytes()
+    # A slot left over from a larger resolution: only the frame's own bytes count
+    slot = SharedSlot(len(raw) + 4096)
+    try:
+        slot.input.buf[:len(raw)] = raw
+        image_path = str(tmp_path / "capture.png")
+        digest, length, encoded_size = encode_shared_frame(slot.input.name, size, slot.output.name, slot.output_capacity,
+                                                           image_path, None, "PNG")
+        assert digest == frame_digest(raw)
+        assert encoded_size == size
+        png = base64.b64decode(bytes(slot.output.buf[:length]))
+        with open(image_path, "rb") as f:
+            assert f.read() == png
+        pixels = np.asarray(Image.open(io.BytesIO(png)))
+        assert (pixels == bgrx[:, :, 2::-1]).all()
+    finally:
+        slot.release()
@@ -0,0 +1,35 @@
+import importlib
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("mss")
+evaluate = importlib.import_module("evaluate")
+engine = importlib.import_module("engine")
+
+
+class LocalAnalyzer(engine.DistractionAnalyzer):
+    backend = "transformers"
+
+    def ask_llava(self, prompt, image_path, base64_image=None):
+        return "gaming" if "red" in image_path else "coding"
+
+
+def test_variants_use_the_configured_backend_and_flag_unknown_keys(tmp_path, monkeypatch, capsys):
+    frames = []
+    for color, label in (("red", True), ("blue", False)):
+        path = tmp_path / f"{color}.png"
+        Image.new("RGB", (8, 8), color).save(path)
+        frames.append((str(path), label))
+    built = []
+
+    def make_analyzer(config):
+        built.append(config["backend"])
+        return LocalAnalyzer(config["possible_activities"], config["blacklisted_words"])
+
+    monkeypatch.setattr(evaluate, "make_analyzer", make_analyzer)
+    variants = [{"name": "clip", "backend": "transformers", "max_sise": 512}]
+    [summary] = evaluate.run_evaluation(frames, dict(engine.DEFAULT_CONFIG), variants, workers=1)
+    assert built == ["transformers"]
+    assert (summary["errors"], summary["accuracy"], summary["prompt_tokens"]) == (0, 1.0, 0)
+    assert "Ignoring unknown settings in clip: max_sise" in capsys.readouterr().out
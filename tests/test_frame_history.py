@@ -0,0 +1,100 @@
+import numpy as np
+from PIL import Image
+
+from frame_history import FrameHistory
+
+
+def write_png(path, value, size=(8, 6)):
+    pixels = np.full((size[1], size[0], 3), value, dtype=np.uint8)
+    pixels[0, 0] = (value * 7) % 256
+    Image.fromarray(pixels).save(path)
+    return pixels
+
+
+def replay(history, events):
+    # Runs the writer loop in the test thread, one event at a time
+    for event in events:
+        history.handle_event(event)
+        history.pending.put(None)
+        history.run()
+
+
+def capture(tmp_path, run, seq, value, timestamp, monitors=(0,)):
+    screens = []
+    for monitor in monitors:
+        path = tmp_path / f"capture_{run}_{seq}_{monitor}.png"
+        write_png(path, value + monitor)
+        screens.append({"monitor": monitor, "image_path": str(path)})
+    return {"type": "capture", "run": run, "seq": seq, "timestamp": timestamp,
+            "image_path": screens[0]["image_path"], "screens": screens}
+
+
+def result(run, seq, timestamp, distracted=False):
+    return {"type": "result", "run": run, "seq": seq, "timestamp": timestamp,
+            "distracted": distracted, "answer": f"answer {run}/{seq}"}
+
+
+def pixel_value(image):
+    return np.asarray(image)[1, 1, 0]
+
+
+def test_restart_starts_new_segments_so_sequences_do_not_collide(tmp_path):
+    history = FrameHistory(str(tmp_path / "history"))
+    replay(history, [
+        capture(tmp_path, 1, 1, 10, 1000.0), result(1, 1, 1000.5),
+        capture(tmp_path, 1, 2, 20, 1001.0), result(1, 2, 1001.5),
+        # Engine stopped and started: sequences start over within the same process
+        capture(tmp_path, 2, 1, 30, 1002.0), result(2, 1, 1002.5),
+        capture(tmp_path, 2, 2, 40, 1003.0), result(2, 2, 1003.5),
+    ])
+    assert len(history.segments) == 2
+    assert [pixel_value(history.frame_for_result(t)) for t in (1000.5, 1001.5, 1002.5, 1003.5)] == [10, 20, 30, 40]
+
+    reloaded = FrameHistory(str(tmp_path / "history"))
+    assert [frame["answer"] for frame in reloaded.list_results()] == ["answer 1/1", "answer 1/2", "answer 2/1", "answer 2/2"]
+    assert pixel_value(reloaded.frame_for_result(1003.5)) == 40
+
+
+def test_late_result_from_previous_run_is_not_attached_to_new_frame(tmp_path):
+    history = FrameHistory(str(tmp_path / "history"))
+    replay(history, [
+        capture(tmp_path, 1, 1, 10, 1000.0),
+        capture(tmp_path, 2, 1, 30, 1002.0),
+        result(1, 1, 1002.1),
+        result(2, 1, 1002.5),
+    ])
+    assert history.frame_for_result(1002.1) is None
+    assert pixel_value(history.frame_for_result(1002.5)) == 30
+
+
+def test_cycle_in_previous_links_does_not_hang(tmp_path):
+    history = FrameHistory(str(tmp_path / "history"))
+    replay(history, [capture(tmp_path, 1, seq, 10 * seq, 1000.0 + seq) for seq in (1, 2, 3)])
+    segment = history.segments[0]
+    # A corrupt index where two deltas point at each other
+    history.frames[(segment, 2)]["previous"] = 3
+    history.frames[(segment, 3)]["previous"] = 2
+    assert history.frame_for_key((segment, 3)) is None
+    assert pixel_value(history.frame_for_key((segment, 1))) == 10
+
+
+def test_every_monitor_is_stored_and_returned_side_by_side(tmp_path):
+    history = FrameHistory(str(tmp_path / "history"))
+    replay(history, [
+        capture(tmp_path, 1, 1, 10, 1000.0, monitors=(1, 2)), result(1, 1, 1000.5),
+        capture(tmp_path, 1, 2, 20, 1001.0, monitors=(1, 2)), result(1, 2, 1001.5),
+    ])
+    assert len(history.segments) == 2
+    image = np.asarray(history.frame_for_result(1001.5))
+    assert image.shape == (6, 16, 3)
+    assert (image[1, 1, 0], image[1, 9, 0]) == (21, 22)
+
+
+def test_pruning_drops_oldest_segments_and_their_results(tmp_path):
+    history = FrameHistory(str(tmp_path / "history"), keyframe_interval=2)
+    replay(history, [event for seq in range(1, 7)
+                     for event in (capture(tmp_path, 1, seq, seq, 1000.0 + seq), result(1, seq, 1000.5 + seq))][:7])
+    history.max_bytes = history.segment_sizes[history.segments[-1]] + 1
+    history.prune()
+    assert len(history.segments) == 1
+    assert history.frame_for_result(1001.5) is None
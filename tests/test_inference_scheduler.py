@@ -0,0 +1,204 @@
+import time
+import importlib
+
+import pytest
+
+from inference_scheduler import InferenceScheduler, ResultOrderer
+
+
+def test_higher_priority_first_then_earliest_deadline():
+    scheduler = InferenceScheduler(queue_limit=5)
+    far = time.monotonic() + 60
+    scheduler.submit(1, [], far + 2)
+    scheduler.submit(2, [], far + 1)
+    scheduler.submit(3, [], far + 3, priority=1)
+    assert [scheduler.take(0)[0] for _ in range(3)] == [3, 2, 1]
+    assert scheduler.take(0) is None
+
+
+def test_overflow_sheds_least_useful_frame():
+    shed = []
+    scheduler = InferenceScheduler(queue_limit=2, on_shed=shed.append)
+    far = time.monotonic() + 60
+    assert scheduler.submit(1, [], far + 1, priority=1)
+    assert scheduler.submit(2, [], far + 2)
+    # Lowest priority and closest to going stale: the newcomer itself goes
+    assert not scheduler.submit(3, [], far + 1.5)
+    assert shed == [3]
+    assert scheduler.submit(4, [], far, priority=1)
+    assert shed == [3, 2]
+
+
+def test_expired_frames_are_shed_not_returned():
+    shed = []
+    scheduler = InferenceScheduler(queue_limit=3, on_shed=shed.append)
+    scheduler.submit(1, [], time.monotonic() - 1)
+    scheduler.submit(2, [], time.monotonic() + 60)
+    assert scheduler.take(0)[0] == 2
+    assert shed == [1]
+
+
+def test_drain_sheds_everything_queued():
+    shed = []
+    scheduler = InferenceScheduler(queue_limit=3, on_shed=shed.append)
+    for sequence in (1, 2):
+        scheduler.submit(sequence, [], time.monotonic() + 60)
+    scheduler.drain()
+    assert sorted(shed) == [1, 2]
+    assert scheduler.take(0) is None
+
+
+def test_orderer_holds_later_results_until_earlier_ones_finish():
+    delivered = []
+    orderer = ResultOrderer(lambda sequence, answer: delivered.append((sequence, answer)))
+    for sequence in (1, 2, 3):
+        orderer.expect(sequence)
+    orderer.complete(3, "c")
+    orderer.complete(2, "b")
+    assert delivered == []
+    orderer.complete(1, "a")
+    assert delivered == [(1, "a"), (2, "b"), (3, "c")]
+
+
+def test_orderer_cancel_releases_held_results():
+    delivered = []
+    orderer = ResultOrderer(lambda sequence, answer: delivered.append(sequence))
+    orderer.expect(1)
+    orderer.expect(2)
+    orderer.complete(2, "b")
+    orderer.cancel(1)
+    assert delivered == [2]
+
+
+def test_orderer_passes_unexpected_results_through():
+    delivered = []
+    orderer = ResultOrderer(lambda sequence, answer: delivered.append(sequence))
+    orderer.expect(5)
+    orderer.complete(3, "from window title")
+    assert delivered == [3]
+
+
+def test_orderer_keeps_going_when_delivery_fails():
+    delivered = []
+
+    def deliver(sequence, answer):
+        if sequence == 1:
+            raise RuntimeError("listener broke")
+        delivered.append(sequence)
+
+    orderer = ResultOrderer(deliver)
+    orderer.complete(1, "a")
+    orderer.complete(2, "b")
+    assert delivered == [2]
+
+
+class FailingAnalyzer:
+    def __init__(self):
+        self.calls = 0
+
+    def analyze(self, screens):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("backend exploded")
+        return True, "Watching videos"
+
+    def close(self):
+        pass
+
+
+def test_worker_answers_frames_whose_analysis_raised():
+    pytest.importorskip("mss")
+    engine = importlib.import_module("engine")
+    delivered = []
+    orderer = ResultOrderer(lambda sequence, distracted, answer: delivered.append((sequence, distracted, answer)))
+    worker = engine.AnalysisWorker(FailingAnalyzer(), orderer.complete, InferenceScheduler(queue_limit=3))
+    worker.start()
+    try:
+        for sequence in (1, 2):
+            orderer.expect(sequence)
+            worker.submit(sequence, [], time.monotonic() + 60)
+        end = time.monotonic() + 5
+        while len(delivered) < 2 and time.monotonic() < end:
+            time.sleep(0.01)
+    finally:
+        worker.stop()
+    assert delivered[0][:2] == (1, False) and delivered[0][2].startswith("Error")
+    assert delivered[1] == (2, True, "Watching videos")
+    assert not orderer.outstanding
+
+
+def test_worker_sheds_frames_the_backend_skipped():
+    pytest.importorskip("mss")
+    engine = importlib.import_module("engine")
+
+    class DecliningAnalyzer(FailingAnalyzer):
+        def analyze(self, screens):
+            self.calls += 1
+            if self.calls == 1:
+                raise engine.SkippedFrame("superseded by a newer frame")
+            return False, "Coding"
+
+    delivered = []
+    orderer = ResultOrderer(lambda sequence, distracted, answer: delivered.append(sequence))
+    worker = engine.AnalysisWorker(DecliningAnalyzer(), orderer.complete, InferenceScheduler(3, orderer.cancel))
+    worker.start()
+    try:
+        for sequence in (1, 2):
+            orderer.expect(sequence)
+            worker.submit(sequence, [], time.monotonic() + 60)
+        end = time.monotonic() + 5
+        while not delivered and time.monotonic() < end:
+            time.sleep(0.01)
+    finally:
+        worker.stop()
+    assert delivered == [2]
+    assert not orderer.outstanding
+
+
+class CountingAnalyzer:
+    def __init__(self):
+        self.closed = 0
+
+    def analyze(self, screens):
+        return False, "Coding"
+
+    def close(self):
+        self.closed += 1
+
+
+def test_shared_analyzer_is_closed_once_after_every_worker_let_go(tmp_path, monkeypatch):
+    pytest.importorskip("mss")
+    engine = importlib.import_module("engine")
+    monkeypatch.chdir(tmp_path)
+    monitor = engine.MonitorEngine(dict(engine.DEFAULT_CONFIG, rss_sample_interval=0))
+    old, new = CountingAnalyzer(), CountingAnalyzer()
+    monitor.share_analyzer(old, 2)
+    scheduler = InferenceScheduler(queue_limit=4)
+    workers = [engine.AnalysisWorker(old, lambda *result: None, scheduler, monitor.release_analyzer) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    monitor.share_analyzer(new, 2)
+    workers[0].replace_analyzer(new)
+    workers[0].submit(1, [], time.monotonic() + 60)
+    end = time.monotonic() + 5
+    while workers[0].analyzer is not new and time.monotonic() < end:
+        time.sleep(0.01)
+    assert old.closed == 0  # the other worker still uses it
+    workers[1].replace_analyzer(new)
+    for worker in workers:
+        worker.stop()
+    assert (old.closed, new.closed) == (1, 1)
+
+
+def test_shutdown_stops_the_history_writer_and_rss_sampler(tmp_path, monkeypatch):
+    pytest.importorskip("mss")
+    engine = importlib.import_module("engine")
+    monkeypatch.chdir(tmp_path)
+    monitor = engine.MonitorEngine(dict(engine.DEFAULT_CONFIG, rss_sample_interval=60, history_dir=str(tmp_path / "history")))
+    writer, sampler = monitor.frame_history.writer, monitor.rss_sampler
+    monitor.shutdown()
+    writer.join(5)
+    assert not writer.is_alive()
+    assert sampler.stop_event.is_set()
+    assert monitor.frame_history is None
+    monitor.shutdown()
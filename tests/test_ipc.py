@@ -0,0 +1,86 @@
+import os
+import socket
+import stat
+
+import pytest
+
+import ipc
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+
+
+@pytest.fixture
+def address(tmp_path):
+    return str(tmp_path / "monitor.sock")
+
+
+def serve(address, handle_command):
+    server = ipc.IPCServer(address, handle_command)
+    server.start()
+    return server
+
+
+def test_command_reply_and_broadcast_round_trip(address):
+    commands = []
+
+    def handle_command(message):
+        commands.append(message)
+        return {"type": message["cmd"], "running": message["cmd"] == "start"}
+
+    server = serve(address, handle_command)
+    client = ipc.IPCClient(address)
+    try:
+        messages = client.messages()
+        client.send({"cmd": "status"})
+        assert next(messages) == {"type": "status", "running": False}
+        client.send({"cmd": "start", "config": {"capture_interval": 10}})
+        assert next(messages) == {"type": "start", "running": True}
+        server.broadcast({"type": "result", "seq": 1, "distracted": True})
+        assert next(messages) == {"type": "result", "seq": 1, "distracted": True}
+        assert commands == [{"cmd": "status"}, {"cmd": "start", "config": {"capture_interval": 10}}]
+    finally:
+        client.close()
+        server.stop()
+    assert not os.path.exists(address)
+
+
+def test_failing_command_is_reported_to_the_client(address):
+    def handle_command(message):
+        raise ValueError("bad command")
+
+    server = serve(address, handle_command)
+    client = ipc.IPCClient(address)
+    try:
+        client.send({"cmd": "stats"})
+        assert next(client.messages()) == {"type": "error", "message": "bad command"}
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_second_server_refuses_to_take_over_a_live_socket(address):
+    server = serve(address, lambda message: None)
+    try:
+        with pytest.raises(OSError, match="already listening"):
+            ipc.IPCServer(address, lambda message: None)
+        client = ipc.IPCClient(address)  # the first daemon still has its socket
+        client.close()
+    finally:
+        server.stop()
+
+
+def test_stale_socket_is_replaced_and_owner_only(address):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(address)
+    stale.close()  # left behind by a daemon that was killed
+    server = serve(address, lambda message: None)
+    try:
+        assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+    finally:
+        server.stop()
+
+
+def test_parse_address():
+    assert ipc.parse_address("localhost:47311") == ("localhost", 47311)
+    assert ipc.parse_address(":9000") == ("127.0.0.1", 9000)
+    assert ipc.parse_address("/tmp/monitor.sock") == "/tmp/monitor.sock"
@@ -0,0 +1,35 @@
+import importlib
+
+import pytest
+
+pytest.importorskip("mss")
+local_backend = importlib.import_module("local_backend")
+
+
+class Frame:
+    # Stands in for a PIL image; comparing two would mean comparing every pixel
+    def __eq__(self, other):
+        raise AssertionError("images compared")
+
+    __hash__ = object.__hash__
+
+
+def test_take_batch_groups_by_prompt_and_keeps_the_rest_in_order():
+    worker = local_backend.BatchWorker(pipe=None, task="zero-shot-image-classification", batch_size=2, batch_wait=0)
+    futures = [worker.submit(Frame(), prompt, ["coding"]) for prompt in ("a", "b", "a", "a")]
+    batch = worker.take_batch()
+    assert [item[3] for item in batch] == [futures[0], futures[2]]
+    assert [item[3] for item in worker.pending] == [futures[1], futures[3]]
+    assert [item[3] for item in worker.take_batch()] == [futures[1]]
+    assert [item[3] for item in worker.take_batch()] == [futures[3]]
+
+
+def test_get_worker_applies_new_batching_to_the_loaded_model(monkeypatch):
+    monkeypatch.setattr(local_backend, "_workers", {})
+    loads = []
+    monkeypatch.setattr(local_backend, "load_pipeline", lambda *args: loads.append(args))
+    monkeypatch.setattr(local_backend.BatchWorker, "start", lambda self: None)
+    first = local_backend.get_worker("clip", "zero-shot-image-classification", True, None, 4, 0.05)
+    second = local_backend.get_worker("clip", "zero-shot-image-classification", True, None, 8, 0.2)
+    assert second is first and len(loads) == 1
+    assert (second.batch_size, second.batch_wait) == (8, 0.2)
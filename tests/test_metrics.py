@@ -0,0 +1,47 @@
+from metrics import MetricsRegistry
+
+
+def make_registry():
+    registry = MetricsRegistry("test_")
+    registry.counter("checks", "Checks").inc(3)
+    registry.counter("rule_firings", "Rules fired", ("rule",)).inc(rule='say "hi"')
+    registry.gauge("queue_depth", "Queued frames").set(2)
+    registry.histogram("latency_seconds", "Latency", buckets=(0.5, 1.0)).observe(0.75)
+    return registry
+
+
+def families(text):
+    # type line name -> sample lines that follow it
+    result = {}
+    name = None
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            name = line.split()[2]
+            result[name] = []
+        elif not line.startswith("#"):
+            result[name].append(line)
+    return result
+
+
+def test_prometheus_text_names_counters_after_their_samples():
+    text = make_registry().render()
+    parsed = families(text)
+    assert "# TYPE test_checks_total counter" in text
+    assert "# HELP test_checks_total Checks" in text
+    assert parsed["test_checks_total"] == ["test_checks_total 3"]
+    assert parsed["test_rule_firings_total"] == ['test_rule_firings_total{rule="say \\"hi\\""} 1']
+    assert parsed["test_queue_depth"] == ["test_queue_depth 2"]
+    assert parsed["test_latency_seconds"] == ['test_latency_seconds_bucket{le="0.5"} 0', 'test_latency_seconds_bucket{le="1"} 1',
+                                              'test_latency_seconds_bucket{le="+Inf"} 1', "test_latency_seconds_count 1",
+                                              "test_latency_seconds_sum 0.75"]
+    assert not text.endswith("# EOF\n")
+
+
+def test_openmetrics_names_counter_families_without_total():
+    text = make_registry().render(openmetrics=True)
+    parsed = families(text)
+    assert "# TYPE test_checks counter" in text
+    assert parsed["test_checks"] == ["test_checks_total 3"]
+    for family, samples in parsed.items():
+        assert all(sample.startswith(family) for sample in samples)
+    assert text.endswith("# EOF\n")
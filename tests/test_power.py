@@ -0,0 +1,44 @@
+import json
+
+from power import PowerPolicy, validate_profiles
+
+PROFILES = {
+    "battery": {"interval_multiplier": 2, "max_image_size": 960},
+    "hot": {"interval_multiplier": 4, "max_image_size": 640, "metadata_only": True},
+}
+
+
+def test_validate_profiles_checks_names_fields_and_types():
+    assert validate_profiles(PROFILES) == []
+    assert validate_profiles([]) == ["must be an object"]
+    assert validate_profiles({
+        "batery": {},
+        "battery": {"interval_multiplier": 0.5, "max_image_size": "small", "metadata_only": "yes", "fps": 1},
+        "hot": 4,
+    }) == [
+        "batery: not a profile; use battery, low_battery, hot",
+        "battery: unknown setting fps; use interval_multiplier, max_image_size, metadata_only",
+        "battery: interval_multiplier must be a number >= 1",
+        "battery: max_image_size must be a whole number >= 64",
+        "battery: metadata_only must be true or false",
+        "hot: must be an object",
+    ]
+
+
+def test_profiles_only_make_monitoring_cheaper():
+    policy = PowerPolicy(dict(PROFILES, battery={"interval_multiplier": 0.25, "max_image_size": 2048}))
+    policy.profile = "battery"
+    assert policy.adjust("capture_interval", 10) == 10
+    assert policy.adjust("max_image_size", 1024) == 1024
+    assert policy.adjust("max_image_size", None) == 2048
+    assert not policy.metadata_only()
+
+
+def test_hot_profile_has_hysteresis(tmp_path):
+    probe = tmp_path / "power.json"
+    policy = PowerPolicy(PROFILES, hot_temperature=85, poll_interval=0, probe_path=str(probe))
+    readings = [(True, 90, "hot"), (True, 82, None), (True, 79, "battery"), (False, 50, "normal")]
+    for on_battery, temperature, expected in readings:
+        probe.write_text(json.dumps({"on_battery": on_battery, "battery_percent": 50, "temperature": temperature}))
+        assert policy.check() == expected
+    assert policy.adjust("capture_interval", 10) == 10
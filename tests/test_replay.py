@@ -0,0 +1,104 @@
+import json
+import zipfile
+import importlib
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("mss")
+replay = importlib.import_module("replay")
+
+
+def test_recorder_keeps_frames_from_every_run(tmp_path):
+    image = tmp_path / "capture_latest.png"
+    Image.new("RGB", (4, 4), "white").save(image)
+    session = tmp_path / "session.zip"
+    recorder = replay.SessionRecorder(str(session), {"model": "llava"})
+    for run, distracted in ((1, False), (2, True)):
+        # Stop/Start in the daemon: sequence numbers start over
+        recorder.handle_event({"type": "capture", "run": run, "seq": 1, "timestamp": 1000.0 + run, "image_path": str(image)})
+        recorder.handle_event({"type": "result", "run": run, "seq": 1, "timestamp": 1000.5 + run,
+                               "distracted": distracted, "answer": "gaming" if distracted else "coding"})
+    recorder.close()
+
+    archive, index = replay.load_session(str(session))
+    assert [frame["answer"] for frame in index["frames"]] == ["coding", "gaming"]
+    assert len(archive.namelist()) == 3
+    archive.close()
+
+
+def test_session_without_index_replays_from_frame_names(tmp_path):
+    image = tmp_path / "frame.png"
+    Image.new("RGB", (4, 4), "white").save(image)
+    session = tmp_path / "session.zip"
+    with zipfile.ZipFile(session, "w") as archive:
+        archive.write(image, "000001_1000.250.png")  # written before runs were recorded
+        archive.write(image, "002-000001_1001.500.png")
+    archive, index = replay.load_session(str(session))
+    archive.close()
+    assert [frame["timestamp"] for frame in index["frames"]] == [1000.25, 1001.5]
+
+
+def test_replay_counts_skipped_frames_apart(tmp_path):
+    image = tmp_path / "frame.png"
+    Image.new("RGB", (4, 4), "white").save(image)
+    session = tmp_path / "session.zip"
+    with zipfile.ZipFile(session, "w") as archive:
+        for seq in (1, 2):
+            archive.write(image, f"001-{seq:06d}_{1000 + seq:.3f}.png")
+        archive.writestr(replay.INDEX_NAME, json.dumps({"version": 1, "config": {}, "frames": [
+            {"name": "001-000001_1001.000.png", "timestamp": 1001.0, "distracted": False},
+            {"name": "001-000002_1002.000.png", "timestamp": 1002.0, "distracted": False}]}))
+
+    class Analyzer:
+        calls = 0
+
+        def analyze(self, path):
+            Analyzer.calls += 1
+            if Analyzer.calls == 1:
+                raise replay.SkippedFrame("rate limited by the analysis server")
+            return False, "coding"
+
+    report = replay.run_replay(str(session), Analyzer())
+    assert (report["frames"], report["skipped"], report["compared"], report["agreement"]) == (2, 1, 1, 1.0)
+
+
+def test_per_monitor_captures_record_and_replay_every_screen(tmp_path):
+    screens = []
+    for monitor, colour in ((1, "white"), (2, "black")):
+        path = tmp_path / f"capture_monitor{monitor}.png"
+        Image.new("RGB", (4, 4), colour).save(path)
+        screens.append({"monitor": monitor, "image_path": str(path), "focused": monitor == 2})
+    session = tmp_path / "session.zip"
+    recorder = replay.SessionRecorder(str(session), {"model": "llava", "fusion_policy": "focused", "focused_monitor": 1})
+    recorder.handle_event({"type": "capture", "run": 1, "seq": 1, "timestamp": 1000.0,
+                           "image_path": screens[0]["image_path"], "screens": screens})
+    recorder.handle_event({"type": "result", "run": 1, "seq": 1, "timestamp": 1000.5, "distracted": True,
+                           "answer": "screen 1: coding; screen 2: gaming"})
+    recorder.close()
+
+    class Analyzer:
+        def analyze(self, path):
+            distracted = Image.open(path).getpixel((0, 0)) == (0, 0, 0)
+            return distracted, "gaming" if distracted else "coding"
+
+    report = replay.run_replay(str(session), Analyzer())
+    # The window was on monitor 2 while recording, whatever focused_monitor says
+    assert (report["frames"], report["distracted"], report["agreement"]) == (1, 1, 1.0)
+
+    archive, index = replay.load_session(str(session))
+    assert sorted(archive.namelist()) == ["001-000001-1_1000.000.png", "001-000001-2_1000.000.png", replay.INDEX_NAME]
+    archive.close()
+
+
+def test_per_monitor_session_without_index_groups_screens(tmp_path):
+    image = tmp_path / "frame.png"
+    Image.new("RGB", (4, 4), "white").save(image)
+    session = tmp_path / "session.zip"
+    with zipfile.ZipFile(session, "w") as archive:
+        for seq in (1, 2):
+            for monitor in (1, 2):
+                archive.write(image, f"001-{seq:06d}-{monitor}_{1000 + seq:.3f}.png")
+    archive, index = replay.load_session(str(session))
+    archive.close()
+    assert [[screen["monitor"] for screen in frame["screens"]] for frame in index["frames"]] == [[1, 2], [1, 2]]
@@ -0,0 +1,39 @@
+import os
+import json
+import base64
+
+import pytest
+
+from request_body import base64_into, base64_length, generate_request_body
+
+
+def test_body_length_matches_the_streamed_file(tmp_path):
+    image_path = tmp_path / "capture.png"
+    data = os.urandom(100 * 1024 + 1)
+    image_path.write_bytes(data)
+    body = generate_request_body("llava", "What is this?", str(image_path))
+    # Replaced after the length was taken, as the next capture does
+    replacement = tmp_path / "next.png"
+    replacement.write_bytes(b"x" * 10)
+    os.replace(replacement, image_path)
+    sent = b"".join(body)
+    assert len(sent) == len(body)
+    assert base64.b64decode(json.loads(sent)["images"][0]) == data
+
+
+def test_buffer_body_matches_file_body(tmp_path):
+    image_path = tmp_path / "capture.png"
+    data = os.urandom(5000)
+    image_path.write_bytes(data)
+    from_file = generate_request_body("llava", "prompt", str(image_path)).read()
+    from_buffer = generate_request_body("llava", "prompt", base64_image=base64.b64encode(data).decode("ascii")).read()
+    assert from_file == from_buffer
+
+
+def test_base64_into_matches_b64encode():
+    data = os.urandom(3 * 1000 + 2)
+    target = bytearray(base64_length(len(data)) + 10)
+    length = base64_into(target, data, chunk_size=3 * 7)
+    assert bytes(target[:length]) == base64.b64encode(data)
+    with pytest.raises(ValueError):
+        base64_into(bytearray(10), data)
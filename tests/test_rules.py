@@ -0,0 +1,144 @@
+import datetime
+
+from rules import RuleEngine, TimerWheel, in_hours, validate_rules
+
+ALERT = {"name": "distraction_alert", "when": "distracted", "action": "alert"}
+PRAISE = {"name": "praise", "when": "focused", "for": 600, "cooldown": 600, "action": "praise"}
+
+
+def make_engine(rules, chance=0.0):
+    fired = []
+    engine = RuleEngine(rules, lambda rule: fired.append(rule["name"]), chance=lambda: chance)
+    return engine, fired
+
+
+def test_wheel_returns_due_keys_in_deadline_order():
+    wheel = TimerWheel(slots=8)
+    wheel.advance(100)
+    wheel.schedule("late", 103)
+    wheel.schedule("early", 102)
+    wheel.schedule("later", 120)  # beyond one turn of the wheel
+    assert wheel.advance(101) == []
+    assert wheel.advance(105) == ["early", "late"]
+    assert wheel.advance(119) == []
+    assert wheel.advance(120) == ["later"]
+
+
+def test_wheel_cancel_and_reschedule():
+    wheel = TimerWheel(slots=8)
+    wheel.advance(0)
+    wheel.schedule("a", 3)
+    wheel.schedule("a", 5)
+    wheel.schedule("b", 4)
+    wheel.cancel("b")
+    assert wheel.advance(4) == []
+    assert wheel.advance(5) == ["a"]
+
+
+def test_wheel_catches_up_after_a_long_gap():
+    wheel = TimerWheel(slots=8)
+    wheel.advance(0)
+    wheel.schedule("a", 2)
+    wheel.schedule("b", 30)
+    assert wheel.advance(1000) == ["a", "b"]
+
+
+def test_alert_fires_once_per_distracted_stint():
+    engine, fired = make_engine([ALERT])
+    engine.observe(False, 0)
+    engine.observe(True, 10)
+    assert fired == ["distraction_alert"]
+    engine.observe(True, 11)
+    engine.advance(60)
+    assert fired == ["distraction_alert"]
+    engine.observe(False, 70)
+    engine.observe(True, 80)
+    assert fired == ["distraction_alert"] * 2
+
+
+def test_rule_waits_for_its_duration_and_cooldown():
+    engine, fired = make_engine([PRAISE])
+    engine.observe(False, 0)
+    engine.advance(599)
+    assert fired == []
+    engine.advance(600)
+    assert fired == ["praise"]
+    engine.advance(1199)
+    assert fired == ["praise"]
+    engine.advance(1200)
+    assert fired == ["praise"] * 2
+
+
+def test_chance_miss_retries_later():
+    rule = dict(PRAISE, chance=0.5, retry=30)
+    engine, fired = make_engine([rule], chance=0.9)
+    engine.observe(False, 0)
+    engine.advance(600)
+    assert fired == []
+    engine.chance = lambda: 0.1
+    engine.advance(629)
+    assert fired == []
+    engine.advance(630)
+    assert fired == ["praise"]
+
+
+def test_hours_window_defers_to_next_start():
+    start = datetime.datetime(2026, 10, 19, 12, 0).timestamp()
+    rule = dict(PRAISE, hours=[20, 24])
+    engine, fired = make_engine([rule])
+    engine.observe(False, start)
+    engine.advance(start + 600)
+    assert fired == []
+    evening = datetime.datetime(2026, 10, 19, 20, 0).timestamp()
+    assert in_hours(evening, rule["hours"])
+    engine.advance(evening)
+    assert fired == ["praise"]
+
+
+def test_editing_rules_does_not_refire_or_restart_unchanged_rules():
+    notify = {"name": "notify", "when": "distracted", "for": 300, "action": "notify", "message": "Still there?"}
+    engine, fired = make_engine([ALERT, notify])
+    engine.observe(True, 0)
+    assert fired == ["distraction_alert"]
+    engine.set_rules([ALERT, notify, PRAISE])
+    engine.advance(1)
+    assert fired == ["distraction_alert"]
+    engine.advance(300)
+    assert fired == ["distraction_alert", "notify"]
+
+
+def test_changed_rule_is_rescheduled_from_its_new_definition():
+    notify = {"name": "notify", "when": "distracted", "for": 300, "action": "notify"}
+    engine, fired = make_engine([notify])
+    engine.observe(True, 0)
+    engine.advance(100)
+    engine.set_rules([dict(notify, **{"for": 120})])
+    engine.advance(119)
+    assert fired == []
+    engine.advance(120)
+    assert fired == ["notify"]
+
+
+def test_reset_forgets_the_state_until_results_resume():
+    engine, fired = make_engine([PRAISE])
+    engine.observe(False, 0)
+    engine.advance(300)
+    engine.reset()  # the user went away
+    engine.advance(700)
+    assert fired == []
+    engine.observe(False, 1000)
+    engine.advance(1599)
+    assert fired == []
+    engine.advance(1600)
+    assert fired == ["praise"]
+
+
+def test_validate_rules_reports_each_problem():
+    problems = validate_rules([ALERT, {"name": "distraction_alert", "when": "bored", "action": "sound", "chance": 2}])
+    assert problems == [
+        "rule 2: needs a unique name",
+        "rule 2: when must be one of focused, distracted",
+        "rule 2: a sound action needs a sound file",
+        "rule 2: chance must be between 0 and 1",
+    ]
+    assert validate_rules([ALERT, PRAISE]) == []
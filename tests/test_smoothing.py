@@ -0,0 +1,38 @@
+import pytest
+
+from smoothing import make_verdict_filter
+
+SEQUENCE = [True, False, True, True, True, False, False, False, False]
+
+
+def flips(method, verdicts, **config):
+    verdict_filter = make_verdict_filter(dict(config, smoothing_method=method))
+    return [index for index, verdict in enumerate(verdicts) if verdict_filter.update(verdict)]
+
+
+@pytest.mark.parametrize("method, expected", [("ema", [3, 6]), ("window", [4, 8]), ("hmm", [3, 6]), ("none", [0, 1, 2, 5])])
+def test_state_flips_where_expected(method, expected):
+    assert flips(method, SEQUENCE) == expected
+
+
+@pytest.mark.parametrize("method", ["ema", "window", "hmm"])
+def test_one_odd_frame_never_flips_the_state(method):
+    assert flips(method, [True, False, False, True, False, False]) == []
+    assert flips(method, [True] * 6 + [False] + [True] * 3) == flips(method, [True] * 10)
+
+
+def test_failed_checks_carry_no_evidence():
+    verdict_filter = make_verdict_filter({"smoothing_method": "window"})
+    for _ in range(10):
+        assert not verdict_filter.update(True, confidence=0.0)
+    assert verdict_filter.probability == 0.0
+
+
+def test_mixed_evidence_rechecks_sooner_and_stable_state_later():
+    verdict_filter = make_verdict_filter({"smoothing_method": "ema", "recheck_delay": 5, "stable_checks": 3})
+    verdict_filter.update(True)
+    assert verdict_filter.is_uncertain()
+    assert verdict_filter.next_delay(30) == 5
+    for _ in range(6):
+        verdict_filter.update(True)
+    assert verdict_filter.next_delay(30) == 60
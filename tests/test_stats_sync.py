@@ -0,0 +1,91 @@
+import os
+
+import stats_sync
+from stats_sync import SyncFolder, StatsReplica, decode_delta, encode_delta
+
+HOUR = "2026-10-19 14:00"
+
+
+def replica(tmp_path, device):
+    return StatsReplica(str(tmp_path / f"{device}.counters.json"), device)
+
+
+def test_delta_round_trip():
+    entries = {HOUR: [3, 1, 15.0], "2026-10-19 15:00": [2, 0, 10.0]}
+    assert decode_delta(encode_delta("laptop", 4, 5, entries)) == ("laptop", 4, 5, entries)
+
+
+def test_merge_is_idempotent_and_order_independent(tmp_path):
+    a = replica(tmp_path, "a")
+    b = replica(tmp_path, "b")
+    for _ in range(3):
+        a.increment(HOUR, True, 5)
+    b.increment(HOUR, False, 5)
+    assert a.merge("b", {HOUR: b.counters[HOUR]["b"]}) == {HOUR: [1, 0, 5]}
+    assert a.merge("b", {HOUR: b.counters[HOUR]["b"]}) == {}
+    # An older copy of b's counters changes nothing either
+    assert a.merge("b", {HOUR: [0, 0, 0]}) == {}
+    b.merge("a", {HOUR: a.counters[HOUR]["a"]})
+    assert a.merged_stats() == b.merged_stats()
+    assert a.merged_stats()[HOUR] == {"distractions": 3, "checks": 4, "total_time": 20}
+    assert a.merged_stats()["2026-10-19"]["checks"] == 4
+
+
+def test_replica_state_survives_restart(tmp_path):
+    a = replica(tmp_path, "a")
+    a.increment(HOUR, True, 5)
+    SyncFolder(str(tmp_path / "sync"), a).sync()
+    again = replica(tmp_path, "a")
+    assert (again.counters, again.seq, again.dirty) == (a.counters, 1, set())
+
+
+def test_devices_converge_through_the_folder(tmp_path):
+    folder = tmp_path / "sync"
+    devices = {name: replica(tmp_path, name) for name in ("a", "b", "c")}
+    for round_number in range(3):
+        for name, device in devices.items():
+            device.increment(HOUR, name == "a", 5)
+            SyncFolder(str(folder), device).sync()
+    for device in devices.values():
+        SyncFolder(str(folder), device).sync()
+    totals = [device.merged_stats()[HOUR] for device in devices.values()]
+    assert totals == [{"distractions": 3, "checks": 9, "total_time": 45}] * 3
+
+
+def test_compaction_replaces_deltas_and_late_devices_catch_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(stats_sync, "COMPACT_AFTER", 4)
+    folder = str(tmp_path / "sync")
+    a = replica(tmp_path, "a")
+    early = replica(tmp_path, "early")
+    for i in range(6):
+        a.increment(f"2026-10-19 {10 + i:02d}:00", False, 5)
+        SyncFolder(folder, a).sync()
+        if i == 1:
+            SyncFolder(folder, early).sync()  # has applied deltas 1 and 2
+    names = sorted(os.listdir(os.path.join(folder, "a")))
+    assert names == ["000000000004.snapshot", "000000000005.delta", "000000000006.delta"]
+
+    late = replica(tmp_path, "late")
+    SyncFolder(folder, late).sync()
+    SyncFolder(folder, early).sync()
+    expected = a.merged_stats()
+    assert late.merged_stats() == expected
+    assert early.merged_stats() == expected
+    assert late.seen == early.seen == {"a": 6}
+
+
+def test_gap_waits_for_the_missing_delta(tmp_path):
+    folder = tmp_path / "sync"
+    a = replica(tmp_path, "a")
+    a.increment(HOUR, True, 5)
+    first = SyncFolder(str(folder), a).export()
+    a.increment(HOUR, True, 5)
+    SyncFolder(str(folder), a).export()
+    held = open(first, "rb").read()
+    os.remove(first)  # not synced to this machine yet
+
+    b = replica(tmp_path, "b")
+    assert SyncFolder(str(folder), b).import_all() == {}
+    with open(first, "wb") as f:
+        f.write(held)
+    assert SyncFolder(str(folder), b).import_all() == {HOUR: [2, 2, 10]}
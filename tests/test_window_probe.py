@@ -0,0 +1,48 @@
+import json
+
+from window_probe import MetadataClassifier, monitor_for_window, probe_active_window
+
+RULES = {"twitch": "watching livestream", "steam": "gaming", "visual studio code": "coding"}
+
+
+def classifier():
+    return MetadataClassifier(["coding", "writing", "gaming", "watching livestream"], ["gaming", "stream"], RULES)
+
+
+def test_rule_keyword_decides():
+    assert classifier().classify({"title": "xQc - Twitch", "process": "firefox"}) == (True, "watching livestream")
+    assert classifier().classify({"title": "engine.py - Visual Studio Code", "process": "code"}) == (False, "coding")
+
+
+def test_keywords_match_whole_words_only():
+    assert classifier().classify({"title": "Steamed buns recipe", "process": "firefox"}) is None
+    assert not classifier().hints_distraction({"title": "git push upstream", "process": "bash"})
+    assert not classifier().hints_distraction({"title": "Streamlit app", "process": "python"})
+
+
+def test_blacklisted_word_alone_only_hints():
+    metadata = {"title": "Live stream schedule", "process": "firefox"}
+    assert classifier().classify(metadata) is None
+    assert classifier().hints_distraction(metadata)
+
+
+def test_conflicting_signals_are_ambiguous():
+    metadata = {"title": "Twitch chat bot - Visual Studio Code", "process": "code"}
+    assert classifier().classify(metadata) is None
+    assert classifier().hints_distraction(metadata)
+
+
+SCREENS = [{"monitor": 1, "geometry": [0, 0, 1920, 1080]}, {"monitor": 2, "geometry": [1920, 0, 2560, 1440]}]
+
+
+def test_window_belongs_to_the_screen_showing_most_of_it():
+    assert monitor_for_window([100, 100, 800, 600], SCREENS) == 1
+    assert monitor_for_window([1800, 100, 800, 600], SCREENS) == 2
+    assert monitor_for_window([-3000, 0, 800, 600], SCREENS) is None
+    assert monitor_for_window(None, SCREENS) is None
+
+
+def test_probe_file_reports_geometry(tmp_path):
+    probe = tmp_path / "window.json"
+    probe.write_text(json.dumps({"title": "Twitch", "process": "firefox", "app": "", "geometry": [2000, 10, 640, 480]}))
+    assert monitor_for_window(probe_active_window(str(probe))["geometry"], SCREENS) == 2
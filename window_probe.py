@@ -0,0 +1,237 @@
+import os
+import re
+import sys
+import json
+import subprocess
+
+# Cheap pre-check that classifies the focused window from its title and
+# process name, so obvious cases (a Twitch tab, a game, an IDE) skip the
+# screenshot and the LLaVA call entirely. Only a metadata_rules keyword
+# decides on its own; activities and blacklisted words seen in the title can
+# make a case ambiguous (and a frame worth analyzing first) but never skip
+# the screenshot. Anything ambiguous falls through to the image path.
+# Probes also report where the window is, so the "focused" fusion policy can
+# go by the screen it is on.
+
+PROBE_TIMEOUT = 1
+
+
+def _run(command):
+    try:
+        return subprocess.run(command, capture_output=True, text=True, timeout=PROBE_TIMEOUT, check=True).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _process_name(pid):
+    try:
+        with open(f"/proc/{pid}/comm", "r") as f:
+            return f.read().strip()
+    except (OSError, ValueError):
+        return ""
+
+
+def probe_x11():
+    # EWMH: _NET_ACTIVE_WINDOW on the root window, then the window's own properties
+    output = _run(["xprop", "-root", "_NET_ACTIVE_WINDOW"])
+    match = re.search(r"window id # (0x[0-9a-fA-F]+)", output or "")
+    if not match or int(match.group(1), 16) == 0:
+        return None
+    output = _run(["xprop", "-id", match.group(1), "_NET_WM_NAME", "WM_NAME", "WM_CLASS", "_NET_WM_PID"]) or ""
+    title = re.search(r'^_NET_WM_NAME\(UTF8_STRING\) = "(.*)"$', output, re.MULTILINE) or \
+        re.search(r'^WM_NAME\([A-Z_]+\) = "(.*)"$', output, re.MULTILINE)
+    wm_class = re.search(r'^WM_CLASS\(STRING\) = (.*)$', output, re.MULTILINE)
+    pid = re.search(r'^_NET_WM_PID\(CARDINAL\) = (\d+)$', output, re.MULTILINE)
+    return {
+        "title": title.group(1) if title else "",
+        "process": _process_name(pid.group(1)) if pid else "",
+        "app": ", ".join(part.strip().strip('"') for part in wm_class.group(1).split(",")) if wm_class else "",
+        "geometry": geometry_x11(match.group(1))
+    }
+
+
+def geometry_x11(window_id):
+    output = _run(["xwininfo", "-id", window_id]) or ""
+    fields = [re.search(rf"^\s*{label}:\s*(-?\d+)$", output, re.MULTILINE)
+              for label in ("Absolute upper-left X", "Absolute upper-left Y", "Width", "Height")]
+    return [int(field.group(1)) for field in fields] if all(fields) else None
+
+
+def probe_macos():
+    script = ('tell application "System Events" to set frontApp to first application process whose frontmost is true\n'
+              'set appName to name of frontApp\n'
+              'try\n'
+              'set windowTitle to name of front window of frontApp\n'
+              'on error\n'
+              'set windowTitle to ""\n'
+              'end try\n'
+              'try\n'
+              'set {x, y} to position of front window of frontApp\n'
+              'set {w, h} to size of front window of frontApp\n'
+              'set windowBounds to (x as text) & " " & (y as text) & " " & (w as text) & " " & (h as text)\n'
+              'on error\n'
+              'set windowBounds to ""\n'
+              'end try\n'
+              'return appName & linefeed & windowTitle & linefeed & windowBounds')
+    output = _run(["osascript", "-e", script])
+    if not output:
+        return None
+    app, _, rest = output.rstrip("\n").partition("\n")
+    title, _, bounds = rest.partition("\n")
+    try:
+        geometry = [int(float(value)) for value in bounds.split()] or None
+    except ValueError:
+        geometry = None
+    return {"title": title, "process": app, "app": app, "geometry": geometry}
+
+
+def probe_windows():
+    import ctypes
+    from ctypes import wintypes
+    user32 = ctypes.windll.user32
+    hwnd = user32.GetForegroundWindow()
+    if not hwnd:
+        return None
+    length = user32.GetWindowTextLengthW(hwnd)
+    buffer = ctypes.create_unicode_buffer(length + 1)
+    user32.GetWindowTextW(hwnd, buffer, length + 1)
+    rect = wintypes.RECT()
+    geometry = None
+    if user32.GetWindowRect(hwnd, ctypes.byref(rect)):
+        geometry = [rect.left, rect.top, rect.right - rect.left, rect.bottom - rect.top]
+    return {"title": buffer.value, "process": "", "app": "", "geometry": geometry}
+
+
+def probe_file(path):
+    # Stand-in for tests and unsupported desktops: a JSON file with title/process/app
+    # and optionally geometry
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def list_windows_x11():
+    output = _run(["xprop", "-root", "_NET_CLIENT_LIST"])
+    match = re.search(r"window id # (.*)$", output or "", re.MULTILINE)
+    if not match:
+        return None
+    return {int(window, 16) for window in re.findall(r"0x[0-9a-fA-F]+", match.group(1))}
+
+
+def list_windows_windows():
+    import ctypes
+    user32 = ctypes.windll.user32
+    windows = set()
+    callback = ctypes.WINFUNCTYPE(ctypes.c_bool, ctypes.c_void_p, ctypes.c_void_p)(
+        lambda hwnd, _: (user32.IsWindowVisible(hwnd) and windows.add(hwnd)) or True)
+    user32.EnumWindows(callback, 0)
+    return windows
+
+
+def list_windows(probe_path=None):
+    # Ids of the open top-level windows, or None where they can't be listed (macOS)
+    if probe_path:
+        state = probe_file(probe_path)
+        return set(state["windows"]) if state and "windows" in state else None
+    try:
+        if sys.platform == "win32":
+            return list_windows_windows()
+        if sys.platform != "darwin" and os.environ.get("DISPLAY"):
+            return list_windows_x11()
+    except Exception as e:
+        print(f"Error listing windows: {e}")
+    return None
+
+
+def probe_active_window(probe_path=None):
+    if probe_path:
+        return probe_file(probe_path)
+    try:
+        if sys.platform == "darwin":
+            return probe_macos()
+        if sys.platform == "win32":
+            return probe_windows()
+        if os.environ.get("DISPLAY"):
+            return probe_x11()
+    except Exception as e:
+        print(f"Error probing active window: {e}")
+    return None
+
+
+def monitor_for_window(geometry, screens):
+    # The captured screen showing most of the window, by [left, top, width,
+    # height] in desktop coordinates; None if unknown or on no screen
+    if not geometry or len(geometry) != 4:
+        return None
+    left, top, width, height = geometry
+    best, best_area = None, 0
+    for screen in screens:
+        screen_left, screen_top, screen_width, screen_height = screen["geometry"]
+        overlap_width = min(left + width, screen_left + screen_width) - max(left, screen_left)
+        overlap_height = min(top + height, screen_top + screen_height) - max(top, screen_top)
+        area = max(overlap_width, 0) * max(overlap_height, 0)
+        if area > best_area:
+            best, best_area = screen["monitor"], area
+    return best
+
+
+def _word_pattern(phrase):
+    # Whole words only: "stream" must not match "upstream" or "Streamlit"
+    return re.compile(r"(?<!\w)" + re.escape(phrase) + r"(?!\w)")
+
+
+class MetadataClassifier:
+    def __init__(self, possible_activities=None, blacklisted_words=None, rules=None):
+        self.possible_activities = [a.lower() for a in possible_activities or []]
+        self.blacklisted_words = [w.lower() for w in blacklisted_words or []]
+        # keyword in title/process -> activity, e.g. {"twitch": "watching livestream"}
+        self.rules = {keyword.lower(): activity.lower() for keyword, activity in (rules or {}).items()}
+        self.patterns = {phrase: _word_pattern(phrase)
+                         for phrase in set(self.possible_activities) | set(self.blacklisted_words) | set(self.rules)}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['possible_activities'], config['blacklisted_words'], config['metadata_rules'])
+
+    def is_blacklisted(self, activity):
+        # Activities come from the config, like the model's answers; matched as DistractionAnalyzer does
+        return any(word in activity for word in self.blacklisted_words)
+
+    def mentions(self, text, phrase):
+        return self.patterns[phrase].search(text) is not None
+
+    def window_text(self, metadata):
+        if not metadata:
+            return ""
+        return " ".join(str(metadata.get(key, "")) for key in ("title", "process", "app")).lower().strip()
+
+    def hints_distraction(self, metadata):
+        # Weaker than classify(): any distracting keyword at all, even next to a
+        # productive one, makes the frame worth analyzing first
+        text = self.window_text(metadata)
+        if not text:
+            return False
+        return any(self.mentions(text, word) for word in self.blacklisted_words) or \
+            any(self.mentions(text, keyword) and self.is_blacklisted(activity) for keyword, activity in self.rules.items())
+
+    def classify(self, metadata):
+        # Returns (is_distracted, activity) when the window alone decides, else None
+        text = self.window_text(metadata)
+        if not text:
+            return None
+
+        ruled = {activity for keyword, activity in self.rules.items() if self.mentions(text, keyword)}
+        if not ruled:
+            return None
+        activities = ruled | {activity for activity in self.possible_activities if self.mentions(text, activity)}
+        distracted = {activity for activity in activities if self.is_blacklisted(activity)}
+        distracted.update(word for word in self.blacklisted_words if self.mentions(text, word))
+        focused = activities - distracted
+
+        if distracted and not focused:
+            return True, sorted(distracted)[0]
+        if focused and not distracted:
+            return False, sorted(focused)[0]
+        return None